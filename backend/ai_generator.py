@@ -2,73 +2,294 @@
 AI生成模块 - 处理大模型API调用和内容生成
 """
 import json
-import os
-import sys
 import time
 import logging
-import requests
-from config import DEEPSEEK_API_URL, MODEL_CONFIG
+from config import MODEL_CONFIG, SINGLE_FLIGHT_ENABLED
 
 from utils import parse_lesson_plan_json
+from lesson_schema import LESSON_PLAN_SCHEMA, ensure_valid_lesson_plan, LessonPlanValidationError
+from retry_policy import (
+    RetryPolicy,
+    DEEPSEEK_BREAKER,
+    UPSTREAM_FAILURE_STATUS_CODES,
+    is_retryable_status,
+    parse_retry_after
+)
+import metrics
+from deepseek_client import DeepSeekClient
+from cancellation import GenerationCancelled
+from rate_limiter import DEEPSEEK_RATE_LIMITER, estimate_tokens
+from scheduler import tenant_key
+from singleflight import LLM_SINGLE_FLIGHT, prompt_key
+import prompt_journal
+import tracing
+import startup
+
+requests = startup.lazy_module("requests")
 
 logger = logging.getLogger('jiaoan')
 
+# 可单独重新生成的教案部分
+SECTION_NAMES = tuple(LESSON_PLAN_SCHEMA["properties"].keys())
 
-def get_api_key() -> str:
-    """获取API Key，优先从环境变量读取"""
-    return os.environ.get('DEEPSEEK_API_KEY', '')
+# 单个部分重新生成时的输出Token上限
+SECTION_MAX_TOKENS = 1500
 
+CANCELLED_RESULT = {"error": "cancelled", "message": "生成任务已取消"}
 
-def generate_lesson_plan(course_info: dict) -> dict:
+
+def circuit_open_result() -> dict:
+    """熔断器打开时的结果：明确报告服务不可用，调用方不应退回模拟数据"""
+    retry_in = round(DEEPSEEK_BREAKER.retry_in(), 1)
+    return {"error": "circuit_open", "message": f"DeepSeek服务暂时不可用，请约 {retry_in:.0f}s 后重试", "retry_in": retry_in}
+
+
+def rate_limited_result(wait_seconds: float) -> dict:
+    """限流等待超过剩余截止时间时的结果：明确报告被限流，调用方不应退回模拟数据"""
+    retry_in = round(wait_seconds, 1)
+    return {"error": "rate_limited", "message": f"DeepSeek API配额已用尽，请约 {retry_in:.0f}s 后重试", "retry_in": retry_in}
+
+
+def generate_lesson_plan(course_info: dict, stats: dict = None, client: DeepSeekClient = None) -> dict:
+    """
+    调用大模型生成完整教案内容
+
+    stats: 可选的统计记录（见 metrics.new_call_stats），调用结束后填入
+           Token用量、耗时、重试与解析失败次数
+    client: 本次请求的API凭据与连接，未提供时从环境变量读取
+    """
     logger.info("  📝 正在调用DeepSeek API生成完整教案内容...")
-    
-    api_key = get_api_key()
-    if not api_key:
+
+    if stats is None:
+        stats = metrics.new_call_stats()
+    with tracing.span("prompt_build") as build_span:
+        prompt = _build_prompt(course_info)
+        build_span.set(prompt_chars=len(prompt))
+
+    result = _request_with_stats(prompt, stats, client, ensure_valid_lesson_plan, kind="lesson")
+    prompt_journal.record(
+        "lesson", prompt, result,
+        topic=course_info.get('课题名称', ''), outcome=stats["outcome"], usage=metrics.usage_summary(stats)
+    )
+    return result
+
+
+def generate_section(
+    course_info: dict,
+    lesson_data: dict,
+    section: str,
+    stats: dict = None,
+    instructions: str = "",
+    client: DeepSeekClient = None
+) -> dict:
+    """
+    只重新生成教案的某一部分，其余部分作为上下文提供给大模型
+
+    Args:
+        course_info: 课程信息
+        lesson_data: 现有的完整教案数据
+        section: 要重新生成的部分名称（LESSON_PLAN_SCHEMA 中的顶层字段）
+        stats: 可选的统计记录
+        instructions: 教师对该部分的修改要求（可选）
+        client: 本次请求的API凭据与连接，未提供时从环境变量读取
+
+    Returns:
+        dict: {section: 新内容}；API Key无效、已取消、熔断中或被限流时返回错误字典，失败返回None
+    """
+    if section not in SECTION_NAMES:
+        raise ValueError(f"未知的教案部分: {section}")
+
+    logger.info(f"  📝 正在调用DeepSeek API重新生成「{section}」...")
+
+    if stats is None:
+        stats = metrics.new_call_stats()
+    with tracing.span("prompt_build", section=section) as build_span:
+        prompt = _build_section_prompt(course_info, lesson_data, section, instructions)
+        build_span.set(prompt_chars=len(prompt))
+    schema = {
+        "type": "object",
+        "required": [section],
+        "properties": {section: LESSON_PLAN_SCHEMA["properties"][section]}
+    }
+    result = _request_with_stats(
+        prompt, stats, client, lambda data: ensure_valid_lesson_plan(data, schema),
+        kind="section", max_tokens=SECTION_MAX_TOKENS
+    )
+    prompt_journal.record(
+        "section", prompt, result,
+        topic=course_info.get('课题名称', ''), section=section, outcome=stats["outcome"],
+        usage=metrics.usage_summary(stats)
+    )
+    if result is None or result.get("error"):
+        return result
+    return {section: result[section]}
+
+
+def _request_with_stats(prompt: str, stats: dict, client: DeepSeekClient, validate, kind: str,
+                        max_tokens: int = None) -> dict:
+    """发送请求并在结束后记录整体耗时与用量"""
+    if stats is None:
+        stats = metrics.new_call_stats()
+    if client is None:
+        client = DeepSeekClient.from_env()
+    started = time.perf_counter()
+    with tracing.span("llm", kind=kind) as llm_span:
+        shared = False
+        if SINGLE_FLIGHT_ENABLED and client.api_key:
+            try:
+                result, shared = LLM_SINGLE_FLIGHT.do(
+                    prompt_key(prompt, tenant_key(client.api_key), kind, max_tokens),
+                    lambda: _request_json(prompt, stats, client, validate, max_tokens),
+                    shareable=lambda data: data is not None and not data.get("error"),
+                    cancelled=lambda: client.cancelled
+                )
+            except GenerationCancelled:
+                logger.warning("     ⏹️  生成任务已取消")
+                result = dict(CANCELLED_RESULT)
+        else:
+            result = _request_json(prompt, stats, client, validate, max_tokens)
+    if shared:
+        stats["shared"] = True
+        outcome = "shared"
+        logger.info("     🔗 相同内容的请求正在生成，已共享其结果（未重复调用大模型）")
+    elif isinstance(result, dict) and result.get("error") in ("invalid_api_key", "cancelled", "circuit_open", "rate_limited"):
+        outcome = result["error"]
+    elif result is None:
+        outcome = "failed"
+    else:
+        outcome = "success"
+    metrics.record_lesson(stats, outcome, time.perf_counter() - started, kind)
+    llm_span.set(outcome=outcome, attempts=stats["attempts"], shared=shared)
+    logger.info(
+        f"     📈 用量: 输入 {stats['prompt_tokens']} tokens（缓存命中 {stats['cache_hit_tokens']}），"
+        f"输出 {stats['completion_tokens']} tokens，请求 {stats['attempts']} 次，"
+        f"耗时 {stats['wall_seconds']:.1f}s"
+    )
+    return result
+
+
+def _request_json(prompt: str, stats: dict, client: DeepSeekClient, validate, max_tokens: int = None) -> dict:
+    """
+    请求大模型并解析、校验返回的JSON，内含重试逻辑
+    validate: 校验函数，不通过时抛出 LessonPlanValidationError
+    """
+    if not client.api_key:
         logger.error("     ❌ 未设置API Key")
         return {"error": "invalid_api_key", "message": "未设置DeepSeek API Key"}
     
-    logger.info(f"     🔑 使用API Key: {api_key[:10]}...{api_key[-4:] if len(api_key) > 14 else ''} (长度: {len(api_key)})")
-    
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}"
-    }
+    logger.info(f"     🔑 使用API Key: {client.masked_key}")
     
-    retry_count = 0
-    max_retries = 5
+    policy = RetryPolicy.from_config()
+    deadline = policy.new_deadline()
+    rate_key = tenant_key(client.api_key)
+    attempt = 0
     last_error = None
     last_content = None
 
-    prompt = _build_prompt(course_info)
-
-    _save_prompt_to_file(course_info, prompt)
-
-    while retry_count < max_retries:
+    while attempt < policy.max_attempts:
+        if client.cancelled:
+            logger.warning("     ⏹️  生成任务已取消")
+            return dict(CANCELLED_RESULT)
+        if deadline.expired():
+            logger.error(f"     ❌ 已超过单课时截止时间 ({policy.deadline:.0f}s)，停止重试")
+            return None
+
+        current_prompt = prompt
+        if last_error and last_content:
+            error_prompt = f"\n\n--- 之前的生成结果解析失败 ---\n错误原因：{last_error}\n返回内容：{last_content[:500]}...\n\n请重新生成，确保返回的是纯JSON格式，不要包含任何其他文字说明。"
+            current_prompt = prompt + error_prompt
+        
+        data = {
+            **MODEL_CONFIG,
+            "messages": [{"role": "user", "content": current_prompt}]
+        }
+        if max_tokens:
+            data["max_tokens"] = max_tokens
+        
+        # 客户端限流：按提示词长度+输出上限预估Token，配额不足时先等待
+        # 在向熔断器申请之前完成，半开状态的探测名额不会在限流等待期间被占用
+        estimated_tokens = estimate_tokens(current_prompt) + data.get("max_tokens", 0)
+        throttle = DEEPSEEK_RATE_LIMITER.reserve(rate_key, estimated_tokens)
+        if throttle > 0:
+            if throttle >= deadline.remaining():
+                DEEPSEEK_RATE_LIMITER.release(rate_key, estimated_tokens)
+                logger.error(f"     ❌ 限流需等待 {throttle:.1f}s，超过剩余截止时间，停止请求")
+                return rate_limited_result(throttle)
+            logger.info(f"     🚦 接近API配额，限流等待 {throttle:.1f}s")
+            metrics.record_rate_limit_delay(stats, throttle)
+            with tracing.span("rate_limit_wait", seconds=round(throttle, 3)):
+                cancelled = client.wait(throttle)
+            if cancelled:
+                DEEPSEEK_RATE_LIMITER.release(rate_key, estimated_tokens)
+                logger.warning("     ⏹️  生成任务已取消")
+                return dict(CANCELLED_RESULT)
+
+        if not DEEPSEEK_BREAKER.allow():
+            DEEPSEEK_RATE_LIMITER.release(rate_key, estimated_tokens)
+            metrics.record_circuit_rejection()
+            logger.error(f"     ❌ DeepSeek服务熔断中（约 {DEEPSEEK_BREAKER.retry_in():.0f}s 后恢复探测），快速失败")
+            return circuit_open_result()
+
+        attempt += 1
+        delay = 0
         try:
-            current_prompt = prompt
-            if last_error and last_content:
-                error_prompt = f"\n\n--- 之前的生成结果解析失败 ---\n错误原因：{last_error}\n返回内容：{last_content[:500]}...\n\n请重新生成，确保返回的是纯JSON格式，不要包含任何其他文字说明。"
-                current_prompt = prompt + error_prompt
-            
-            data = {
-                **MODEL_CONFIG,
-                "messages": [{"role": "user", "content": current_prompt}]
-            }
-            
-            logger.info(f"     ⏳ 发送请求到DeepSeek API... (尝试 {retry_count + 1}/{max_retries})")
-            logger.info(f"     📊 请求体大小: {len(json.dumps(data))} 字节")
-            logger.info(f"     🌐 API URL: {DEEPSEEK_API_URL}")
+            logger.info(f"     ⏳ 发送请求到DeepSeek API... (尝试 {attempt}/{policy.max_attempts})")
+            logger.info(f"     📊 提示词长度: {len(current_prompt)} 字符")
+            logger.info(f"     🌐 API URL: {client.api_url}")
             if last_error:
                 logger.warning(f"     ⚠️  上次错误：{last_error}")
             
-            response = requests.post(DEEPSEEK_API_URL, headers=headers, json=data, timeout=120)
+            attempt_started = time.perf_counter()
+            with tracing.span("llm_request", attempt=attempt, prompt_chars=len(current_prompt)) as request_span:
+                try:
+                    response = client.post(data, timeout=policy.request_timeout_for(deadline))
+                except requests.exceptions.RequestException:
+                    metrics.record_attempt(stats, "network_error", time.perf_counter() - attempt_started)
+                    DEEPSEEK_BREAKER.record_failure()
+                    raise
+                request_span.set(status_code=response.status_code)
+            attempt_seconds = time.perf_counter() - attempt_started
+            # 成功响应只解码一次：限流器的实际用量与下面的内容解析共用同一份结果
+            result, decode_error = None, None
+            if response.ok:
+                try:
+                    result = response.json()
+                except ValueError as e:
+                    decode_error = e
+            DEEPSEEK_RATE_LIMITER.observe(
+                rate_key,
+                response.status_code,
+                used_tokens=_total_tokens(result),
+                estimated_tokens=estimated_tokens,
+                retry_after=parse_retry_after(response.headers.get("Retry-After"))
+            )
+
+            if response.status_code in UPSTREAM_FAILURE_STATUS_CODES:
+                DEEPSEEK_BREAKER.record_failure()
+            else:
+                DEEPSEEK_BREAKER.record_success()
             
             if response.status_code == 401:
+                metrics.record_attempt(stats, "http_401", attempt_seconds)
                 logger.error("     ❌ API Key无效或已过期")
                 return {"error": "invalid_api_key", "message": "API Key无效或已过期，请检查您的DeepSeek API Key"}
             
+            if not response.ok:
+                metrics.record_attempt(stats, f"http_{response.status_code}", attempt_seconds)
+                if not is_retryable_status(response.status_code):
+                    logger.error(f"     ❌ HTTP请求失败（不可重试）：状态码 {response.status_code}")
+                    logger.error(f"     📋 响应内容: {response.text[:500]}")
+                    return None
             response.raise_for_status()
-            result = response.json()
+            if decode_error is not None:
+                metrics.record_attempt(stats, "invalid_response", attempt_seconds)
+                raise decode_error
+            metrics.record_attempt(stats, "ok", attempt_seconds, result.get("usage"))
+            usage = result.get("usage") or {}
+            request_span.set(
+                prompt_tokens=usage.get("prompt_tokens", 0),
+                completion_tokens=usage.get("completion_tokens", 0)
+            )
             content = result["choices"][0]["message"]["content"].strip()
             
             logger.info("     ✅ API调用成功，正在解析数据...")
@@ -80,37 +301,41 @@ def generate_lesson_plan(course_info: dict) -> dict:
                 logger.info("     " + content)
             logger.info("     " + "-" * 60)
             
-            parsed_data = parse_lesson_plan_json(content)
+            repairs = {}
+            with tracing.span("parse", attempt=attempt, content_chars=len(content)) as parse_span:
+                parsed_data = parse_lesson_plan_json(content, repairs)
+                if repairs:
+                    parse_span.set(repairs=repairs)
+                    metrics.record_json_repairs(stats, repairs)
+                    detail = "，".join(f"{kind}×{amount}" for kind, amount in repairs.items())
+                    logger.info(f"     🔧 JSON已在本地修复（{detail}），无需重新生成")
+                validate(parsed_data)
             logger.info("     ✅ 数据解析完成")
             return parsed_data
             
+        except GenerationCancelled:
+            logger.warning("     ⏹️  生成任务已取消，已中断进行中的请求")
+            return dict(CANCELLED_RESULT)
         except requests.exceptions.HTTPError as e:
-            if response.status_code == 401:
-                logger.error("     ❌ API Key无效或已过期")
-                return {"error": "invalid_api_key", "message": "API Key无效或已过期，请检查您的DeepSeek API Key"}
             logger.error(f"     ❌ HTTP请求失败：{e}")
             logger.error(f"     📋 响应状态码: {response.status_code}")
             logger.error(f"     📋 响应内容: {response.text[:500] if hasattr(response, 'text') else 'N/A'}")
-            retry_count += 1
-            if retry_count < max_retries:
-                logger.info("     🔄 准备重试...")
-            continue
+            delay = policy.backoff(attempt, parse_retry_after(response.headers.get("Retry-After")))
         except requests.exceptions.RequestException as e:
             logger.error(f"     ❌ API请求失败：{e}")
             logger.error(f"     📋 错误类型: {type(e).__name__}")
             logger.error(f"     📋 错误详情: {str(e)}")
-            retry_count += 1
-            if retry_count < max_retries:
-                logger.info("     🔄 准备重试...")
-            continue
+            delay = policy.backoff(attempt)
         except json.JSONDecodeError as e:
             logger.error(f"     ❌ JSON解析失败：{e}")
             last_error = str(e)
             last_content = content
-            retry_count += 1
-            if retry_count < max_retries:
-                logger.info("     🔄 准备重试，告知大模型JSON格式错误...")
-            continue
+            metrics.record_parse_failure(stats, "json")
+        except LessonPlanValidationError as e:
+            logger.error(f"     ❌ 教案结构校验失败（{len(e.errors)}处）：{e}")
+            last_error = f"返回的JSON结构不完整：{e}"
+            last_content = content
+            metrics.record_parse_failure(stats, "schema")
         except Exception as e:
             logger.error(f"     ❌ 处理失败：{e}")
             last_error = str(e)
@@ -118,17 +343,42 @@ def generate_lesson_plan(course_info: dict) -> dict:
                 last_content = content
             except NameError:
                 pass
-            retry_count += 1
-            if retry_count < max_retries:
-                logger.info("     🔄 准备重试...")
-            continue
+        finally:
+            # 本次尝试若是半开状态的探测请求、且被取消或提前结束而未记录成功/失败，交还探测名额
+            DEEPSEEK_BREAKER.release_probe()
+
+        if attempt >= policy.max_attempts:
+            break
+        if delay >= deadline.remaining():
+            logger.error(f"     ❌ 需等待 {delay:.1f}s，超过剩余截止时间，停止重试")
+            return None
+        metrics.record_retry(stats)
+        if delay > 0:
+            logger.info(f"     🔄 {delay:.1f}s 后重试...")
+            with tracing.span("retry_backoff", seconds=round(delay, 3)):
+                cancelled = client.wait(delay)
+            if cancelled:
+                logger.warning("     ⏹️  生成任务已取消")
+                return dict(CANCELLED_RESULT)
+        elif last_error:
+            logger.info("     🔄 准备重试，告知大模型JSON格式或结构错误...")
+        else:
+            logger.info("     🔄 准备重试...")
     
-    logger.error(f"     ❌ 达到最大重试次数 ({max_retries})，返回None")
+    logger.error(f"     ❌ 达到最大重试次数 ({policy.max_attempts})，返回None")
     return None
 
 
-def _build_prompt(course_info: dict) -> str:
-    """构建请求大模型的Prompt"""
+def _total_tokens(result: dict) -> int:
+    """从已解码的成功响应中读取实际Token用量，读不到时返回None"""
+    try:
+        return int(result["usage"]["total_tokens"])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def _build_course_context(course_info: dict, include_documents: bool = True) -> str:
+    """构建Prompt中的课程信息部分（课程信息、课程描述、教师描述、参考文档）"""
     # 获取课程描述（全局描述，对整个课程生效）
     course_description = course_info.get('课程描述', '').strip()
 
@@ -136,7 +386,7 @@ def _build_prompt(course_info: dict) -> str:
     user_description = course_info.get('用户描述', '').strip()
 
     # 获取参考文档内容（如果有）
-    reference_documents = course_info.get('参考文档', [])
+    reference_documents = course_info.get('参考文档', []) if include_documents else []
 
     # 构建课程描述部分（全局）
     course_desc_section = ""
@@ -186,28 +436,25 @@ def _build_prompt(course_info: dict) -> str:
 3. 参考文档中的案例、示例或数据来丰富教案内容
 4. 确保生成的教案与参考文档的内容保持一致性和连贯性"""
 
-    return f"""请为以下课程生成完整的教案内容，以JSON格式返回。
-
-课程信息：
+    return f"""课程信息：
 - 课题名称：{course_info['课题名称']}
 - 专业名称：{course_info.get('专业名称', '')}
 - 课程名称：{course_info.get('课程名称', '')}
 - 授课班级：{course_info['授课班级']}
-- 授课学时：{course_info.get('授课学时', '')}{course_desc_section}{user_desc_section}{doc_section}
+- 授课学时：{course_info.get('授课学时', '')}{course_desc_section}{user_desc_section}{doc_section}"""
 
-请严格按照以下JSON格式返回（不要添加任何其他文字说明，只返回JSON）
-避免error：Expecting ',' delimiter: line 29 column 5 (char 1311)：
 
-{{
-    "教学内容及学情分析": {{
+# 返回格式示例（同时用于完整生成和单个部分的重新生成）
+LESSON_PLAN_FORMAT = {
+    "教学内容及学情分析": {
         "教学内容": "详细描述本节课的教学内容，200-300字",
         "学情分析": "分析学生已有基础、学习特点和可能遇到的困难，150-200字"
-    }},
-    "教学目标": {{
+    },
+    "教学目标": {
         "知识目标": "掌握...，理解...",
         "能力目标": "能独立完成...，具备...能力",
         "素质目标": "培养...意识，树立...精神"
-    }},
+    },
     "教学重点": [
         "重点1：核心知识点或技能",
         "重点2：关键操作步骤",
@@ -217,10 +464,10 @@ def _build_prompt(course_info: dict) -> str:
         "难点1：抽象概念或复杂操作",
         "难点2：易错环节或常见困惑"
     ],
-    "教学方法与教学资源": {{
+    "教学方法与教学资源": {
         "教学方法": "项目教学法、任务驱动法、示范教学法",
         "教学资源": "实训设备、多媒体课件、操作手册"
-    }},
+    },
     "思政元素": [
         "思政点1：结合专业领域的国家发展价值",
         "思政点2：强调职业规范、工匠精神",
@@ -228,31 +475,86 @@ def _build_prompt(course_info: dict) -> str:
         "思政点4：增强民族自豪感和自主创新意识"
     ],
     "教学实施过程": [
-        {{
+        {
             "环节": "环节名称（如：任务导入、知识讲解等）",
             "时间": "XXmin",
             "内容": "具体教学内容描述",
             "教师活动": "教师的具体活动",
             "学生活动": "学生的具体活动"
-        }}
+        }
     ],
-    "课外作业": {{
+    "课外作业": {
         "基础题": "巩固基础知识的题目",
         "提升题": "拓展能力的题目",
         "预习题": "下节课预习内容"
-    }}
-}}
+    }
+}
+
+PROCESS_TIME_REQUIREMENT = "教学实施过程的环节数量由你根据课题特点灵活设计（建议4-6个环节），总时长必须严格控制在1学时45分钟。根据授课学时，计算总时长，每个环节的时间分配要合理。"
+
+
+def _build_prompt(course_info: dict) -> str:
+    """构建请求大模型的Prompt"""
+    lesson_format = json.dumps(LESSON_PLAN_FORMAT, ensure_ascii=False, indent=4)
+    return f"""请为以下课程生成完整的教案内容，以JSON格式返回。
+
+{_build_course_context(course_info)}
+
+请严格按照以下JSON格式返回（不要添加任何其他文字说明，只返回JSON）：
+
+{lesson_format}
 
 要求：
 1. 严格按照上述JSON格式返回，确保JSON格式合法
-2. 教学实施过程的环节数量由你根据课题特点灵活设计（建议4-6个环节），总时长必须严格控制在1学时45分钟。根据授课学时，计算总时长，每个环节的时间分配要合理。
+2. {PROCESS_TIME_REQUIREMENT}
 3. 各环节时间分配要合理，符合理实一体化教学规律（如：导入5-10分钟、总结5-10分钟）
 4. 内容要贴合课题特点，符合高职理实一体化教学特点
 5. 所有文本字段使用纯文本，不要使用Markdown格式
-6. 避免error：Expecting ',' delimiter: line 29 column 5 (char 1311)
+6. 上述所有字段均为必填，教学实施过程的每个环节都必须包含环节、时间、内容、教师活动、学生活动
 7. 只返回JSON，不要添加```json标记或其他说明文字"""
 
 
+def _build_section_prompt(course_info: dict, lesson_data: dict, section: str, instructions: str = "") -> str:
+    """
+    构建单个部分重新生成的Prompt
+    参考文档不再附带（其内容已体现在其余部分中），以控制Token用量
+    """
+    other_sections = {
+        name: value for name, value in lesson_data.items()
+        if name != section and name in LESSON_PLAN_FORMAT
+    }
+    context = json.dumps(other_sections, ensure_ascii=False, separators=(",", ":"))
+    section_format = json.dumps({section: LESSON_PLAN_FORMAT[section]}, ensure_ascii=False, indent=4)
+
+    instructions_section = ""
+    if instructions and instructions.strip():
+        instructions_section = f"""
+
+【教师对「{section}」的修改要求】
+{instructions.strip()}"""
+
+    extra_requirement = ""
+    if section == "教学实施过程":
+        extra_requirement = f"\n5. {PROCESS_TIME_REQUIREMENT}"
+
+    return f"""以下是一份已生成的教案，请只重新生成其中的「{section}」部分，以JSON格式返回。
+
+{_build_course_context(course_info, include_documents=False)}
+
+【教案其他部分（保持不变，供参考）】
+{context}{instructions_section}
+
+请严格按照以下JSON格式返回（只包含「{section}」一个字段，不要添加任何其他文字说明）：
+
+{section_format}
+
+要求：
+1. 新内容必须与教案其他部分保持一致、衔接自然
+2. 所有字段均为必填，不能为空
+3. 所有文本字段使用纯文本，不要使用Markdown格式
+4. 只返回JSON，不要添加```json标记或其他说明文字{extra_requirement}"""
+
+
 def get_mock_lesson_data(course_info: dict) -> dict:
     """返回模拟的教案数据（用于测试）"""
     return {
@@ -326,36 +628,3 @@ def get_mock_lesson_data(course_info: dict) -> dict:
         "预习题": "预习无人机装调常用工具的种类，了解剥线钳、焊枪的基本使用方法。"
     }
 }
-
-
-def _save_prompt_to_file(course_info: dict, prompt: str):
-    try:
-        if hasattr(sys, '_MEIPASS'):
-            base_dir = os.path.dirname(sys.executable)
-        else:
-            base_dir = os.path.dirname(os.path.abspath(__file__))
-
-        topic = course_info.get('课题名称', '未命名课题')
-        safe_topic = topic.replace('\\', '-').replace('/', '-').replace(':', '-').replace('*', '-').replace('?', '-').replace('"', '-').replace('<', '-').replace('>', '-').replace('|', '-')
-        timestamp = time.strftime('%Y%m%d_%H%M%S')
-        filename = f"提示词_{safe_topic}_{timestamp}.txt"
-        filepath = os.path.join(base_dir, filename)
-
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write("=" * 80 + "\n")
-            f.write("教案生成提示词\n")
-            f.write("=" * 80 + "\n\n")
-            f.write(f"课题名称: {topic}\n")
-            f.write(f"课程名称: {course_info.get('课程名称', '')}\n")
-            f.write(f"专业名称: {course_info.get('专业名称', '')}\n")
-            f.write(f"授课班级: {course_info.get('授课班级', '')}\n")
-            f.write(f"授课学时: {course_info.get('授课学时', '')}\n")
-            f.write(f"保存时间: {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
-            f.write("\n" + "=" * 80 + "\n")
-            f.write("提示词内容:\n")
-            f.write("=" * 80 + "\n\n")
-            f.write(prompt)
-
-        logger.info(f"     💾 提示词已保存到: {filename}")
-    except Exception as e:
-        pass
@@ -3,15 +3,14 @@ API服务器 - 提供前端调用的接口
 """
 import os
 import sys
-import io
-import json
-import queue
-import threading
+import math
+import re
 import time
 import uuid
 import logging
-from datetime import datetime
-from flask import Flask, request, jsonify, send_from_directory, Response, stream_with_context
+# 尽早导入以记录解释器启动耗时；重型依赖的延迟导入与预热见 startup.py
+import startup
+from flask import Flask, request, jsonify, send_from_directory, Response
 from flask_cors import CORS
 
 RENDER_DATA_DIR = os.environ.get('RENDER_DATA_DIR', '')
@@ -29,9 +28,22 @@ def get_base_dir():
 BASE_DIR = get_base_dir()
 sys.path.insert(0, BASE_DIR)
 
-from main import batch_generate_lesson_plans, generate_lesson_plan_doc
-from config import DEFAULT_FIXED_COURSE_INFO
-from document_processor import extract_document_content, get_document_summary
+from main import generate_lesson_plan_doc, load_lesson_data, load_lesson_template_id
+from ai_generator import generate_section, SECTION_NAMES
+from deepseek_client import DeepSeekClient
+from retry_policy import DEEPSEEK_BREAKER
+from config import DEFAULT_FIXED_COURSE_INFO, STORAGE_LIFECYCLE_CONFIG, TEMPLATE_CONFIG
+import metrics
+import prompt_journal
+import tracing
+import profiler
+from state_store import LockTimeout, create_state_store
+import cancellation
+from cancellation import CancelToken, GenerationCancelled
+from scheduler import GENERATION_SCHEDULER, INTERACTIVE, BULK, tenant_key
+from concurrency import ExtractionTimeout, extract_document_content_offloaded
+from storage_lifecycle import DirectoryPolicy, StorageSweeper
+from template_registry import TemplateRegistry
 
 DATA_DIR = RENDER_DATA_DIR if RENDER_DATA_DIR else BASE_DIR
 
@@ -41,8 +53,6 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 SESSION_DIR = os.path.join(DATA_DIR, 'sessions')
 os.makedirs(SESSION_DIR, exist_ok=True)
 
-uploaded_documents = {}
-
 app = Flask(__name__)
 CORS(app, resources={
     r"/api/*": {"origins": "*", "supports_credentials": True},
@@ -53,6 +63,11 @@ app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024
 
 STATIC_DIR = os.path.join(BASE_DIR, 'frontend', 'dist')
 OUTPUT_DIR = os.path.join(DATA_DIR, 'output')
+LESSON_DIR = os.path.join(DATA_DIR, 'lessons')
+TEMPLATE_PATH = os.path.join(BASE_DIR, 'moban.docx')
+# 各学校上传的教案模板，长期保存，不参与存储清理
+TEMPLATE_DIR = TEMPLATE_CONFIG["directory"] or os.path.join(DATA_DIR, 'templates')
+template_registry = TemplateRegistry(TEMPLATE_DIR, TEMPLATE_PATH)
 
 # Log startup info
 logging.basicConfig(level=logging.INFO)
@@ -64,64 +79,114 @@ logger.info(f"UPLOAD_DIR: {UPLOAD_DIR}")
 logger.info(f"OUTPUT_DIR: {OUTPUT_DIR}")
 
 os.makedirs(OUTPUT_DIR, exist_ok=True)
+os.makedirs(LESSON_DIR, exist_ok=True)
 
+# 会话、上传文档等共享状态（后端见 config.STATE_BACKEND）
+state_store = create_state_store(DATA_DIR)
+logger.info(f"STATE_BACKEND: {state_store.name}")
 
 
-generation_sessions = {}
-sessions_lock = threading.Lock()
+def _directory_policy(name, path, config_key=None, **overrides):
+    policy = STORAGE_LIFECYCLE_CONFIG[config_key or name]
+    options = {
+        "ttl_seconds": policy["ttl_hours"] * 3600,
+        "max_bytes": int(policy["max_mb"] * 1024 * 1024),
+        "min_age": STORAGE_LIFECYCLE_CONFIG["min_age"],
+        **overrides
+    }
+    return DirectoryPolicy(name, path, **options)
 
 
-def save_session_to_file(session_id, session_data):
-    try:
-        session_file = os.path.join(SESSION_DIR, f'{session_id}.json')
-        with open(session_file, 'w', encoding='utf-8') as f:
-            json.dump(session_data, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        logging.error(f"保存会话文件失败: {e}")
+def _purge_state():
+    """清理状态存储中的过期会话，以及与上传文件同期过期的文档记录（含提取的全文）"""
+    ttl_hours = STORAGE_LIFECYCLE_CONFIG["sessions"]["ttl_hours"]
+    if ttl_hours:
+        state_store.purge_sessions(ttl_hours * 3600)
+    ttl_hours = STORAGE_LIFECYCLE_CONFIG["uploads"]["ttl_hours"]
+    if ttl_hours:
+        removed = state_store.purge_documents(ttl_hours * 3600)
+        if removed:
+            logger.info(f"🧹 已清理 {removed} 条过期的上传文档记录")
+
 
+def _evict_lesson_data(output_path):
+    storage_sweeper.remove(lesson_data_path(output_path))
 
-def load_session_from_file(session_id):
+
+# 上传文件保存为 <lesson_id>_<上传时间戳>_<原文件名>（见 upload_document）
+_UPLOAD_FILE_NAME = re.compile(r'^(.*?)_\d+_')
+
+
+def _evict_upload_record(file_path):
+    """上传文件被淘汰（过期或超出容量）时删除对应的文档记录，生成时不再引用已删除的文件"""
+    match = _UPLOAD_FILE_NAME.match(os.path.basename(file_path))
+    if not match:
+        return
     try:
-        session_file = os.path.join(SESSION_DIR, f'{session_id}.json')
-        if os.path.exists(session_file):
-            with open(session_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
+        doc = state_store.remove_document_file(match.group(1), file_path)
     except Exception as e:
-        logging.error(f"加载会话文件失败: {e}")
-    return None
+        logger.warning(f"⚠️ 删除 {file_path} 的文档记录失败: {e}")
+        return
+    if doc:
+        logger.info(f"🧹 上传文件已清理，同时删除文档记录: {doc.get('filename')}")
+
+
+# 数据目录清理：教案数据（lessons）随教案文件一起淘汰，下载时一起刷新访问时间；
+# lessons 目录自身只按过期时间清理残留的孤立文件；上传文件被淘汰时删除其文档记录。会话文件只在local后端存在
+_storage_policies = [
+    _directory_policy('output', OUTPUT_DIR, on_evict=_evict_lesson_data),
+    _directory_policy('lessons', LESSON_DIR, 'output', max_bytes=0),
+    _directory_policy('uploads', UPLOAD_DIR, on_evict=_evict_upload_record)
+]
+if state_store.name == 'local':
+    _storage_policies.append(_directory_policy('sessions', SESSION_DIR))
+storage_sweeper = StorageSweeper(
+    _storage_policies,
+    interval=STORAGE_LIFECYCLE_CONFIG["sweep_interval"],
+    rescan_every=STORAGE_LIFECYCLE_CONFIG["rescan_every"],
+    on_sweep=_purge_state
+)
+
+
+@app.before_request
+def start_background_tasks():
+    # 在处理第一个请求时启动（gunicorn --preload 时master进程中的线程不会带到worker里）
+    storage_sweeper.start()
+    # 通常已在端口开始监听时预热；其他方式启动时在首个请求时补上
+    startup.start_prewarm()
+    startup.mark("first_request")
 
 
+def update_session(session_id, data):
+    return state_store.update_session(session_id, data)
 
 
+def lesson_data_path(file_name):
+    """教案文件对应的教案数据保存路径（用于单个部分重新生成）"""
+    return os.path.join(LESSON_DIR, os.path.splitext(os.path.basename(file_name))[0] + '.json')
 
-def update_session(session_id, data):
-    with sessions_lock:
-        if session_id not in generation_sessions:
-            generation_sessions[session_id] = {
-                'created_at': datetime.now().isoformat(),
-                'status': 'pending',
-                'progress': 0,
-                'results': []
-            }
-        generation_sessions[session_id].update(data)
-        generation_sessions[session_id]['updated_at'] = datetime.now().isoformat()
-        # 保存到文件
-        save_session_to_file(session_id, generation_sessions[session_id])
+
+def track_output(file_name):
+    """登记新生成的教案文件及其教案数据，供存储清理按访问时间淘汰"""
+    storage_sweeper.track(os.path.join(OUTPUT_DIR, file_name))
+    storage_sweeper.track(lesson_data_path(file_name))
 
 
 def get_session(session_id):
-    with sessions_lock:
-        session = generation_sessions.get(session_id)
-        if session:
-            return session
-        # 尝试从文件加载
-        session = load_session_from_file(session_id)
-        if session:
-            generation_sessions[session_id] = session
-        return session
+    return state_store.get_session(session_id)
+
 
+def start_cancel_token(session_id):
+    """创建并登记本次生成任务的取消令牌；其他worker上的取消请求通过会话的 cancel_requested 字段传递"""
+    token = CancelToken(remote_check=lambda: (get_session(session_id) or {}).get('cancel_requested', False))
+    cancellation.register(session_id, token)
+    return token
 
 
+def generation_slot(session_id, api_key, priority, token=None):
+    """向调度器申请生成名额；排队位置与预计等待时间写入会话（queue字段）供前端轮询"""
+    on_wait = (lambda info: update_session(session_id, {'queue': info})) if session_id else None
+    return GENERATION_SCHEDULER.slot(tenant_key(api_key), priority, token, on_wait)
 
 
 @app.route('/api/session', methods=['POST'])
@@ -159,22 +224,70 @@ def poll_logs(session_id):
         'status': session.get('status'),
         'progress': session.get('progress', 0),
         'results': session.get('results', []),
-        'current_topic': session.get('current_topic', '')
+        'current_topic': session.get('current_topic', ''),
+        'usage': session.get('usage'),
+        'queue': session.get('queue')
     })
 
 
+@app.route('/api/sessions/<session_id>/cancel', methods=['POST'])
+def cancel_session(session_id):
+    session = get_session(session_id)
+    if not session:
+        return jsonify({'success': False, 'message': '会话不存在'}), 404
+    if session.get('status') != 'generating':
+        return jsonify({'success': False, 'message': '任务不在生成中', 'status': session.get('status')}), 409
+
+    update_session(session_id, {'cancel_requested': True})
+    cancellation.cancel_local(session_id)
+    logging.info(f"⏹️ 收到取消请求: {session_id}")
+    return jsonify({'success': True, 'message': '已请求取消，正在进行的课时将立即中断'})
+
+
+def circuit_open_message(retry_in):
+    return f'DeepSeek服务暂时不可用，请约 {math.ceil(retry_in)}s 后重试'
+
+
+def rate_limited_message(retry_in):
+    return f'DeepSeek API配额已用尽，请约 {math.ceil(retry_in)}s 后重试'
+
+
+def _retry_later_response(status, error_type, message, retry_in, **extra):
+    return jsonify({
+        'success': False,
+        'error_type': error_type,
+        'message': message,
+        'retry_in': retry_in,
+        **extra
+    }), status, {'Retry-After': str(math.ceil(retry_in))}
 
 
+def circuit_open_response(retry_in=None, **extra):
+    """熔断器打开时的响应：503，附带 retry_in 与 Retry-After，不渲染模拟数据"""
+    retry_in = round(DEEPSEEK_BREAKER.retry_in() if retry_in is None else retry_in, 1)
+    return _retry_later_response(503, 'circuit_open', circuit_open_message(retry_in), retry_in, **extra)
+
+
+def rate_limited_response(retry_in, **extra):
+    """限流等待超过截止时间时的响应：429，附带 retry_in 与 Retry-After，不渲染模拟数据"""
+    retry_in = round(retry_in or 0, 1)
+    return _retry_later_response(429, 'rate_limited', rate_limited_message(retry_in), retry_in, **extra)
+
 
 @app.route('/api/generate', methods=['POST'])
+@profiler.profiled('generate')
 def generate():
     session_id = request.headers.get('X-Session-ID', request.json.get('session_id', 'default'))
     
     update_session(session_id, {
         'status': 'generating',
         'progress': 0,
-        'results': []
+        'results': [],
+        'usage': None,
+        'queue': None,
+        'cancel_requested': False
     })
+    token = start_cancel_token(session_id)
     
     try:
         data = request.json
@@ -199,14 +312,22 @@ def generate():
                 'message': '未提供DeepSeek API Key，请输入您的API Key'
             }), 400
         
-        os.environ['DEEPSEEK_API_KEY'] = api_key
         logging.info(f"使用用户提供的DeepSeek API Key: {api_key[:10]}...")
 
+        template_id = data.get('template_id')
+        if template_id is not None and not isinstance(template_id, str):
+            update_session(session_id, {'status': 'error', 'error': '模板ID无效'})
+            return jsonify({'success': False, 'message': '模板ID无效，template_id 必须是字符串'}), 400
+        template = template_registry.get(template_id)
+        if template is None:
+            update_session(session_id, {'status': 'error', 'error': '模板不存在'})
+            return jsonify({'success': False, 'message': '模板不存在，请重新上传模板'}), 404
+
         complete_fixed_info = {**DEFAULT_FIXED_COURSE_INFO, **fixed_course_info}
         course_info = {**complete_fixed_info, **variable_course_info}
         
         lesson_id = str(lesson_index)
-        docs = uploaded_documents.get(lesson_id, [])
+        docs = state_store.list_documents(lesson_id, include_content=True)
         if docs:
             course_info['参考文档'] = [
                 {'filename': doc.get('filename', '未命名文档'), 'content': doc.get('content', '')}
@@ -216,18 +337,31 @@ def generate():
 
         topic = course_info.get('课题名称', f'课时{lesson_index}')
         safe_topic = topic.replace('\\', '-').replace('/', '-').replace(':', '-').replace('*', '-').replace('?', '-').replace('"', '-').replace('<', '-').replace('>', '-').replace('|', '-')
-        file_name = f"{lesson_index:02d}_{safe_topic}.docx"
+        # 带随机后缀：合并（single-flight）后的相同请求各自渲染自己的文件，不会互相覆盖
+        file_name = f"{lesson_index:02d}_{safe_topic}_{uuid.uuid4().hex[:8]}.docx"
         output_path = os.path.join(OUTPUT_DIR, file_name)
 
         update_session(session_id, {'progress': 20, 'current_topic': topic})
 
-        template_path = os.path.join(BASE_DIR, 'moban.docx')
-        success = generate_lesson_plan_doc(
-            template_path=template_path,
-            output_path=output_path,
-            course_info=course_info,
-            use_mock=False
-        )
+        stats = metrics.new_call_stats()
+        with tracing.trace("lesson", session_id=session_id, topic=topic) as lesson_trace:
+            try:
+                with DeepSeekClient(api_key, cancel_token=token) as client, \
+                        generation_slot(session_id, api_key, INTERACTIVE, token), \
+                        prompt_journal.bind(session_id=session_id, file_name=file_name):
+                    success = generate_lesson_plan_doc(
+                        template_path=TEMPLATE_PATH,
+                        output_path=output_path,
+                        course_info=course_info,
+                        use_mock=False,
+                        stats=stats,
+                        data_path=lesson_data_path(file_name),
+                        client=client,
+                        template=template
+                    )
+            except GenerationCancelled:
+                success = "cancelled"
+        usage = metrics.usage_summary(stats)
 
         if success == "invalid_api_key":
             update_session(session_id, {'status': 'error', 'error_type': 'invalid_api_key'})
@@ -237,27 +371,70 @@ def generate():
                 'message': 'DeepSeek API Key无效或已过期'
             }), 401
 
+        if success == "circuit_open":
+            update_session(session_id, {
+                'status': 'error',
+                'error_type': 'circuit_open',
+                'error': circuit_open_message(DEEPSEEK_BREAKER.retry_in()),
+                'usage': metrics.summarize_usage([usage])
+            })
+            return circuit_open_response(usage=usage)
+
+        if success == "rate_limited":
+            update_session(session_id, {
+                'status': 'error',
+                'error_type': 'rate_limited',
+                'error': rate_limited_message(stats.get('retry_in') or 0),
+                'usage': metrics.summarize_usage([usage])
+            })
+            return rate_limited_response(stats.get('retry_in'), usage=usage)
+
+        if success == "cancelled":
+            result = {'topic': topic, 'status': '已取消', 'usage': usage, 'trace': tracing.export(lesson_trace)}
+            update_session(session_id, {
+                'status': 'cancelled',
+                'results': [result],
+                'usage': metrics.summarize_usage([usage])
+            })
+            return jsonify({'success': False, 'error_type': 'cancelled', 'message': '生成任务已取消', 'result': result}), 409
+
         update_session(session_id, {'progress': 100})
 
         if success and os.path.exists(output_path):
+            track_output(file_name)
             result = {
                 'topic': topic,
                 'status': '成功',
                 'file_name': file_name,
-                'file_url': f'/download/{file_name}'
+                'file_url': f'/download/{file_name}',
+                'usage': usage,
+                'time_budget': stats.get('time_budget'),
+                'trace': tracing.export(lesson_trace)
             }
-            update_session(session_id, {'status': 'completed', 'results': [result]})
+            update_session(session_id, {
+                'status': 'completed',
+                'results': [result],
+                'usage': metrics.summarize_usage([usage])
+            })
             return jsonify({'success': True, 'result': result})
         else:
-            update_session(session_id, {'status': 'error', 'error': '文件未生成'})
+            update_session(session_id, {
+                'status': 'error',
+                'error': '文件未生成',
+                'usage': metrics.summarize_usage([usage]),
+                'trace': tracing.export(lesson_trace)
+            })
             return jsonify({'success': False, 'message': '文件未生成'})
 
     except Exception as e:
         update_session(session_id, {'status': 'error', 'error': str(e)})
         return jsonify({'success': False, 'message': f'生成失败: {str(e)}'}), 500
+    finally:
+        cancellation.unregister(session_id, token)
 
 
 @app.route('/api/batch-generate', methods=['POST'])
+@profiler.profiled('batch-generate')
 def batch_generate():
     session_id = request.headers.get('X-Session-ID', request.json.get('session_id', 'default'))
     
@@ -265,14 +442,19 @@ def batch_generate():
         'status': 'generating',
         'progress': 0,
         'results': [],
+        'usage': None,
         'total_lessons': 0,
-        'current_lesson': 0
+        'current_lesson': 0,
+        'queue': None,
+        'cancel_requested': False
     })
+    token = start_cancel_token(session_id)
     
     # 配置 jiaoan logger
     jiaoan_logger = logging.getLogger('jiaoan')
     jiaoan_logger.setLevel(logging.DEBUG)
     
+    client = None
     try:
         data = request.json
         if not data:
@@ -295,7 +477,16 @@ def batch_generate():
                 'message': '未提供DeepSeek API Key'
             }), 400
         
-        os.environ['DEEPSEEK_API_KEY'] = api_key
+        template_id = data.get('template_id')
+        if template_id is not None and not isinstance(template_id, str):
+            update_session(session_id, {'status': 'error', 'error': '模板ID无效'})
+            return jsonify({'success': False, 'message': '模板ID无效，template_id 必须是字符串'}), 400
+        template = template_registry.get(template_id)
+        if template is None:
+            update_session(session_id, {'status': 'error', 'error': '模板不存在'})
+            return jsonify({'success': False, 'message': '模板不存在，请重新上传模板'}), 404
+
+        client = DeepSeekClient(api_key, cancel_token=token)
         logging.info("=" * 50)
         logging.info("🎯 开始批量生成教案")
         logging.info(f"📚 总课时数: {len(variable_course_infos)}")
@@ -314,11 +505,13 @@ def batch_generate():
         results = []
         
         for i, lesson in enumerate(variable_course_infos, 1):
+            if token.cancelled:
+                break
             lesson_id = str(lesson.get('id', ''))
             logging.info(f"📖 正在生成课时 {i}/{total_lessons}: {lesson.get('课题名称', '未命名')}")
             
-            if lesson_id and lesson_id in uploaded_documents:
-                docs = uploaded_documents[lesson_id]
+            if lesson_id:
+                docs = state_store.list_documents(lesson_id, include_content=True)
                 if docs:
                     lesson['参考文档'] = [
                         {'filename': doc['filename'], 'content': doc['content']}
@@ -335,39 +528,107 @@ def batch_generate():
             })
             
             safe_topic = topic.replace('\\', '-').replace('/', '-').replace(':', '-').replace('*', '-').replace('?', '-').replace('"', '-').replace('<', '-').replace('>', '-').replace('|', '-')
-            file_name = f"{i:02d}_{safe_topic}.docx"
+            file_name = f"{i:02d}_{safe_topic}_{uuid.uuid4().hex[:8]}.docx"
             output_path = os.path.join(OUTPUT_DIR, file_name)
             
             course_info = {**complete_fixed_info, **lesson}
             
             logging.info("📝 正在调用 AI 生成教案内容...")
             
-            template_path = os.path.join(BASE_DIR, 'moban.docx')
-            success = generate_lesson_plan_doc(
-                template_path=template_path,
-                output_path=output_path,
-                course_info=course_info,
-                use_mock=False
-            )
+            stats = metrics.new_call_stats()
+            with tracing.trace("lesson", session_id=session_id, topic=topic, lesson=i) as lesson_trace:
+                try:
+                    with generation_slot(session_id, api_key, BULK, token), \
+                            prompt_journal.bind(session_id=session_id, file_name=file_name):
+                        success = generate_lesson_plan_doc(
+                            template_path=TEMPLATE_PATH,
+                            output_path=output_path,
+                            course_info=course_info,
+                            use_mock=False,
+                            stats=stats,
+                            data_path=lesson_data_path(file_name),
+                            client=client,
+                            template=template
+                        )
+                except GenerationCancelled:
+                    success = "cancelled"
+            usage = metrics.usage_summary(stats)
             
-            if success and os.path.exists(output_path):
+            if success == "cancelled":
+                results.append({'topic': topic, 'status': '已取消', 'usage': usage, 'trace': tracing.export(lesson_trace)})
+                logging.warning(f"⏹️ 课时 {i} 已取消: {topic}")
+                break
+            if success == "circuit_open":
+                retry_in = round(DEEPSEEK_BREAKER.retry_in(), 1)
+                results.append({
+                    'topic': topic,
+                    'status': '失败',
+                    'error_type': 'circuit_open',
+                    'message': circuit_open_message(retry_in),
+                    'retry_in': retry_in,
+                    'usage': usage,
+                    'trace': tracing.export(lesson_trace)
+                })
+                logging.error(f"❌ 课时 {i} 生成失败（DeepSeek服务熔断中）: {topic}")
+            elif success == "rate_limited":
+                retry_in = round(stats.get('retry_in') or 0, 1)
+                results.append({
+                    'topic': topic,
+                    'status': '失败',
+                    'error_type': 'rate_limited',
+                    'message': rate_limited_message(retry_in),
+                    'retry_in': retry_in,
+                    'usage': usage,
+                    'trace': tracing.export(lesson_trace)
+                })
+                logging.error(f"❌ 课时 {i} 生成失败（DeepSeek API限流）: {topic}")
+            elif success and os.path.exists(output_path):
+                track_output(file_name)
                 results.append({
                     'topic': topic,
                     'status': '成功',
                     'file_name': file_name,
-                    'file_url': f'/download/{file_name}'
+                    'file_url': f'/download/{file_name}',
+                    'usage': usage,
+                    'time_budget': stats.get('time_budget'),
+                    'trace': tracing.export(lesson_trace)
                 })
                 logging.info(f"✅ 课时 {i} 生成成功: {topic}")
             else:
                 results.append({
                     'topic': topic,
                     'status': '失败',
-                    'message': '文件未生成'
+                    'message': '文件未生成',
+                    'usage': usage,
+                    'trace': tracing.export(lesson_trace)
                 })
                 logging.error(f"❌ 课时 {i} 生成失败: {topic}")
             
-            update_session(session_id, {'results': results})
+            update_session(session_id, {
+                'results': results,
+                'usage': metrics.summarize_usage([r['usage'] for r in results])
+            })
         
+        # 只按是否真的有课时未完成判断取消：最后一个课时完成后才到达的取消请求不影响已完成的批次
+        if len(results) < total_lessons or any(r['status'] == '已取消' for r in results):
+            # 已完成的课时保留结果，其余记为已取消
+            for lesson in variable_course_infos[len(results):]:
+                stats = metrics.new_call_stats()
+                metrics.record_skipped_lesson(stats)
+                results.append({
+                    'topic': lesson.get('课题名称', f'课时{len(results) + 1}'),
+                    'status': '已取消',
+                    'usage': metrics.usage_summary(stats)
+                })
+            cancelled_count = len([r for r in results if r['status'] == '已取消'])
+            update_session(session_id, {
+                'status': 'cancelled',
+                'results': results,
+                'usage': metrics.summarize_usage([r['usage'] for r in results])
+            })
+            logging.info(f"⏹️ 批量生成已取消：完成 {len(results) - cancelled_count} 个，取消 {cancelled_count} 个")
+            return jsonify({'success': False, 'error_type': 'cancelled', 'message': '生成任务已取消', 'results': results}), 409
+
         update_session(session_id, {
             'status': 'completed',
             'progress': 100,
@@ -384,9 +645,145 @@ def batch_generate():
         logging.error(f"生成失败: {str(e)}")
         update_session(session_id, {'status': 'error', 'error': str(e)})
         return jsonify({'success': False, 'message': f'生成失败: {str(e)}'}), 500
+    finally:
+        cancellation.unregister(session_id, token)
+        if client is not None:
+            client.close()
+
+
+@app.route('/api/generate/section', methods=['POST'])
+def generate_lesson_section():
+    data = request.json
+    session_id = request.headers.get('X-Session-ID', (data or {}).get('session_id'))
+    token = CancelToken()
+    previous_status = None
+    try:
+        if not data:
+            return jsonify({'success': False, 'message': '请提供生成参数'}), 400
+
+        file_name = os.path.basename(data.get('file_name', ''))
+        section = data.get('section', '')
+        api_key = data.get('api_key', '')
+        instructions = data.get('instructions', '')
+
+        if section not in SECTION_NAMES:
+            return jsonify({
+                'success': False,
+                'message': f'未知的教案部分: {section}，可选: {"、".join(SECTION_NAMES)}'
+            }), 400
+
+        if not api_key or api_key.strip() == '':
+            return jsonify({
+                'success': False,
+                'error_type': 'missing_api_key',
+                'message': '未提供DeepSeek API Key，请输入您的API Key'
+            }), 400
+
+        data_path = lesson_data_path(file_name)
+        course_info, lesson_data = load_lesson_data(data_path) if file_name else (None, None)
+        if not lesson_data:
+            return jsonify({'success': False, 'message': '教案不存在或未保存教案数据，请先完整生成'}), 404
+        # 沿用生成时的模板
+        template = template_registry.get(load_lesson_template_id(data_path))
+        if template is None:
+            return jsonify({'success': False, 'message': '教案使用的模板已不存在，请重新上传模板后完整生成'}), 404
+
+        if session_id:
+            # 与 /api/generate 相同：会话标记为生成中，可通过取消接口中断排队或进行中的请求；结束后恢复原状态
+            session = get_session(session_id) or {}
+            if session.get('status') == 'generating':
+                return jsonify({'success': False, 'message': '该会话正在生成中，请完成或取消后再重新生成'}), 409
+            previous_status = session.get('status') or 'completed'
+            update_session(session_id, {'status': 'generating', 'queue': None, 'cancel_requested': False})
+            token = start_cancel_token(session_id)
+
+        logging.info(f"🔁 重新生成「{section}」: {file_name}")
+
+        with tracing.trace("section", session_id=session_id, section=section, file_name=file_name) as section_trace:
+            stats = metrics.new_call_stats()
+            try:
+                with DeepSeekClient(api_key, cancel_token=token) as client, \
+                        generation_slot(session_id, api_key, INTERACTIVE, token), \
+                        prompt_journal.bind(session_id=session_id, file_name=file_name):
+                    new_section = generate_section(
+                        course_info, lesson_data, section, stats=stats, instructions=instructions, client=client
+                    )
+            except GenerationCancelled:
+                new_section = {'error': 'cancelled'}
+
+            if isinstance(new_section, dict) and new_section.get('error') == 'invalid_api_key':
+                return jsonify({
+                    'success': False,
+                    'error_type': 'invalid_api_key',
+                    'message': 'DeepSeek API Key无效或已过期'
+                }), 401
+            if isinstance(new_section, dict) and new_section.get('error') == 'cancelled':
+                return jsonify({
+                    'success': False,
+                    'error_type': 'cancelled',
+                    'message': '生成任务已取消',
+                    'usage': metrics.usage_summary(stats)
+                }), 409
+            if isinstance(new_section, dict) and new_section.get('error') == 'circuit_open':
+                return circuit_open_response(new_section['retry_in'], usage=metrics.usage_summary(stats))
+            if isinstance(new_section, dict) and new_section.get('error') == 'rate_limited':
+                return rate_limited_response(new_section['retry_in'], usage=metrics.usage_summary(stats))
+            if not new_section:
+                return jsonify({
+                    'success': False,
+                    'message': f'「{section}」重新生成失败，请稍后重试',
+                    'usage': metrics.usage_summary(stats)
+                }), 502
+
+            # 读取、合并、渲染、保存在同一把锁内完成：大模型生成期间同一教案的其他部分可能已被重新生成，
+            # 合并到最新的教案数据上，并发重新生成不同部分时不会丢失彼此的修改
+            output_path = os.path.join(OUTPUT_DIR, file_name)
+            with state_store.lock(f'lesson:{file_name}'):
+                course_info, lesson_data = load_lesson_data(data_path)
+                if not lesson_data:
+                    return jsonify({'success': False, 'message': '教案已被删除，请重新完整生成'}), 404
+                success = generate_lesson_plan_doc(
+                    template_path=TEMPLATE_PATH,
+                    output_path=output_path,
+                    course_info=course_info,
+                    stats=stats,
+                    lesson_data={**lesson_data, **new_section},
+                    data_path=data_path,
+                    template=template
+                )
+            usage = metrics.usage_summary(stats)
+            if not success or not os.path.exists(output_path):
+                return jsonify({'success': False, 'message': '文件未生成', 'usage': usage}), 500
+            track_output(file_name)
+
+            return jsonify({
+                'success': True,
+                'result': {
+                    'topic': course_info.get('课题名称', ''),
+                    'status': '成功',
+                    'file_name': file_name,
+                    'file_url': f'/download/{file_name}',
+                    'section': section,
+                    'content': new_section[section],
+                    'usage': usage,
+                    'time_budget': stats.get('time_budget'),
+                    'trace': tracing.export(section_trace)
+                }
+            })
+
+    except LockTimeout:
+        return jsonify({'success': False, 'message': '该教案正在被其他请求修改，请稍后重试'}), 409
+    except Exception as e:
+        logging.error(f"重新生成失败: {str(e)}")
+        return jsonify({'success': False, 'message': f'重新生成失败: {str(e)}'}), 500
+    finally:
+        if previous_status is not None:
+            cancellation.unregister(session_id, token)
+            update_session(session_id, {'status': previous_status, 'queue': None})
 
 
 @app.route('/api/upload-document', methods=['POST'])
+@profiler.profiled('upload-document')
 def upload_document():
     try:
         if 'file' not in request.files:
@@ -422,7 +819,20 @@ def upload_document():
             logging.warning(f"文件大小不匹配! 原始: {original_size}, 保存: {saved_size}")
             return jsonify({'success': False, 'message': '文件保存不完整'}), 500
         
-        content = extract_document_content(file_path)
+        try:
+            content = extract_document_content_offloaded(file_path)
+        except ExtractionTimeout as e:
+            logging.error(f"❌ 文档解析超时: {file.filename} - {e}")
+            try:
+                os.remove(file_path)
+            except OSError:
+                pass
+            return jsonify({
+                'success': False,
+                'message': f"❌ {e}: {file.filename}，请精简或拆分文档后重新上传",
+                'error_type': 'parse_timeout',
+                'filename': file.filename
+            }), 504
         
         if content is None:
             error_msg = f"❌ 文档解析失败: {file.filename} - 无法提取文档内容，请检查文件格式是否正确或文件是否损坏"
@@ -439,6 +849,7 @@ def upload_document():
                 'filename': file.filename
             }), 400
         
+        storage_sweeper.track(file_path)
         content_summary = content[:500] if content else ""
         
         doc_info = {
@@ -451,9 +862,7 @@ def upload_document():
         }
         
         # 追加文档到列表，而不是覆盖
-        if lesson_id not in uploaded_documents:
-            uploaded_documents[lesson_id] = []
-        uploaded_documents[lesson_id].append(doc_info)
+        state_store.add_document(lesson_id, doc_info)
         
         success_msg = f"✅ 文档上传成功: {file.filename} (字符数: {len(content)})"
         logging.info(success_msg)
@@ -476,10 +885,43 @@ def upload_document():
         return jsonify({'success': False, 'message': f'上传失败: {str(e)}'}), 500
 
 
+@app.route('/api/templates', methods=['GET'])
+def list_templates():
+    try:
+        return jsonify({'success': True, 'templates': template_registry.list()})
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'获取模板列表失败: {str(e)}'}), 500
+
+
+@app.route('/api/templates', methods=['POST'])
+def upload_template():
+    try:
+        if 'file' not in request.files:
+            return jsonify({'success': False, 'message': '没有上传文件'}), 400
+
+        file = request.files['file']
+        if file.filename == '':
+            return jsonify({'success': False, 'message': '文件名为空'}), 400
+        if os.path.splitext(file.filename)[1].lower() != '.docx':
+            return jsonify({'success': False, 'message': '模板只支持 .docx 格式'}), 400
+
+        try:
+            template = template_registry.register(file.filename, file.read(), request.form.get('name'))
+        except ValueError as e:
+            logging.error(f"❌ 模板无法使用: {file.filename} - {e}")
+            return jsonify({'success': False, 'message': f'模板无法使用: {e}'}), 400
+
+        return jsonify({'success': True, 'template': template.to_dict()})
+
+    except Exception as e:
+        logging.error(f"上传模板失败: {str(e)}")
+        return jsonify({'success': False, 'message': f'上传失败: {str(e)}'}), 500
+
+
 @app.route('/api/documents/<lesson_id>', methods=['GET'])
 def get_documents(lesson_id):
     try:
-        docs = uploaded_documents.get(lesson_id, [])
+        docs = state_store.list_documents(lesson_id)
         return jsonify({
             'success': True,
             'documents': [
@@ -499,14 +941,11 @@ def get_documents(lesson_id):
 @app.route('/api/documents/<lesson_id>/<filename>', methods=['DELETE'])
 def delete_document(lesson_id, filename):
     try:
-        if lesson_id in uploaded_documents:
-            docs = uploaded_documents[lesson_id]
-            for i, doc in enumerate(docs):
-                if doc['filename'] == filename:
-                    if os.path.exists(doc['filepath']):
-                        os.remove(doc['filepath'])
-                    uploaded_documents[lesson_id].pop(i)
-                    return jsonify({'success': True, 'message': '文档删除成功'})
+        doc = state_store.remove_document(lesson_id, filename)
+        if doc:
+            if os.path.exists(doc['filepath']):
+                os.remove(doc['filepath'])
+            return jsonify({'success': True, 'message': '文档删除成功'})
         
         return jsonify({'success': False, 'message': '文档不存在'}), 404
         
@@ -517,11 +956,34 @@ def delete_document(lesson_id, filename):
 @app.route('/download/<filename>', methods=['GET'])
 def download_file(filename):
     try:
+        storage_sweeper.touch(os.path.join(OUTPUT_DIR, os.path.basename(filename)))
+        # 教案数据与教案文件一起刷新，仍在下载的教案可以继续单独重新生成某个部分
+        storage_sweeper.touch(lesson_data_path(filename))
         return send_from_directory(OUTPUT_DIR, filename, as_attachment=True)
     except Exception as e:
         return jsonify({'success': False, 'message': f'下载失败: {str(e)}'}), 404
 
 
+@app.route('/api/profiles', methods=['GET'])
+def list_profiles():
+    if not profiler.authorized(request.headers):
+        return jsonify({'success': False, 'message': '采样分析未开启或无权访问'}), 404
+    return jsonify({'success': True, 'profiles': profiler.list_profiles()})
+
+
+@app.route('/api/profiles/<profile_id>', methods=['GET'])
+def download_profile(profile_id):
+    if not profiler.authorized(request.headers):
+        return jsonify({'success': False, 'message': '采样分析未开启或无权访问'}), 404
+    path = profiler.profile_path(profile_id)
+    if not path or not os.path.exists(path):
+        return jsonify({'success': False, 'message': '采样结果不存在'}), 404
+    return send_from_directory(
+        profiler.profile_directory(), os.path.basename(path),
+        as_attachment=True, mimetype='text/plain; charset=utf-8'
+    )
+
+
 @app.route('/health', methods=['GET'])
 def health_check():
     return jsonify({'status': 'healthy'}), 200
@@ -532,6 +994,16 @@ def ping():
     return 'pong', 200
 
 
+@app.route('/api/startup', methods=['GET'])
+def startup_report():
+    return jsonify({'success': True, **startup.report()})
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def serve_frontend(path):
@@ -541,6 +1013,16 @@ def serve_frontend(path):
         return send_from_directory(STATIC_DIR, 'index.html')
 
 
+startup.mark("app_import")
+
+
 if __name__ == '__main__':
+    from werkzeug.serving import make_server
+
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port, debug=False, threaded=True)
+    # 与 app.run 相同的开发服务器，但先绑定端口再预热依赖，窗口出现地址时即可访问
+    server = make_server('0.0.0.0', port, app, threaded=True)
+    startup.mark("port_bound")
+    logger.info(f"🚀 服务已启动: http://localhost:{port}（启动耗时 {startup.report()['phases']['port_bound']:.2f}s）")
+    startup.start_prewarm()
+    server.serve_forever()
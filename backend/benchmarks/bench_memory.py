@@ -0,0 +1,366 @@
+"""
+内存峰值测试 - 用合成的大输入分别测量各文档解析器、上传接口和长批量生成的内存占用
+
+每个场景在独立的子进程中运行（RSS不受其他场景影响），报告：
+    peak_rss_mib     场景运行期间子进程的RSS峰值
+    rss_growth_mib   RSS峰值相对场景开始前（已完成导入）的增长
+    traced_peak_mib  tracemalloc统计的Python对象分配峰值
+    top_allocations  场景结束时（结果仍被引用）占用最多的分配位置
+
+场景：
+    extract:<格式>[规模]   document_processor 中各格式的解析函数
+    upload:<格式>[规模]    POST /api/upload-document（txt文件大小见 SIZES 的 upload_mib）
+    batch[规模]            POST /api/batch-generate，课时数见 SIZES 的 batch_lessons，
+                          每个课时关联一份 doc_chars 字的参考文档；大模型由本地模拟服务代替（零延迟）
+
+用法：
+    python benchmarks/bench_memory.py --sizes small,large --output memory.json
+    python benchmarks/bench_memory.py --scenarios upload,batch --ceilings benchmarks/memory_ceilings.json
+
+任一场景超过上限文件（见 memory_ceilings.json）中的限制即以退出码1结束，可直接用于CI
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+import fixtures
+from fixtures import SIZES
+
+EXTRACTORS = {
+    "docx": "extract_text_from_docx",
+    "pptx": "extract_text_from_pptx",
+    "xlsx": "extract_text_from_excel",
+    "pdf": "extract_text_from_pdf",
+    "txt": "extract_text_from_txt",
+    "rtf": "extract_text_from_rtf",
+}
+UPLOAD_FORMATS = ("docx", "txt")
+DEFAULT_CEILINGS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "memory_ceilings.json")
+
+MIB = 1024 * 1024
+
+
+def current_rss() -> int:
+    """当前进程的RSS（字节）；读取不到 /proc 时退回 ru_maxrss"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux为KiB，macOS为字节
+        return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+class RssSampler:
+    """后台线程定期读取RSS，记录峰值"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak = current_rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, current_rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+
+def _short_path(filename: str) -> str:
+    """分配位置的简短路径：项目内相对backend目录，第三方库相对site-packages，标准库只保留文件名"""
+    if filename.startswith(fixtures.BACKEND_DIR):
+        return os.path.relpath(filename, fixtures.BACKEND_DIR)
+    marker = "site-packages" + os.sep
+    if marker in filename:
+        return filename.split(marker, 1)[1]
+    if filename.startswith(sys.base_prefix):
+        return os.path.basename(filename)
+    return filename
+
+
+def measure_memory(fn, top: int = 10) -> dict:
+    """运行fn并统计RSS峰值、tracemalloc峰值与占用最多的分配位置"""
+    import gc
+    gc.collect()
+    baseline = current_rss()
+    tracemalloc.start()
+    try:
+        with RssSampler() as sampler:
+            started = time.perf_counter()
+            result = fn()
+            seconds = time.perf_counter() - started
+        _, traced_peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ))
+    finally:
+        tracemalloc.stop()
+    del result
+
+    allocations = []
+    for stat in snapshot.statistics("lineno")[:top]:
+        frame = stat.traceback[0]
+        allocations.append({
+            "site": f"{_short_path(frame.filename)}:{frame.lineno}",
+            "size_kib": round(stat.size / 1024, 1),
+            "count": stat.count
+        })
+    return {
+        "seconds": round(seconds, 3),
+        "peak_rss_mib": round(sampler.peak / MIB, 1),
+        "rss_growth_mib": round((sampler.peak - baseline) / MIB, 1),
+        "traced_peak_mib": round(traced_peak / MIB, 1),
+        "top_allocations": allocations
+    }
+
+
+# ---- 子进程中运行的场景 ----
+
+def scenario_extract(fmt: str, path: str) -> dict:
+    import document_processor as dp
+    fn = getattr(dp, EXTRACTORS[fmt])
+    result = measure_memory(lambda: fn(path))
+    result["input_mib"] = round(os.path.getsize(path) / MIB, 2)
+    return result
+
+
+def _api_client(data_dir: str):
+    os.environ["RENDER_DATA_DIR"] = data_dir
+    os.environ["STATE_BACKEND"] = "local"
+    os.environ["EXTRACTION_WORKERS"] = "0"
+    import logging
+    logging.disable(logging.CRITICAL)
+    import api_server
+    return api_server, api_server.app.test_client()
+
+
+def scenario_upload(path: str, data_dir: str) -> dict:
+    _, client = _api_client(data_dir)
+    filename = os.path.basename(path)
+
+    def upload():
+        with open(path, "rb") as f:
+            response = client.post(
+                "/api/upload-document",
+                data={"file": (f, filename), "lesson_id": "1"},
+                content_type="multipart/form-data"
+            )
+        if response.status_code != 200:
+            raise RuntimeError(f"上传失败: {response.status_code} {response.get_data(as_text=True)[:200]}")
+        return response
+
+    result = measure_memory(upload)
+    result["input_mib"] = round(os.path.getsize(path) / MIB, 2)
+    return result
+
+
+def scenario_batch(size: str, data_dir: str) -> dict:
+    spec = SIZES[size]
+    api_server, client = _api_client(data_dir)
+    lessons = []
+    for i in range(1, spec["batch_lessons"] + 1):
+        lessons.append({**fixtures.make_course_info(), "课题名称": f"课题{i}"})
+        api_server.state_store.add_document(str(i), {
+            "filename": f"参考资料{i}.docx",
+            "filepath": "",
+            "file_size": 0,
+            "content": fixtures.make_text(spec["doc_chars"], seed=i),
+            "content_summary": "",
+            "upload_time": datetime.now().isoformat()
+        })
+
+    def batch():
+        response = client.post("/api/batch-generate", json={
+            "api_key": "sk-memory-bench",
+            "session_id": "memory-bench",
+            "variable_course_infos": lessons
+        })
+        if response.status_code != 200:
+            raise RuntimeError(f"批量生成失败: {response.status_code} {response.get_data(as_text=True)[:200]}")
+        return response
+
+    result = measure_memory(batch)
+    result["lessons"] = spec["batch_lessons"]
+    return result
+
+
+def run_one(args) -> dict:
+    kind, _, fmt = args.scenario.partition(":")
+    if kind == "extract":
+        return scenario_extract(fmt, args.path)
+    if kind == "upload":
+        return scenario_upload(args.path, args.data_dir)
+    if kind == "batch":
+        return scenario_batch(args.size, args.data_dir)
+    raise ValueError(f"未知的场景: {args.scenario}")
+
+
+# ---- 主进程：准备输入、逐个场景启动子进程、检查上限 ----
+
+def _start_mock_server() -> str:
+    """在本进程内启动零延迟的模拟DeepSeek服务，返回接口地址"""
+    import logging
+    import socket
+    from werkzeug.serving import make_server
+    from mock_deepseek_server import create_app, LatencyModel
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = make_server("127.0.0.1", port, create_app(latency=LatencyModel("fixed:0")), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{port}/v1/chat/completions"
+
+
+def _spawn(scenario: str, size: str, work_dir: str, env: dict, path: str = None) -> dict:
+    data_dir = tempfile.mkdtemp(prefix="data_", dir=work_dir)
+    cmd = [sys.executable, os.path.abspath(__file__), "--run-one", scenario, "--size", size, "--data-dir", data_dir]
+    if path:
+        cmd += ["--path", path]
+    proc = subprocess.run(cmd, capture_output=True, text=True, env=env, cwd=work_dir)
+    shutil.rmtree(data_dir, ignore_errors=True)
+    lines = proc.stdout.strip().splitlines()
+    if proc.returncode != 0 or not lines:
+        return {"error": (proc.stderr.strip().splitlines() or ["子进程异常退出"])[-1]}
+    return json.loads(lines[-1])
+
+
+def run_suite(sizes: list, scenarios: set) -> dict:
+    work_dir = tempfile.mkdtemp(prefix="jiaoan_memory_")
+    env = {**os.environ, "PROMPT_JOURNAL": "0", "TRACING": "1", "PYTHONPATH": fixtures.BACKEND_DIR}
+    if "batch" in scenarios:
+        env["DEEPSEEK_API_URL"] = _start_mock_server()
+    results = {}
+    try:
+        for size in sizes:
+            print(f"📏 规模 {size} ...", file=sys.stderr)
+            spec = SIZES[size]
+            paths = {}
+            if scenarios & {"extract", "upload"}:
+                paths = fixtures.build_document_fixtures(os.path.join(work_dir, "docs"), size)
+            if "extract" in scenarios:
+                for fmt in EXTRACTORS:
+                    results[f"extract:{fmt}[{size}]"] = _spawn(f"extract:{fmt}", size, work_dir, env, paths[f".{fmt}"])
+            if "upload" in scenarios:
+                upload_txt = fixtures.make_txt(os.path.join(work_dir, "docs", f"upload_{size}.txt"),
+                                               spec["upload_mib"] * 1024)
+                for fmt in UPLOAD_FORMATS:
+                    path = upload_txt if fmt == "txt" else paths[f".{fmt}"]
+                    results[f"upload:{fmt}[{size}]"] = _spawn(f"upload:{fmt}", size, work_dir, env, path)
+            if "batch" in scenarios:
+                results[f"batch[{size}]"] = _spawn("batch", size, work_dir, env)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sizes": {size: SIZES[size] for size in sizes}
+        },
+        "results": results
+    }
+
+
+def check_ceilings(report: dict, ceilings: dict) -> list:
+    """
+    检查上限，返回 [(场景, 指标, 上限, 实际值)]
+    上限文件格式：{"default": {指标: MiB}, "<场景名或前缀>": {指标: MiB}}，场景名匹配优先于前缀匹配
+    """
+    violations = []
+    for name, result in report["results"].items():
+        if "error" in result:
+            violations.append((name, "error", None, result["error"]))
+            continue
+        limits = dict(ceilings.get("default", {}))
+        prefix = name.split("[")[0]
+        limits.update(ceilings.get(prefix, {}))
+        limits.update(ceilings.get(name, {}))
+        for metric, limit in limits.items():
+            value = result.get(metric)
+            if value is not None and value > limit:
+                violations.append((name, metric, limit, value))
+    return violations
+
+
+def print_report(report: dict, violations: list):
+    print(f"{'场景':<28}{'耗时(s)':>9}{'RSS峰值':>10}{'RSS增长':>10}{'分配峰值':>10}  (MiB)")
+    for name, r in report["results"].items():
+        if "error" in r:
+            print(f"{name:<28}  ❌ {r['error']}")
+            continue
+        print(f"{name:<28}{r['seconds']:>9.2f}{r['peak_rss_mib']:>10.1f}{r['rss_growth_mib']:>10.1f}"
+              f"{r['traced_peak_mib']:>10.1f}")
+        for alloc in r["top_allocations"][:3]:
+            print(f"{'':<30}{alloc['size_kib']:>10.1f} KiB  {alloc['site']}")
+    if violations:
+        print("\n超出上限：")
+        for name, metric, limit, value in violations:
+            print(f"  ❌ {name:<28}{metric:<18}上限 {limit}  实际 {value}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="内存峰值测试")
+    parser.add_argument("--sizes", default="small,medium,large", help="逗号分隔：small,medium,large")
+    parser.add_argument("--scenarios", default="extract,upload,batch", help="逗号分隔：extract,upload,batch")
+    parser.add_argument("--ceilings", default=DEFAULT_CEILINGS, help="内存上限JSON文件")
+    parser.add_argument("--output", help="将结果写入JSON文件")
+    # 子进程内部使用
+    parser.add_argument("--run-one", dest="scenario", help=argparse.SUPPRESS)
+    parser.add_argument("--size", help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    parser.add_argument("--data-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.scenario:
+        print(json.dumps(run_one(args), ensure_ascii=False))
+        return 0
+
+    sizes = [s.strip() for s in args.sizes.split(",") if s.strip()]
+    unknown = [s for s in sizes if s not in SIZES]
+    if unknown:
+        parser.error(f"未知的规模: {', '.join(unknown)}")
+
+    report = run_suite(sizes, {s.strip() for s in args.scenarios.split(",")})
+    ceilings = {}
+    if args.ceilings and os.path.exists(args.ceilings):
+        with open(args.ceilings, encoding="utf-8") as f:
+            ceilings = json.load(f)
+    violations = check_ceilings(report, ceilings)
+    report["violations"] = [
+        {"scenario": name, "metric": metric, "ceiling": limit, "value": value}
+        for name, metric, limit, value in violations
+    ]
+
+    print_report(report, violations)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    return 1 if violations else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
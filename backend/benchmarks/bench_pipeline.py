@@ -0,0 +1,288 @@
+"""
+文档流水线微基准测试 - 在不同规模的生成数据上分别测量各阶段的耗时与内存峰值
+
+覆盖阶段：
+    模板加载 LessonPlanDoc、fill_content_info / fill_content_module / fill_process_table、save、
+    _build_prompt、parse_lesson_plan_json（合法JSON与需要修复的JSON）、
+    document_processor 中全部 extract_text_from_* 函数
+
+用法：
+    python benchmarks/bench_pipeline.py --output bench.json
+    python benchmarks/bench_pipeline.py --sizes small,medium --repeat 5 --baseline bench.json --threshold 0.2
+
+与基准结果对比时，任一阶段的中位耗时或内存峰值劣化超过阈值即以退出码1结束，可直接用于CI
+"""
+import argparse
+import contextlib
+import gc
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import fixtures
+from fixtures import SIZES, TEMPLATE_PATH
+
+
+def measure(fn, setup=None, repeat: int = 5, warmup: int = 1) -> dict:
+    """
+    分别测量耗时与内存：先计时repeat次（不开tracemalloc，避免干扰耗时），
+    再单独运行一次统计tracemalloc峰值。setup的返回值作为fn的参数，不计入耗时
+    """
+    def run_once():
+        state = setup() if setup else None
+        gc.collect()
+        started = time.perf_counter()
+        fn(state)
+        return time.perf_counter() - started
+
+    for _ in range(warmup):
+        run_once()
+    timings = [run_once() for _ in range(repeat)]
+
+    state = setup() if setup else None
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn(state)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "runs": repeat,
+        "min_ms": round(min(timings) * 1000, 3),
+        "median_ms": round(statistics.median(timings) * 1000, 3),
+        "mean_ms": round(statistics.fmean(timings) * 1000, 3),
+        "stdev_ms": round(statistics.stdev(timings) * 1000, 3) if len(timings) > 1 else 0.0,
+        "peak_kib": round(peak / 1024, 1)
+    }
+
+
+@contextlib.contextmanager
+def _quiet():
+    """屏蔽被测函数的print输出"""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def _malformed_json(lesson_data: dict) -> str:
+    """构造典型的大模型格式错误：说明文字、中文引号、尾随逗号"""
+    text = json.dumps(lesson_data, ensure_ascii=False, indent=4)
+    text = text.replace('": "', '": “', 5).replace('"\n    }', '",\n    }', 3)
+    return f"好的，以下是教案：\n```json\n{text}\n```"
+
+
+def bench_document_stages(size: str, repeat: int, work_dir: str) -> dict:
+    from docx_utils import LessonPlanDoc
+    from utils import (format_analysis_text, format_objectives_text, format_list_text,
+                       format_methods_text, format_homework_text)
+
+    spec = SIZES[size]
+    lesson_data = fixtures.make_lesson_data(spec["steps"])
+    course_info = fixtures.make_course_info()
+    modules = [
+        (3, format_analysis_text(lesson_data["教学内容及学情分析"])),
+        (4, format_objectives_text(lesson_data["教学目标"])),
+        (5, format_list_text(lesson_data["教学重点"])),
+        (6, format_list_text(lesson_data["教学难点"])),
+        (7, format_methods_text(lesson_data["教学方法与教学资源"])),
+        (8, format_list_text(lesson_data["思政元素"])),
+    ]
+    homework = format_homework_text(lesson_data["课外作业"])
+    steps = lesson_data["教学实施过程"]
+    output_path = os.path.join(work_dir, f"bench_{size}.docx")
+
+    def load(_=None):
+        return LessonPlanDoc(TEMPLATE_PATH)
+
+    def filled(_=None):
+        doc = load()
+        doc.fill_content_info(course_info)
+        for row, text in modules:
+            doc.fill_content_module(row, text)
+        doc.fill_process_table(steps, homework)
+        return doc
+
+    def fill_modules(doc):
+        for row, text in modules:
+            doc.fill_content_module(row, text)
+
+    with _quiet():
+        return {
+            "template_load": measure(load, repeat=repeat),
+            "fill_content_info": measure(lambda doc: doc.fill_content_info(course_info), load, repeat),
+            "fill_content_module": measure(fill_modules, load, repeat),
+            "fill_process_table": measure(lambda doc: doc.fill_process_table(steps, homework), load, repeat),
+            "save": measure(lambda doc: doc.save(output_path), filled, repeat),
+        }
+
+
+def bench_prompt_and_parse(size: str, repeat: int) -> dict:
+    from ai_generator import _build_prompt
+    from utils import parse_lesson_plan_json
+
+    spec = SIZES[size]
+    course_info = fixtures.make_course_info(spec["doc_chars"])
+    lesson_data = fixtures.make_lesson_data(spec["steps"])
+    valid = json.dumps(lesson_data, ensure_ascii=False, indent=4)
+    malformed = _malformed_json(lesson_data)
+
+    with _quiet():
+        return {
+            "build_prompt": measure(lambda _: _build_prompt(course_info), repeat=repeat),
+            "parse_json": measure(lambda _: parse_lesson_plan_json(valid), repeat=repeat),
+            "parse_json_repair": measure(lambda _: parse_lesson_plan_json(malformed), repeat=repeat),
+        }
+
+
+def bench_extractors(size: str, repeat: int, work_dir: str) -> tuple:
+    """返回 (结果, 跳过原因)"""
+    import document_processor as dp
+
+    paths = fixtures.build_document_fixtures(os.path.join(work_dir, "docs"), size)
+    cases = {
+        "extract_text_from_docx": paths[".docx"],
+        "extract_text_from_pptx": paths[".pptx"],
+        "extract_text_from_excel": paths[".xlsx"],
+        "extract_text_from_pdf": paths[".pdf"],
+        "extract_text_from_txt": paths[".txt"],
+        "extract_text_from_rtf": paths[".rtf"],
+        "try_read_as_text": paths[".txt"],
+    }
+    skipped = {}
+
+    # 旧版格式需要LibreOffice生成样本，读取依赖antiword/LibreOffice
+    doc_path = fixtures.convert_with_soffice(paths[".docx"], ".doc")
+    ppt_path = fixtures.convert_with_soffice(paths[".pptx"], ".ppt")
+    if doc_path:
+        cases["extract_text_from_doc_ole"] = doc_path
+        if shutil.which("antiword"):
+            cases["extract_text_from_doc"] = doc_path
+        else:
+            skipped["extract_text_from_doc"] = "antiword未安装"
+    else:
+        skipped["extract_text_from_doc"] = skipped["extract_text_from_doc_ole"] = "LibreOffice未安装，无法生成.doc样本"
+    if ppt_path:
+        cases["extract_text_from_ppt"] = ppt_path
+    else:
+        skipped["extract_text_from_ppt"] = "LibreOffice未安装，无法生成.ppt样本"
+
+    results = {}
+    with _quiet():
+        for name, path in cases.items():
+            fn = getattr(dp, name)
+            result = measure(lambda _: fn(path), repeat=repeat)
+            result["input_kib"] = round(os.path.getsize(path) / 1024, 1)
+            results[name] = result
+    return results, skipped
+
+
+def run_suite(sizes: list, repeat: int, stages: set) -> dict:
+    work_dir = tempfile.mkdtemp(prefix="jiaoan_bench_")
+    results = {}
+    skipped = {}
+    try:
+        for size in sizes:
+            print(f"📏 规模 {size} ...", file=sys.stderr)
+            groups = {}
+            if "document" in stages:
+                groups.update(bench_document_stages(size, repeat, work_dir))
+            if "prompt" in stages:
+                groups.update(bench_prompt_and_parse(size, repeat))
+            if "extract" in stages:
+                extracted, size_skipped = bench_extractors(size, repeat, work_dir)
+                groups.update(extracted)
+                skipped.update(size_skipped)
+            for stage, result in groups.items():
+                results[f"{stage}[{size}]"] = result
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": repeat,
+            "sizes": {size: SIZES[size] for size in sizes}
+        },
+        "results": results,
+        "skipped": skipped
+    }
+
+
+def compare(report: dict, baseline: dict, threshold: float) -> list:
+    """对比基准结果，返回 [(阶段, 指标, 基准值, 当前值, 变化比例, 是否劣化)]"""
+    rows = []
+    for name, current in report["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        for metric in ("median_ms", "peak_kib"):
+            old, new = base.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            rows.append((name, metric, old, new, change, change > threshold))
+    return rows
+
+
+def print_report(report: dict, comparison: list = None):
+    print(f"{'阶段':<40}{'中位(ms)':>12}{'最小(ms)':>12}{'峰值(KiB)':>12}")
+    for name, r in report["results"].items():
+        print(f"{name:<40}{r['median_ms']:>12.3f}{r['min_ms']:>12.3f}{r['peak_kib']:>12.1f}")
+    for name, reason in report["skipped"].items():
+        print(f"{name:<40}  跳过：{reason}")
+    if comparison:
+        print("\n与基准对比：")
+        for name, metric, old, new, change, regressed in comparison:
+            flag = "❌ 劣化" if regressed else ("✅ 改善" if change < 0 else "")
+            print(f"{name:<40}{metric:>10}  {old:>10} → {new:<10} {change:+.1%} {flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="文档流水线微基准测试")
+    parser.add_argument("--sizes", default="small,medium,large", help="逗号分隔：small,medium,large")
+    parser.add_argument("--stages", default="document,prompt,extract", help="逗号分隔：document,prompt,extract")
+    parser.add_argument("--repeat", type=int, default=5, help="每个阶段的计时次数")
+    parser.add_argument("--output", help="将结果写入JSON文件")
+    parser.add_argument("--baseline", help="基准结果JSON文件，用于对比")
+    parser.add_argument("--threshold", type=float, default=0.2, help="劣化阈值（比例），默认0.2即20%%")
+    args = parser.parse_args()
+
+    sizes = [s.strip() for s in args.sizes.split(",") if s.strip()]
+    unknown = [s for s in sizes if s not in SIZES]
+    if unknown:
+        parser.error(f"未知的规模: {', '.join(unknown)}")
+
+    report = run_suite(sizes, args.repeat, {s.strip() for s in args.stages.split(",")})
+
+    comparison = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            comparison = compare(report, json.load(f), args.threshold)
+        report["comparison"] = [
+            {"stage": name, "metric": metric, "baseline": old, "current": new,
+             "change": round(change, 4), "regressed": regressed}
+            for name, metric, old, new, change, regressed in comparison
+        ]
+
+    print_report(report, comparison)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    else:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    return 1 if comparison and any(row[5] for row in comparison) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
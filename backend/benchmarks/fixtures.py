@@ -0,0 +1,197 @@
+"""
+基准测试数据生成 - 按指定规模生成各类文档和教案数据，保证每次测试输入一致
+"""
+import copy
+import os
+import random
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+TEMPLATE_PATH = os.path.join(BACKEND_DIR, "moban.docx")
+
+# 规模档位：各类文档的段落/页数/行数
+# upload_mib: 上传接口内存测试的文件大小；batch_lessons: 长批量内存测试的课时数
+SIZES = {
+    "small": {"paragraphs": 50, "tables": 2, "rows": 10, "slides": 10, "sheet_rows": 200,
+              "pages": 5, "txt_kib": 16, "steps": 5, "doc_chars": 2_000,
+              "upload_mib": 1, "batch_lessons": 5},
+    "medium": {"paragraphs": 500, "tables": 10, "rows": 30, "slides": 60, "sheet_rows": 3_000,
+               "pages": 40, "txt_kib": 256, "steps": 20, "doc_chars": 30_000,
+               "upload_mib": 10, "batch_lessons": 20},
+    "large": {"paragraphs": 3_000, "tables": 40, "rows": 60, "slides": 300, "sheet_rows": 30_000,
+              "pages": 200, "txt_kib": 4_096, "steps": 80, "doc_chars": 150_000,
+              "upload_mib": 45, "batch_lessons": 60},
+}
+
+_WORDS = ("焊接", "电路", "元器件", "安全规范", "实训", "工艺", "检测", "装配", "调试", "材料",
+          "电烙铁", "焊锡", "助焊剂", "温度", "质量", "标准", "操作", "步骤", "学生", "教师")
+
+
+def _sentence(rng: random.Random, words: int = 12) -> str:
+    return "".join(rng.choice(_WORDS) for _ in range(words)) + "。"
+
+
+def make_text(chars: int, seed: int = 0) -> str:
+    """生成指定字符数的中文文本"""
+    rng = random.Random(seed)
+    parts = []
+    total = 0
+    while total < chars:
+        s = _sentence(rng)
+        parts.append(s)
+        total += len(s)
+    return "".join(parts)[:chars]
+
+
+def make_docx(path: str, paragraphs: int, tables: int, rows: int, seed: int = 0) -> str:
+    from docx import Document
+    rng = random.Random(seed)
+    doc = Document()
+    for _ in range(paragraphs):
+        doc.add_paragraph(_sentence(rng, 20))
+    for _ in range(tables):
+        table = doc.add_table(rows=rows, cols=4)
+        for row in table.rows:
+            for cell in row.cells:
+                cell.text = _sentence(rng, 4)
+    doc.save(path)
+    return path
+
+
+def make_pptx(path: str, slides: int, seed: int = 0) -> str:
+    from pptx import Presentation
+    from pptx.util import Inches
+    rng = random.Random(seed)
+    prs = Presentation()
+    layout = prs.slide_layouts[1]
+    for i in range(slides):
+        slide = prs.slides.add_slide(layout)
+        slide.shapes.title.text = f"第{i + 1}页 " + _sentence(rng, 4)
+        slide.placeholders[1].text = "\n".join(_sentence(rng) for _ in range(5))
+        if i % 5 == 0:
+            table = slide.shapes.add_table(4, 3, Inches(1), Inches(4), Inches(6), Inches(2)).table
+            for r in range(4):
+                for c in range(3):
+                    table.cell(r, c).text = _sentence(rng, 3)
+    prs.save(path)
+    return path
+
+
+def make_xlsx(path: str, rows: int, cols: int = 8, seed: int = 0) -> str:
+    import openpyxl
+    rng = random.Random(seed)
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("数据")
+    for r in range(rows):
+        ws.append([_sentence(rng, 3) if c % 2 else rng.randint(0, 10_000) for c in range(cols)])
+    wb.save(path)
+    return path
+
+
+def make_pdf(path: str, pages: int, lines_per_page: int = 40, seed: int = 0) -> str:
+    """生成包含ASCII文本的多页PDF（手工拼装，不依赖额外库）"""
+    rng = random.Random(seed)
+    words = ("solder", "circuit", "component", "safety", "training", "process", "inspection", "assembly")
+    objects = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    catalog_id = add(b"")
+    pages_id = add(b"")
+    font_id = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    page_ids = []
+    for _ in range(pages):
+        lines = [" ".join(rng.choice(words) for _ in range(10)) for _ in range(lines_per_page)]
+        stream = "BT /F1 10 Tf 50 780 Td 14 TL " + " ".join(f"({line}) '" for line in lines) + " ET"
+        stream_bytes = stream.encode("latin-1")
+        content_id = add(b"<< /Length %d >>\nstream\n" % len(stream_bytes) + stream_bytes + b"\nendstream")
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (pages_id, font_id, content_id)
+        ))
+    objects[catalog_id - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id
+    kids = b" ".join(b"%d 0 R" % pid for pid in page_ids)
+    objects[pages_id - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + body + b"\nendobj\n"
+    xref_at = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog_id, xref_at)
+    with open(path, "wb") as f:
+        f.write(out)
+    return path
+
+
+def make_txt(path: str, kib: int, seed: int = 0) -> str:
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(make_text(kib * 1024 // 3, seed))
+    return path
+
+
+def make_rtf(path: str, paragraphs: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    words = ("solder", "circuit", "component", "safety", "training", "process")
+    body = "".join(
+        "{\\pard " + " ".join(rng.choice(words) for _ in range(15)) + "\\par}\n" for _ in range(paragraphs)
+    )
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("{\\rtf1\\ansi\\deff0{\\fonttbl{\\f0 Arial;}}\n" + body + "}")
+    return path
+
+
+def make_lesson_data(steps: int) -> dict:
+    """以模拟教案为基础，生成指定环节数的教案数据"""
+    from ai_generator import get_mock_lesson_data
+    data = get_mock_lesson_data({})
+    base_steps = data["教学实施过程"]
+    data["教学实施过程"] = [copy.deepcopy(base_steps[i % len(base_steps)]) for i in range(steps)]
+    return data
+
+
+def make_course_info(doc_chars: int = 0) -> dict:
+    from config import DEFAULT_COURSE_INFO
+    info = dict(DEFAULT_COURSE_INFO)
+    if doc_chars:
+        info["参考文档"] = [{"filename": "参考资料.docx", "content": make_text(doc_chars)}]
+    return info
+
+
+def build_document_fixtures(directory: str, size: str) -> dict:
+    """在directory中生成某一规模的全部文档，返回 {扩展名: 路径}"""
+    spec = SIZES[size]
+    os.makedirs(directory, exist_ok=True)
+    return {
+        ".docx": make_docx(os.path.join(directory, f"{size}.docx"), spec["paragraphs"], spec["tables"], spec["rows"]),
+        ".pptx": make_pptx(os.path.join(directory, f"{size}.pptx"), spec["slides"]),
+        ".xlsx": make_xlsx(os.path.join(directory, f"{size}.xlsx"), spec["sheet_rows"]),
+        ".pdf": make_pdf(os.path.join(directory, f"{size}.pdf"), spec["pages"]),
+        ".txt": make_txt(os.path.join(directory, f"{size}.txt"), spec["txt_kib"]),
+        ".rtf": make_rtf(os.path.join(directory, f"{size}.rtf"), spec["paragraphs"]),
+    }
+
+
+def convert_with_soffice(path: str, target_ext: str) -> str:
+    """用LibreOffice把docx/pptx转成旧版doc/ppt，未安装LibreOffice时返回None"""
+    import shutil
+    import subprocess
+    soffice = shutil.which("soffice") or shutil.which("libreoffice")
+    if not soffice:
+        return None
+    out_dir = os.path.dirname(path)
+    result = subprocess.run(
+        [soffice, "--headless", "--convert-to", target_ext.lstrip("."), "--outdir", out_dir, path],
+        capture_output=True, timeout=300
+    )
+    converted = os.path.splitext(path)[0] + target_ext
+    return converted if result.returncode == 0 and os.path.exists(converted) else None
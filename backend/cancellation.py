@@ -0,0 +1,84 @@
+"""
+生成任务取消 - 批量循环、重试循环和进行中的HTTP请求都通过 CancelToken 协作取消
+
+取消请求可能落在另一个worker上，因此取消标记同时写入共享状态（会话的 cancel_requested 字段）；
+本进程内的任务通过注册表立即收到通知，其他进程的任务定期检查共享状态
+"""
+import threading
+import time
+
+
+class GenerationCancelled(Exception):
+    """生成任务已被取消"""
+
+
+class CancelToken:
+    """
+    取消令牌
+
+    remote_check: 可选的函数，返回True表示其他进程已请求取消；
+                  最多每 remote_interval 秒调用一次，避免频繁读取共享状态
+    """
+
+    def __init__(self, remote_check=None, remote_interval: float = 1.0):
+        self._event = threading.Event()
+        self._remote_check = remote_check
+        self._remote_interval = remote_interval
+        self._last_remote = 0.0
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        if self._event.is_set():
+            return True
+        if self._remote_check is not None:
+            now = time.monotonic()
+            if now - self._last_remote >= self._remote_interval:
+                self._last_remote = now
+                try:
+                    if self._remote_check():
+                        self._event.set()
+                except Exception:
+                    pass
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise GenerationCancelled()
+
+    def wait(self, seconds: float) -> bool:
+        """可被取消打断的等待，返回True表示已取消"""
+        deadline = time.monotonic() + seconds
+        while not self.cancelled:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            self._event.wait(min(remaining, self._remote_interval))
+        return True
+
+
+_tokens = {}
+_tokens_lock = threading.Lock()
+
+
+def register(session_id: str, token: CancelToken):
+    with _tokens_lock:
+        _tokens[session_id] = token
+
+
+def unregister(session_id: str, token: CancelToken):
+    with _tokens_lock:
+        if _tokens.get(session_id) is token:
+            del _tokens[session_id]
+
+
+def cancel_local(session_id: str) -> bool:
+    """取消本进程内运行的任务，返回是否找到该任务"""
+    with _tokens_lock:
+        token = _tokens.get(session_id)
+    if token is None:
+        return False
+    token.cancel()
+    return True
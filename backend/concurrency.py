@@ -0,0 +1,122 @@
+"""
+并发辅助 - 让阻塞操作在gevent worker下不卡住事件循环（hub）
+
+    run_blocking(fn, ...)            在gevent下放到原生线程池执行，普通线程worker下直接执行
+    extract_document_content_offloaded(path)
+                                     文档解析（CPU密集，且可能调用antiword/LibreOffice子进程）
+                                     放到独立的进程池执行；超过 EXTRACTION_TIMEOUT 秒抛出 ExtractionTimeout，
+                                     并结束卡住的子进程、重建进程池
+
+进程池使用 spawn 启动子进程，gevent monkey patch 下同样可用（见 tests/test_concurrency.py）
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from config import EXTRACTION_WORKERS, EXTRACTION_TIMEOUT
+
+logger = logging.getLogger('jiaoan')
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class ExtractionTimeout(Exception):
+    """文档解析超过 EXTRACTION_TIMEOUT 秒"""
+
+
+def gevent_active() -> bool:
+    """当前进程是否已被gevent monkey patch（gunicorn gevent worker）"""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('threading')
+
+
+def run_blocking(fn, *args, **kwargs):
+    """执行会阻塞的调用：gevent下交给hub的原生线程池，其余情况直接调用"""
+    if gevent_active():
+        import gevent
+        return gevent.get_hub().threadpool.apply(fn, args, kwargs)
+    return fn(*args, **kwargs)
+
+
+def _extraction_workers() -> int:
+    """解析进程数：auto 表示仅在gevent下启用，数量为CPU核数"""
+    if EXTRACTION_WORKERS == "auto":
+        return (os.cpu_count() or 1) if gevent_active() else 0
+    return max(0, int(EXTRACTION_WORKERS))
+
+
+def get_extraction_pool() -> ProcessPoolExecutor:
+    """文档解析进程池（懒加载；未启用时返回None）"""
+    global _pool
+    workers = _extraction_workers()
+    if workers <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # spawn：子进程不继承gevent的hub和monkey patch
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            logger.info(f"🧵 文档解析进程池已启动（{workers} 个进程）")
+        return _pool
+
+
+def _reset_pool(broken: ProcessPoolExecutor, terminate: bool = False):
+    """
+    丢弃进程池，下次使用时重建；terminate=True 时结束其子进程
+    （运行中的任务无法取消，卡住的子进程只能结束；同一进程池中其他进行中的解析会收到 BrokenProcessPool）
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    if terminate:
+        terminate_workers = getattr(broken, 'terminate_workers', None)  # Python 3.14+
+        if terminate_workers is not None:
+            terminate_workers()
+        else:
+            for process in list((broken._processes or {}).values()):
+                process.terminate()
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def run_in_pool(pool: ProcessPoolExecutor, fn, *args, timeout: float = EXTRACTION_TIMEOUT):
+    """在进程池中执行fn(*args)，超过timeout秒时结束子进程、重建进程池并抛出 ExtractionTimeout"""
+    future = pool.submit(fn, *args)
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeoutError:
+        logger.error(f"❌ 文档解析超过 {timeout:g}s 未完成，结束解析进程并重建进程池")
+        _reset_pool(pool, terminate=True)
+        raise ExtractionTimeout(f"文档解析超时（超过 {timeout:g} 秒）")
+
+
+def extract_document_content_offloaded(file_path: str):
+    """
+    提取文档文本，进程池启用时在子进程中执行；子进程崩溃时重建进程池并在本进程重试一次，
+    超时抛出 ExtractionTimeout
+    """
+    from document_processor import extract_document_content
+
+    pool = get_extraction_pool()
+    if pool is None:
+        return run_blocking(extract_document_content, file_path)
+    try:
+        return run_in_pool(pool, extract_document_content, file_path)
+    except BrokenProcessPool:
+        logger.error("❌ 文档解析进程异常退出，重建进程池并在本进程重试")
+        _reset_pool(pool)
+        return run_blocking(extract_document_content, file_path)
+
+
+def shutdown_extraction_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
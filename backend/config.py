@@ -19,6 +19,141 @@ MODEL_CONFIG = {
     "stream": False
 }
 
+# JSON输出模式（response_format: json_object），对不支持的兼容接口可通过环境变量关闭
+if os.getenv("DEEPSEEK_JSON_MODE", "1") != "0":
+    MODEL_CONFIG["response_format"] = {"type": "json_object"}
+
+# 重试策略：指数退避+抖动，单课时整体截止时间（秒）
+RETRY_CONFIG = {
+    "max_attempts": int(os.getenv("DEEPSEEK_MAX_ATTEMPTS", "5")),
+    "base_delay": float(os.getenv("DEEPSEEK_RETRY_BASE_DELAY", "2")),
+    "max_delay": float(os.getenv("DEEPSEEK_RETRY_MAX_DELAY", "30")),
+    "multiplier": 2.0,
+    "deadline": float(os.getenv("DEEPSEEK_LESSON_DEADLINE", "300")),
+    "request_timeout": float(os.getenv("DEEPSEEK_REQUEST_TIMEOUT", "120"))
+}
+
+# 熔断器：连续失败次数阈值与冷却时间（秒）
+CIRCUIT_BREAKER_CONFIG = {
+    "failure_threshold": int(os.getenv("DEEPSEEK_BREAKER_THRESHOLD", "5")),
+    "recovery_timeout": float(os.getenv("DEEPSEEK_BREAKER_COOLDOWN", "60"))
+}
+
+# 客户端限流（按API Key）：每分钟请求数、每分钟Token数（0表示不限制），
+# 收到429时按比例降低速率（乘性减），之后每次成功缓慢恢复（加性增）
+# 令牌桶在每个worker进程内独立计数：多worker部署时实际上限为配置值 × worker数（WEB_CONCURRENCY），
+# 需要整体上限时按 总上限 / worker数 设置
+RATE_LIMIT_CONFIG = {
+    "requests_per_minute": float(os.getenv("DEEPSEEK_RPM_LIMIT", "60")),
+    "tokens_per_minute": float(os.getenv("DEEPSEEK_TPM_LIMIT", "300000")),
+    "decrease_factor": 0.5,
+    "increase_step": 0.05,
+    "min_scale": 0.1
+}
+
+# 合并提示词相同的并发生成请求（只调用一次大模型，结果共享），0 关闭
+SINGLE_FLIGHT_ENABLED = os.getenv("DEEPSEEK_SINGLE_FLIGHT", "1") != "0"
+
+# 生成调度：每个worker同时进行的生成数、每个API Key同时进行的生成数上限、
+# 没有历史数据时单课时耗时的估计值（秒，用于估算排队等待时间）
+# 两个上限都按worker进程计算：多worker部署时整体上限为配置值 × worker数（WEB_CONCURRENCY）
+SCHEDULER_CONFIG = {
+    "max_concurrent": int(os.getenv("GENERATION_MAX_CONCURRENT", "8")),
+    "per_key_max_in_flight": int(os.getenv("GENERATION_PER_KEY_MAX_IN_FLIGHT", "2")),
+    "initial_estimate": float(os.getenv("GENERATION_INITIAL_ESTIMATE", "60"))
+}
+
+# 调用费用估算单价（每百万Token，默认按DeepSeek官方人民币价格）
+PRICE_CURRENCY = os.getenv("DEEPSEEK_PRICE_CURRENCY", "CNY")
+PRICE_PER_MILLION_TOKENS = {
+    "prompt_cache_hit": float(os.getenv("DEEPSEEK_PRICE_CACHE_HIT", "0.5")),
+    "prompt_cache_miss": float(os.getenv("DEEPSEEK_PRICE_CACHE_MISS", "2")),
+    "completion": float(os.getenv("DEEPSEEK_PRICE_COMPLETION", "8"))
+}
+
+# 教学实施过程时间校验：每学时分钟数、每个环节的最小分钟数
+MINUTES_PER_CLASS_HOUR = int(os.getenv("MINUTES_PER_CLASS_HOUR", "45"))
+MIN_STEP_MINUTES = int(os.getenv("MIN_STEP_MINUTES", "2"))
+
+# 共享状态后端（会话、上传文档、任务队列）：
+#   local  进程内存+会话文件，只能单worker运行
+#   sqlite 单机多worker共享（WAL模式），路径默认为 数据目录/state.db
+#   redis  多机共享，需安装redis包
+STATE_BACKEND = os.getenv("STATE_BACKEND", "local")
+STATE_SQLITE_PATH = os.getenv("STATE_SQLITE_PATH", "")
+STATE_REDIS_URL = os.getenv("STATE_REDIS_URL", "redis://localhost:6379/0")
+STATE_KEY_PREFIX = os.getenv("STATE_KEY_PREFIX", "jiaoan")
+
+# 存储生命周期：生成的教案（output，及对应的教案数据lessons）、上传文件（uploads）、会话（sessions）
+# 按最后访问时间过期（小时）并限制目录总大小（MB），超过时按最近最少使用淘汰；0表示不限
+STORAGE_LIFECYCLE_CONFIG = {
+    "sweep_interval": float(os.getenv("STORAGE_SWEEP_INTERVAL", "300")),
+    "rescan_every": int(os.getenv("STORAGE_RESCAN_EVERY", "12")),
+    "min_age": float(os.getenv("STORAGE_MIN_AGE", "600")),
+    "output": {
+        "ttl_hours": float(os.getenv("OUTPUT_TTL_HOURS", "168")),
+        "max_mb": float(os.getenv("OUTPUT_MAX_MB", "1024"))
+    },
+    "uploads": {
+        "ttl_hours": float(os.getenv("UPLOAD_TTL_HOURS", "72")),
+        "max_mb": float(os.getenv("UPLOAD_MAX_MB", "512"))
+    },
+    "sessions": {
+        "ttl_hours": float(os.getenv("SESSION_TTL_HOURS", "168")),
+        "max_mb": float(os.getenv("SESSION_MAX_MB", "64"))
+    }
+}
+
+# 进程内会话缓存的最大条数（local后端，超过时淘汰最久未使用的会话，会话文件仍保留在磁盘上）
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "500"))
+
+# 提示词日志（默认关闭）：在后台线程中把每次生成的提示词与结果写入gzip压缩的分段文件，
+# 单个分段超过 segment_mb 后轮转，最多保留 max_segments 个分段；目录默认为 数据目录/prompt_journal
+PROMPT_JOURNAL_CONFIG = {
+    "enabled": os.getenv("PROMPT_JOURNAL", "0") == "1",
+    "directory": os.getenv("PROMPT_JOURNAL_DIR", ""),
+    "segment_mb": float(os.getenv("PROMPT_JOURNAL_SEGMENT_MB", "16")),
+    "max_segments": int(os.getenv("PROMPT_JOURNAL_MAX_SEGMENTS", "20")),
+    "queue_size": int(os.getenv("PROMPT_JOURNAL_QUEUE_SIZE", "256"))
+}
+
+# 分阶段追踪（每个课时的各阶段耗时写入会话结果的 trace 字段），0 关闭
+TRACING_ENABLED = os.getenv("TRACING", "1") != "0"
+
+# 按需采样分析（默认关闭）：开启后，带 X-Profile: 1 请求头（设置了 token 时还需 X-Profile-Token）的
+# 上传/生成请求会被采样，结果保存为折叠栈文件（可直接用于火焰图），通过 /api/profiles/<id> 下载
+PROFILING_CONFIG = {
+    "enabled": os.getenv("PROFILING", "0") == "1",
+    "token": os.getenv("PROFILING_TOKEN", ""),
+    "interval": float(os.getenv("PROFILING_INTERVAL", "0.005")),
+    "directory": os.getenv("PROFILING_DIR", ""),
+    "max_profiles": int(os.getenv("PROFILING_MAX_PROFILES", "50"))
+}
+
+# 启动优化：LAZY_IMPORTS=1（默认）时 python-docx、python-pptx、openpyxl、PyPDF2、requests 等
+# 重型依赖在首次使用时才导入；PREWARM_IMPORTS=1（默认）时端口开始监听后在后台线程中预先导入它们，
+# 首个请求无需等待导入。各模块导入耗时见 /api/startup 与 python startup.py
+# PREWARM_MODULES 为预热的模块（逗号分隔，按顺序导入）：默认只预热每次生成都会用到的 requests 与 python-docx；
+# 文档解析库（pptx、openpyxl、PyPDF2）只在首次解析对应格式时导入，不解析文档的worker不承担其内存
+STARTUP_CONFIG = {
+    "lazy_imports": os.getenv("LAZY_IMPORTS", "1") == "1",
+    "prewarm": os.getenv("PREWARM_IMPORTS", "1") == "1",
+    "prewarm_modules": tuple(
+        name.strip() for name in os.getenv("PREWARM_MODULES", "requests,docx,docx_utils").split(",") if name.strip()
+    )
+}
+
+# 上传文档解析进程池：auto 仅在gevent worker下启用（进程数=CPU核数），0 关闭，N 固定N个进程
+EXTRACTION_WORKERS = os.getenv("EXTRACTION_WORKERS", "auto")
+EXTRACTION_TIMEOUT = float(os.getenv("EXTRACTION_TIMEOUT", "300"))
+
+# 教案模板：各学校上传的模板保存在 TEMPLATE_DIR（默认数据目录下的 templates），
+# 每个模板只在上传时分析一次槽位；TEMPLATE_CACHE_SIZE 为每个进程内存中缓存的模板数
+TEMPLATE_CONFIG = {
+    "directory": os.getenv("TEMPLATE_DIR", ""),
+    "cache_size": int(os.getenv("TEMPLATE_CACHE_SIZE", "16"))
+}
+
 # 固定课程信息（批量生成时不变）
 DEFAULT_FIXED_COURSE_INFO = {
     "院系": "智能装备学院",
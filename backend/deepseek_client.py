@@ -0,0 +1,167 @@
+"""
+DeepSeek API客户端 - 每个请求持有自己的API Key和HTTP连接，
+不再通过进程级的 os.environ 传递凭据，多个请求可在不同线程中并发生成
+"""
+import functools
+import os
+import socket
+import threading
+import time
+import weakref
+
+from config import DEEPSEEK_API_URL
+from cancellation import CancelToken, GenerationCancelled
+import startup
+
+requests = startup.lazy_module("requests")
+
+
+@functools.lru_cache(maxsize=None)
+def _abortable_adapter_class():
+    """requests 为延迟导入，适配器类在首次创建会话时才定义"""
+
+    class _AbortableAdapter(requests.adapters.HTTPAdapter):
+        """记录自己创建的连接，abort() 直接关闭底层socket以中断进行中的请求"""
+
+        def __init__(self, *args, **kwargs):
+            self._connections = weakref.WeakSet()
+            super().__init__(*args, **kwargs)
+
+        def init_poolmanager(self, *args, **kwargs):
+            super().init_poolmanager(*args, **kwargs)
+            connections = self._connections
+
+            def tracking(pool_cls):
+                class TrackingPool(pool_cls):
+                    def _new_conn(self):
+                        conn = super()._new_conn()
+                        connections.add(conn)
+                        return conn
+                return TrackingPool
+
+            self.poolmanager.pool_classes_by_scheme = {
+                scheme: tracking(pool_cls) for scheme, pool_cls in self.poolmanager.pool_classes_by_scheme.items()
+            }
+
+        def abort(self):
+            for conn in list(self._connections):
+                sock = getattr(conn, "sock", None)
+                if sock is not None:
+                    try:
+                        sock.shutdown(socket.SHUT_RDWR)
+                    except OSError:
+                        pass
+
+    return _AbortableAdapter
+
+
+class DeepSeekClient:
+    """
+    单个调用方（一次API请求）的DeepSeek凭据与连接
+
+    用法：
+        with DeepSeekClient(api_key) as client:
+            generate_lesson_plan(course_info, client=client)
+    """
+
+    # 等待进行中的请求时检查取消标记的间隔（秒）
+    CANCEL_POLL_INTERVAL = 0.25
+
+    def __init__(self, api_key: str, api_url: str = None, session: "requests.Session" = None,
+                 cancel_token: CancelToken = None):
+        self.api_key = (api_key or "").strip()
+        self.api_url = api_url or DEEPSEEK_API_URL
+        self.cancel_token = cancel_token
+        self._session = session
+
+    @classmethod
+    def from_env(cls) -> "DeepSeekClient":
+        """从环境变量 DEEPSEEK_API_KEY 读取凭据（命令行运行时使用）"""
+        return cls(os.environ.get('DEEPSEEK_API_KEY', ''))
+
+    @property
+    def masked_key(self) -> str:
+        key = self.api_key
+        return f"{key[:10]}...{key[-4:] if len(key) > 14 else ''} (长度: {len(key)})"
+
+    @property
+    def session(self) -> "requests.Session":
+        # 连接按客户端复用，同一批量任务的多次请求共享TCP/TLS连接
+        if self._session is None:
+            self._session = requests.Session()
+            adapter = _abortable_adapter_class()()
+            self._session.mount("https://", adapter)
+            self._session.mount("http://", adapter)
+        return self._session
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_token is not None and self.cancel_token.cancelled
+
+    def wait(self, seconds: float) -> bool:
+        """重试退避等待，可被取消打断；返回True表示已取消"""
+        if self.cancel_token is None:
+            time.sleep(seconds)
+            return False
+        return self.cancel_token.wait(seconds)
+
+    def post(self, payload: dict, timeout: float) -> "requests.Response":
+        """
+        发送一次 chat/completions 请求
+        设置了取消令牌时在辅助线程中发送，取消后立即关闭连接并抛出 GenerationCancelled
+        """
+        if self.cancel_token is None:
+            return self._send(payload, timeout)
+
+        self.cancel_token.raise_if_cancelled()
+        session = self.session
+        outcome = {}
+        done = threading.Event()
+
+        def send():
+            try:
+                outcome["response"] = self._send(payload, timeout, session)
+            except BaseException as e:
+                outcome["error"] = e
+            finally:
+                done.set()
+
+        threading.Thread(target=send, daemon=True).start()
+        while not done.wait(self.CANCEL_POLL_INTERVAL):
+            if self.cancel_token.cancelled:
+                self.abort()
+                raise GenerationCancelled()
+        if "error" in outcome:
+            raise outcome["error"]
+        return outcome["response"]
+
+    def _send(self, payload: dict, timeout: float, session: "requests.Session" = None) -> "requests.Response":
+        return (session or self.session).post(
+            self.api_url,
+            headers={
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {self.api_key}"
+            },
+            json=payload,
+            timeout=timeout
+        )
+
+    def abort(self):
+        """中断进行中的请求并丢弃连接"""
+        session = self._session
+        if session is not None:
+            for adapter in session.adapters.values():
+                if isinstance(adapter, _abortable_adapter_class()):
+                    adapter.abort()
+        self.close()
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -4,8 +4,10 @@
 import os
 import io
 import zipfile
-from docx import Document
-from docx.opc.constants import RELATIONSHIP_TYPE as RT
+
+import startup
+
+docx = startup.lazy_module("docx")
 
 
 def detect_file_format(file_path):
@@ -85,7 +87,7 @@ def extract_text_from_docx(file_path):
             print("错误: 文件不是有效的ZIP格式，可能已损坏或格式不正确")
             return try_read_as_text(file_path)
         
-        doc = Document(io.BytesIO(file_content))
+        doc = docx.Document(io.BytesIO(file_content))
         full_text = []
         
         print(f"  提取段落: {len(doc.paragraphs)} 个")
@@ -249,8 +251,8 @@ def extract_text_from_pptx(file_path):
     从PowerPoint文档(.pptx)中提取文本内容
     """
     try:
-        from pptx import Presentation
-        from pptx.enum.shapes import MSO_SHAPE_TYPE
+        Presentation = startup.import_module("pptx").Presentation
+        MSO_SHAPE_TYPE = startup.import_module("pptx.enum.shapes").MSO_SHAPE_TYPE
         
         prs = Presentation(file_path)
         full_text = []
@@ -356,7 +358,7 @@ def extract_text_from_excel(file_path):
     从Excel文档(.xlsx, .xls)中提取文本内容
     """
     try:
-        import openpyxl
+        openpyxl = startup.import_module("openpyxl")
         wb = openpyxl.load_workbook(file_path, data_only=True)
         full_text = []
         
@@ -425,7 +427,7 @@ def extract_text_from_pdf(file_path):
     从PDF文档中提取文本内容
     """
     try:
-        import PyPDF2
+        PyPDF2 = startup.import_module("PyPDF2")
         print(f"  开始读取PDF...")
         with open(file_path, 'rb') as f:
             pdf_reader = PyPDF2.PdfReader(f)
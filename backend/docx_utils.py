@@ -1,12 +1,29 @@
 """
 Word文档操作模块 - 处理Word文档的读取、填充和保存
 """
+import copy
+import logging
+import os
 import re
+import zipfile
 from docx import Document
 from docx.enum.text import WD_ALIGN_PARAGRAPH, WD_UNDERLINE
 from docx.enum.table import WD_CELL_VERTICAL_ALIGNMENT
 from docx.oxml.ns import qn
 from docx.oxml import OxmlElement
+from docx.table import _Cell
+
+from docx_writer import loaded_part_names, save_docx
+
+logger = logging.getLogger('jiaoan')
+
+
+def clean_cell_text(text) -> str:
+    """处理单元格文本：去除首尾空格、删除多余空行、确保顶格"""
+    text = str(text).strip()
+    text = re.sub(r'\n{2,}', '\n', text)  # 删除多余空行
+    text = re.sub(r'^[ \t]+', '', text, flags=re.MULTILINE)  # 删除行首空格
+    return text
 
 
 def set_cell_text(cell, text: str):
@@ -14,21 +31,20 @@ def set_cell_text(cell, text: str):
     设置单元格文本，保持原有字体格式，并设置左对齐和垂直居中
     彻底清除原有内容，确保无缩进
     """
-    # 处理文本：去除首尾空格、删除多余空行、确保顶格
-    text = str(text).strip()
-    text = re.sub(r'\n{2,}', '\n', text)  # 删除多余空行
-    text = re.sub(r'^[ \t]+', '', text, flags=re.MULTILINE)  # 删除行首空格
+    text = clean_cell_text(text)
     
     # 获取第一个段落的字体设置（用于保持格式）
     font_name = None
     font_size = None
-    if cell.paragraphs and cell.paragraphs[0].runs:
-        font_name = cell.paragraphs[0].runs[0].font.name
-        font_size = cell.paragraphs[0].runs[0].font.size
+    paragraphs = cell.paragraphs
+    runs = paragraphs[0].runs if paragraphs else []
+    if runs:
+        font_name = runs[0].font.name
+        font_size = runs[0].font.size
     
     # 删除所有段落
-    while len(cell.paragraphs) > 0:
-        p_element = cell.paragraphs[-1]._element
+    for paragraph in paragraphs:
+        p_element = paragraph._element
         p_element.getparent().remove(p_element)
     
     # 创建全新的段落
@@ -64,13 +80,15 @@ def set_cover_cell_text(cell, text: str):
     # 获取原有字体设置（从其他已填充的单元格获取参考格式）
     font_name = None
     font_size = None
-    if cell.paragraphs and cell.paragraphs[0].runs:
-        font_name = cell.paragraphs[0].runs[0].font.name
-        font_size = cell.paragraphs[0].runs[0].font.size
+    paragraphs = cell.paragraphs
+    runs = paragraphs[0].runs if paragraphs else []
+    if runs:
+        font_name = runs[0].font.name
+        font_size = runs[0].font.size
     
     # 删除所有段落，重新创建
-    while len(cell.paragraphs) > 0:
-        p_element = cell.paragraphs[-1]._element
+    for paragraph in paragraphs:
+        p_element = paragraph._element
         p_element.getparent().remove(p_element)
     
     # 创建全新的段落
@@ -117,58 +135,264 @@ def set_cover_cell_text(cell, text: str):
     cell.vertical_alignment = WD_CELL_VERTICAL_ALIGNMENT.CENTER
 
 
+def _normalize(text: str) -> str:
+    return text.replace(" ", "").replace("\n", "")
+
+
 def find_row_index_by_keyword(table, keyword: str) -> int:
     """
     在表格中查找包含关键词的行索引（支持模糊匹配，忽略空格）
     """
-    for i, row in enumerate(table.rows):
-        for cell in row.cells:
-            cell_text_normalized = cell.text.replace(" ", "").replace("\n", "")
-            keyword_normalized = keyword.replace(" ", "")
-            if keyword_normalized in cell_text_normalized:
+    return TableIndex(table).find(keyword)
+
+
+class TableIndex:
+    """
+    表格行索引 - 每个表格只构建一次，按关键词定位行、按行列取单元格、批量删除/插入行
+
+    python-docx 的 table.rows、row.cells、table.cell() 每次调用都会重新遍历整个表格，
+    逐行查找、删除、插入时总耗时随行数平方增长；这里直接持有 <w:tr> 元素列表，增删行时同步更新。
+    行文本（去空格、换行后）在首次查找时计算并缓存，通过 cell()/insert_rows() 交出单元格的行
+    可能被修改，缓存随之失效
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self._rows = list(table._tbl.tr_lst)
+        self._texts = [None] * len(self._rows)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _row_texts(self, row_idx: int) -> list:
+        texts = self._texts[row_idx]
+        if texts is None:
+            texts = [
+                _normalize("".join(t.text or "" for t in tc.iter(qn('w:t'))))
+                for tc in self._rows[row_idx].tc_lst
+            ]
+            self._texts[row_idx] = texts
+        return texts
+
+    def labelled_cells(self, row_idx: int) -> list:
+        """该行各单元格的 (起始网格列, 跨列数, 文本)，跳过纵向合并的续行单元格"""
+        cells = []
+        grid_col = 0
+        for tc, text in zip(self._rows[row_idx].tc_lst, self._row_texts(row_idx)):
+            if tc.vMerge != "continue":
+                cells.append((grid_col, tc.grid_span, text))
+            grid_col += tc.grid_span
+        return cells
+
+    def find(self, keyword: str, start: int = 0) -> int:
+        """第一个有单元格包含关键词的行索引（忽略空格），找不到时返回-1"""
+        keyword = keyword.replace(" ", "")
+        for i in range(start, len(self._rows)):
+            if any(keyword in text for text in self._row_texts(i)):
                 return i
-    return -1
+        return -1
+
+    def cell(self, row_idx: int, col_idx: int) -> _Cell:
+        """与 table.cell(row_idx, col_idx) 相同（按网格列定位，合并单元格返回起始单元格），但只读取这一行"""
+        grid_col = 0
+        for tc in self._rows[row_idx].tc_lst:
+            if grid_col + tc.grid_span > col_idx:
+                if tc.vMerge == "continue":
+                    # 纵向合并的续行：与python-docx一致，返回上方的起始单元格
+                    return self.cell(row_idx - 1, col_idx)
+                self._texts[row_idx] = None
+                return _Cell(tc, self.table)
+            grid_col += tc.grid_span
+        raise IndexError(f"第{row_idx}行没有第{col_idx}列")
+
+    def delete_rows(self, start: int, stop: int):
+        """删除 [start, stop) 范围内的行"""
+        tbl = self.table._tbl
+        for tr in self._rows[start:stop]:
+            tbl.remove(tr)
+        del self._rows[start:stop]
+        del self._texts[start:stop]
+
+    def new_row(self):
+        """与 table.add_row() 结构相同的新行（每个网格列一个单元格），尚未加入表格"""
+        tr = OxmlElement('w:tr')
+        for grid_col in self.table._tbl.tblGrid.gridCol_lst:
+            tr.add_tc().width = grid_col.w
+        return tr
 
+    def insert_rows(self, after_idx: int, rows: list):
+        """将 <w:tr> 元素依次插入到第 after_idx 行之后"""
+        anchor = self._rows[after_idx]
+        for tr in rows:
+            anchor.addnext(tr)
+            anchor = tr
+        self._rows[after_idx + 1:after_idx + 1] = rows
+        self._texts[after_idx + 1:after_idx + 1] = [None] * len(rows)
 
-def clear_old_process_rows(process_table):
+
+def clear_old_process_rows(process_table, index: TableIndex = None, header_row: int = 1):
     """
     清除教学实施过程表格中的旧教学环节行
     保留表头行和课外作业、教学反思行
     """
-    while True:
-        homework_idx = find_row_index_by_keyword(process_table, "课外作业")
-        if homework_idx <= 2:
-            break
-        row_to_delete = homework_idx - 1
-        process_table._element.remove(process_table.rows[row_to_delete]._element)
+    index = index or TableIndex(process_table)
+    homework_idx = index.find(HOMEWORK_LABEL)
+    if homework_idx > header_row + 1:
+        index.delete_rows(header_row + 1, homework_idx)
+
 
+def process_step_texts(step: dict) -> list:
+    """教学环节一行中各列的文本：环节（时间）、内容、教师活动、学生活动"""
+    return [f"{step['环节']}（{step['时间']}）", step['内容'], step['教师活动'], step['学生活动']]
 
-def insert_process_steps(process_table, process_steps: list):
+
+def _step_row_prototype(index: TableIndex, columns):
     """
-    在教学实施过程表格中插入新的教学环节
+    教学环节行的原型：新行中 columns（网格列）的单元格按 set_cell_text 的格式处理（文本为空），
+    每个单元格只有一个段落、一个空run
     """
-    for step in reversed(process_steps):
-        header_row = process_table.rows[1]._element
-        new_row = process_table.add_row()
-        header_row.addnext(new_row._element)
-        
-        set_cell_text(new_row.cells[0], f"{step['环节']}（{step['时间']}）")
-        set_cell_text(new_row.cells[1], step['内容'])
-        set_cell_text(new_row.cells[2], step['教师活动'])
-        set_cell_text(new_row.cells[3], step['学生活动'])
+    prototype = index.new_row()
+    for col in columns:
+        set_cell_text(_Cell(prototype.tc_lst[col], index.table), "")
+    return prototype
+
+
+def insert_process_steps(process_table, process_steps: list, index: TableIndex = None,
+                         header_row: int = 1, columns=(0, 1, 2, 3)):
+    """
+    在教学实施过程表格的表头行 header_row 之后插入新的教学环节，
+    各字段依次写入 columns 指定的网格列（新行每个网格列一个单元格）
+
+    只构建一次格式化好的原型行，每个环节深拷贝原型并写入run的文本，
+    结果与逐行 add_row + set_cell_text 相同
+    """
+    if not process_steps:
+        return
+    index = index or TableIndex(process_table)
+    prototype = _step_row_prototype(index, columns)
+    rows = []
+    for step in process_steps:
+        tr = copy.deepcopy(prototype)
+        tcs = tr.tc_lst
+        for col, text in zip(columns, process_step_texts(step)):
+            # 与 run.text 赋值相同：换行转为 <w:br/>，制表符转为 <w:tab/>
+            tcs[col].find(qn('w:p')).find(qn('w:r')).text = clean_cell_text(text)
+        rows.append(tr)
+    index.insert_rows(header_row, rows)
+
+
+# 槽位表格式版本，发现规则改变时递增，已缓存的槽位表随之重新分析
+SLOT_MAP_VERSION = 1
+# 基础信息字段的标签，值填在标签右侧的单元格
+FIELD_LABELS = ("课题名称", "授课班级", "授课地点", "授课时间", "授课学时", "授课类型")
+# 教案内容各模块的标签，与 main 中各模块的名称一致
+MODULE_LABELS = ("教学内容及学情分析", "教学目标", "教学重点", "教学难点", "教学方法与教学资源", "思政元素")
+# 教学实施过程表头各列的标签前缀，顺序与 process_step_texts 一致（"教学环节"可匹配"教学环节及时间分配"）
+STEP_COLUMN_LABELS = ("教学环节", "教学内容", "教师活动", "学生活动")
+HOMEWORK_LABEL = "课外作业"
+REFLECTION_LABEL = "教学反思"
+
+
+def _label(text: str) -> str:
+    return text.rstrip("：:")
+
+
+def _find_label(index: TableIndex, label: str, prefix: bool = False):
+    """第一个文本为 label（prefix=True 时以 label 开头）的单元格，返回 (行, 网格列, 跨列数)"""
+    for row in range(len(index)):
+        for grid_col, span, text in index.labelled_cells(row):
+            text = _label(text)
+            if text == label or (prefix and text.startswith(label)):
+                return row, grid_col, span
+    return None
+
+
+def discover_slots(document) -> dict:
+    """
+    按标签文字分析模板中各内容的填写位置（槽位表），不依赖固定的表格顺序和行列号：
+        fields / modules: 标签 -> [表格序号, 行, 网格列]（标签右侧的单元格）
+        process: 教学实施过程表格、表头行、各字段所在网格列、课外作业与教学反思的填写列
+        missing: 模板中没有找到的标签（对应内容不填写）
+    找不到教学实施过程表格或其表头时抛出 ValueError
+    """
+    indexes = [TableIndex(table) for table in document.tables]
+    slots = {"version": SLOT_MAP_VERSION, "fields": {}, "modules": {}, "process": None, "missing": []}
+
+    for t, index in enumerate(indexes):
+        homework = _find_label(index, HOMEWORK_LABEL)
+        if homework is None:
+            continue
+        header = None
+        for row in range(homework[0]):
+            cells = {_label(text): grid_col for grid_col, _, text in index.labelled_cells(row)}
+            columns = [
+                next((col for text, col in cells.items() if text.startswith(label)), None)
+                for label in STEP_COLUMN_LABELS
+            ]
+            if None not in columns:
+                header = (row, columns)
+                break
+        if header is None:
+            raise ValueError(f"模板的教学实施过程表格缺少表头：{'、'.join(STEP_COLUMN_LABELS)}")
+        reflection = _find_label(index, REFLECTION_LABEL)
+        slots["process"] = {
+            "table": t,
+            "header_row": header[0],
+            "columns": header[1],
+            "homework_col": homework[1] + homework[2],
+            "reflection_col": reflection[1] + reflection[2] if reflection else None
+        }
+        break
+    if slots["process"] is None:
+        raise ValueError(f"模板中没有找到教学实施过程表格（含「{HOMEWORK_LABEL}」的表格）")
+
+    process_table = slots["process"]["table"]
+    # 基础信息在含「课题名称」的表格中查找（封面表格中也有「授课班级」等标签，保持原样不填）
+    content_table = next(
+        (t for t, index in enumerate(indexes) if t != process_table and _find_label(index, FIELD_LABELS[0])),
+        None
+    )
+    for group, labels, tables in (
+        ("fields", FIELD_LABELS, [content_table] if content_table is not None else []),
+        ("modules", MODULE_LABELS, [t for t in range(len(indexes)) if t != process_table]),
+    ):
+        for label in labels:
+            for t in tables:
+                found = _find_label(indexes[t], label)
+                if found is not None:
+                    slots[group][label] = [t, found[0], found[1] + found[2]]
+                    break
+            else:
+                slots["missing"].append(label)
+    return slots
 
 
 class LessonPlanDoc:
     """教案文档类，封装Word文档操作"""
     
-    def __init__(self, template_path: str):
+    def __init__(self, template_path: str, slots: dict = None):
+        """
+        template_path: 模板路径或文件对象，保存时从中复制未修改的部件
+        slots: 模板的槽位表（见 discover_slots），未提供时现场分析
+        """
+        self.template_path = template_path
         self.doc = Document(template_path)
-        if len(self.doc.tables) < 3:
-            raise ValueError("模板表格数量不足！需要3个表格：基础信息+教案内容+教学实施过程")
+        self._loaded_parts = loaded_part_names(self.doc)
+        self._touched = set()
+        self.slots = slots or discover_slots(self.doc)
         
-        self.info_table = self.doc.tables[0]
-        self.content_table = self.doc.tables[1]
-        self.process_table = self.doc.tables[2]
+        tables = self.doc.tables
+        self.indexes = [TableIndex(table) for table in tables]
+        self.info_table = tables[0]
+        content = next(iter(self.slots["fields"].values()), None) or next(iter(self.slots["modules"].values()), None)
+        self.content_table = tables[content[0]] if content else None
+        self.content_index = self.indexes[content[0]] if content else None
+        self.process_table = tables[self.slots["process"]["table"]]
+        self.process_index = self.indexes[self.slots["process"]["table"]]
+    
+    def _fill_slot(self, slot, text):
+        table, row, col = slot
+        set_cell_text(self.indexes[table].cell(row, col), text)
     
     def fill_basic_info(self, course_info: dict):
         """填充基础信息表格（封面表格）"""
@@ -176,33 +400,52 @@ class LessonPlanDoc:
         pass
     
     def fill_content_info(self, course_info: dict):
-        """填充教案内容表格的基础信息部分"""
-        # 第0行: 课题名称
-        set_cell_text(self.content_table.cell(0, 1), course_info["课题名称"])
-        # 第1行: 授课班级(列1), 授课地点(列5)
-        set_cell_text(self.content_table.cell(1, 1), course_info["授课班级"])
-        set_cell_text(self.content_table.cell(1, 5), course_info["授课地点"])
-        # 第2行: 授课时间(列1), 授课学时(列3), 授课类型(列5)
-        set_cell_text(self.content_table.cell(2, 1), course_info["授课时间"])
-        set_cell_text(self.content_table.cell(2, 3), course_info["授课学时"])
-        set_cell_text(self.content_table.cell(2, 5), course_info["授课类型"])
+        """填充教案内容表格的基础信息部分（课题名称、授课班级、授课地点等，按槽位表定位）"""
+        for label, slot in self.slots["fields"].items():
+            self._fill_slot(slot, course_info[label])
     
     def fill_content_module(self, row: int, text: str):
-        """填充教案内容表格的某个模块"""
-        set_cell_text(self.content_table.cell(row, 1), text)
+        """填充教案内容表格第 row 行的模块（第1列）"""
+        set_cell_text(self.content_index.cell(row, 1), text)
+    
+    def fill_module(self, name: str, text: str) -> bool:
+        """按模块名称（如「教学重点」）填充，模板中没有该模块时返回False"""
+        slot = self.slots["modules"].get(name)
+        if slot is None:
+            return False
+        self._fill_slot(slot, text)
+        return True
     
     def fill_process_table(self, process_steps: list, homework_text: str):
         """填充教学实施过程表格"""
+        process = self.slots["process"]
+        index = self.process_index
+        header_row = process["header_row"]
+        
         # 清除旧的教学环节行
-        clear_old_process_rows(self.process_table)
+        clear_old_process_rows(self.process_table, index, header_row)
         
         # 插入新的教学环节
-        insert_process_steps(self.process_table, process_steps)
+        insert_process_steps(self.process_table, process_steps, index, header_row, process["columns"])
         
         # 填充课外作业和教学反思（教学反思保持空白）
-        set_cell_text(self.process_table.cell(len(self.process_table.rows)-2, 1), homework_text)
-        set_cell_text(self.process_table.cell(len(self.process_table.rows)-1, 1), "")
+        homework_row = index.find(HOMEWORK_LABEL, header_row + 1 + len(process_steps))
+        set_cell_text(index.cell(homework_row, process["homework_col"]), homework_text)
+        if process["reflection_col"] is not None:
+            reflection_row = index.find(REFLECTION_LABEL, homework_row + 1)
+            if reflection_row >= 0:
+                set_cell_text(index.cell(reflection_row, process["reflection_col"]), "")
     
+    def touch(self, part):
+        """标记主文档以外被直接修改过的部件（如通过 self.doc 修改页眉、样式），保存时重新序列化"""
+        self._touched.add(part)
+
     def save(self, output_path: str):
-        """保存文档"""
-        self.doc.save(output_path)
+        """保存文档：只序列化修改过的部件，模板中未修改的部件直接复制压缩后的字节（见 docx_writer）"""
+        try:
+            save_docx(self.doc, self.template_path, output_path, self._loaded_parts, self._touched)
+        except (ValueError, zipfile.BadZipFile) as e:
+            if not isinstance(output_path, (str, os.PathLike)):
+                raise
+            logger.warning(f"⚠️  无法直接复制模板部件（{e}），改用完整保存")
+            self.doc.save(output_path)
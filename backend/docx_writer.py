@@ -0,0 +1,169 @@
+"""
+DOCX快速保存 - 未修改的部件直接复制模板压缩包中已压缩的字节，只序列化、压缩修改过的部件
+
+python-docx 的 save() 会重新序列化每个部件并重新压缩整个包，包括模板中没有改动的图片、样式、
+字体、页眉页脚，模板越重保存越慢。save_docx() 逐个部件处理：
+    - 主文档 word/document.xml 及调用方标记为已修改的部件：序列化后压缩写入
+    - 模板中已有且未修改的部件（及其关系文件）：原样复制压缩后的字节，不解压也不重新压缩
+    - 模板中没有的新部件：序列化后压缩写入，并重新生成包关系
+部件集合与模板不一致时重新生成 [Content_Types].xml；其余情况与 python-docx 写出的包等价
+
+    doc = Document(template_path)
+    loaded = loaded_part_names(doc)        # 打开后立即记录来自模板的部件
+    ...
+    save_docx(doc, template_path, output_path, loaded)
+"""
+import os
+import struct
+import time
+import uuid
+import zipfile
+import zlib
+
+from docx.opc.packuri import PACKAGE_URI
+from docx.opc.pkgwriter import _ContentTypesItem
+
+CONTENT_TYPES_NAME = '[Content_Types].xml'
+
+_LOCAL_HEADER = struct.Struct('<4s5H3L2H')
+_CENTRAL_HEADER = struct.Struct('<4s6H3L5H2L')
+_END_RECORD = struct.Struct('<4s4H2LH')
+_UTF8_FLAG = 0x800
+_ZIP32_LIMIT = 0xFFFFFFFF
+
+
+def _dos_datetime(date_time) -> tuple:
+    year, month, day, hour, minute, second = date_time
+    return (hour << 11 | minute << 5 | second // 2), ((year - 1980) << 9 | month << 5 | day)
+
+
+class _ZipWriter:
+    """只追加写入的zip写入器：新内容按deflate压缩，模板条目按原压缩字节复制（不支持zip64）"""
+
+    def __init__(self, fp):
+        self.fp = fp
+        self.entries = []
+
+    def _add(self, name: str, method: int, crc: int, compressed: bytes, size: int, date_time,
+             external_attr: int):
+        if len(compressed) > _ZIP32_LIMIT or size > _ZIP32_LIMIT:
+            raise ValueError(f"{name} 超过4GB，需要zip64")
+        encoded = name.encode('utf-8')
+        flags = 0 if encoded.isascii() else _UTF8_FLAG
+        version = 20 if method == zipfile.ZIP_DEFLATED else 10
+        dos_time, dos_date = _dos_datetime(date_time)
+        offset = self.fp.tell()
+        self.fp.write(_LOCAL_HEADER.pack(
+            b'PK\x03\x04', version, flags, method, dos_time, dos_date,
+            crc, len(compressed), size, len(encoded), 0
+        ))
+        self.fp.write(encoded)
+        self.fp.write(compressed)
+        self.entries.append((encoded, version, flags, method, dos_time, dos_date,
+                             crc, len(compressed), size, external_attr, offset))
+
+    def write(self, name: str, data: bytes):
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        compressed = compressor.compress(data) + compressor.flush()
+        self._add(name, zipfile.ZIP_DEFLATED, zlib.crc32(data), compressed, len(data),
+                  time.localtime()[:6], 0o600 << 16)
+
+    def copy(self, source_fp, info: zipfile.ZipInfo):
+        """复制模板中的条目：跳过其本地文件头，原样读取压缩后的数据"""
+        if info.flag_bits & 0x1:
+            raise ValueError(f"{info.filename} 已加密，无法直接复制")
+        source_fp.seek(info.header_offset)
+        header = source_fp.read(_LOCAL_HEADER.size)
+        if header[:4] != b'PK\x03\x04':
+            raise zipfile.BadZipFile(f"{info.filename} 的本地文件头损坏")
+        name_length, extra_length = struct.unpack('<HH', header[26:30])
+        source_fp.seek(info.header_offset + _LOCAL_HEADER.size + name_length + extra_length)
+        compressed = source_fp.read(info.compress_size)
+        self._add(info.filename, info.compress_type, info.CRC, compressed, info.file_size,
+                  info.date_time, info.external_attr)
+
+    def close(self):
+        start = self.fp.tell()
+        for (encoded, version, flags, method, dos_time, dos_date,
+             crc, compressed_size, size, external_attr, offset) in self.entries:
+            self.fp.write(_CENTRAL_HEADER.pack(
+                b'PK\x01\x02', (3 << 8) | version, version, flags, method, dos_time, dos_date,
+                crc, compressed_size, size, len(encoded), 0, 0, 0, 0, external_attr, offset
+            ))
+            self.fp.write(encoded)
+        end = self.fp.tell()
+        count = len(self.entries)
+        if count > 0xFFFF or end > _ZIP32_LIMIT:
+            raise ValueError("条目过多或文件超过4GB，需要zip64")
+        self.fp.write(_END_RECORD.pack(b'PK\x05\x06', 0, 0, count, count, end - start, start, 0))
+
+
+def loaded_part_names(document) -> set:
+    """刚打开的文档中来自模板的部件名；之后新增的部件即使与模板中未引用的条目同名也不会被误复制"""
+    return {part.partname for part in document.part.package.iter_parts()}
+
+
+def save_docx(document, template, output_path, loaded: set, touched=()):
+    """
+    保存 document（由 template 打开的 python-docx 文档）到 output_path（路径或可写的文件对象）
+
+    template: 模板文件路径或可seek的文件对象（打开 document 时使用的同一份内容）
+    loaded: 打开后由 loaded_part_names() 记录的部件名
+    touched: 除主文档外被修改过的部件（如页眉、样式），这些部件会重新序列化
+    保存到路径时先写入同目录的临时文件再替换，output_path 与 template 相同时也能安全覆盖
+    """
+    package = document.part.package
+    parts = list(package.iter_parts())
+    for part in parts:
+        part.before_marshal()
+    dirty = {document.part.partname, *(part.partname for part in touched)}
+
+    if hasattr(template, 'seek'):
+        template.seek(0)
+    with zipfile.ZipFile(template) as source:
+        infos = {info.filename: info for info in source.infolist()}
+        source_parts = {
+            name for name in infos
+            if not name.endswith('/') and not name.endswith('.rels') and name != CONTENT_TYPES_NAME
+        }
+        part_names = {part.partname.membername for part in parts}
+        new_parts = any(part.partname not in loaded for part in parts)
+
+        def write_package(fp):
+            writer = _ZipWriter(fp)
+
+            def write_or_copy(name, reuse, serialize):
+                if reuse and name in infos:
+                    writer.copy(source.fp, infos[name])
+                else:
+                    writer.write(name, serialize())
+
+            # 与 python-docx 相同的顺序：内容类型、包关系、各部件及其关系
+            write_or_copy(CONTENT_TYPES_NAME, part_names == source_parts and not new_parts,
+                          lambda: _ContentTypesItem.from_parts(parts).blob)
+            write_or_copy(PACKAGE_URI.rels_uri.membername, not new_parts, lambda: package.rels.xml)
+            for part in parts:
+                reuse = part.partname in loaded and part.partname not in dirty
+                write_or_copy(part.partname.membername, reuse, lambda: part.blob)
+                if len(part.rels):
+                    write_or_copy(part.partname.rels_uri.membername, reuse, lambda: part.rels.xml)
+            writer.close()
+
+        if not isinstance(output_path, (str, os.PathLike)):
+            write_package(output_path)
+            return
+
+        # 临时文件以 . 开头，存储清理不会把它当作输出文件
+        output_path = os.path.abspath(output_path)
+        temp_path = os.path.join(os.path.dirname(output_path),
+                                 f".{os.path.basename(output_path)}.{uuid.uuid4().hex[:8]}.tmp")
+        try:
+            with open(temp_path, 'xb') as fp:
+                write_package(fp)
+            os.replace(temp_path, output_path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except FileNotFoundError:
+                pass
+            raise
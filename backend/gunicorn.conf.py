@@ -0,0 +1,45 @@
+"""
+gunicorn配置 - worker数量、线程数等通过环境变量调整
+
+    WEB_CONCURRENCY              worker进程数（STATE_BACKEND=local 时固定为1）
+    GUNICORN_WORKER_CLASS        gthread（默认，多线程）或 gevent（协程，适合大量并发等待大模型返回）
+    GUNICORN_THREADS             gthread下每个worker的线程数
+    GUNICORN_WORKER_CONNECTIONS  gevent下每个worker的最大并发连接数
+    GUNICORN_TIMEOUT             worker超时时间（秒）
+
+生成调度的并发上限（SCHEDULER_CONFIG）与DeepSeek客户端限流（RATE_LIMIT_CONFIG）在每个worker内独立计数，
+多worker时整体上限为配置值 × workers
+"""
+import logging
+import multiprocessing
+import os
+
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+if worker_class == "gevent":
+    # 必须在加载应用（尤其是 --preload 时的 requests/ssl）之前打补丁
+    from gevent import monkey
+    monkey.patch_all()
+    worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "500"))
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+
+_state_backend = os.getenv("STATE_BACKEND", "local").lower()
+_default_workers = 1 if _state_backend == "local" else min(multiprocessing.cpu_count() * 2 + 1, 4)
+workers = int(os.getenv("WEB_CONCURRENCY", str(_default_workers)))
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+
+if _state_backend == "local" and workers > 1:
+    # 进程内存中的会话和上传文档无法在worker之间共享
+    logging.getLogger("gunicorn.error").warning(
+        "STATE_BACKEND=local 只能单worker运行，已忽略 WEB_CONCURRENCY=%s；多worker请设置 STATE_BACKEND=sqlite 或 redis",
+        workers
+    )
+    workers = 1
+
+
+def post_worker_init(worker):
+    # worker已在监听端口：记录启动耗时，并在后台预热延迟导入的依赖（见 startup.py）
+    import startup
+    startup.mark("port_bound")
+    startup.start_prewarm()
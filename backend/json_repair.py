@@ -0,0 +1,236 @@
+"""
+JSON修复模块 - 在本地修复大模型输出中常见的JSON格式缺陷，避免整轮重新生成
+支持：首尾多余说明文字、中文弯引号、字符串内未转义的引号与换行、
+多余/缺失的逗号、全角标点、缺少引号的键与文本值、被截断的字符串与括号
+"""
+import json
+import re
+
+
+# 各类修复的计数键
+REPAIR_KINDS = (
+    "stripped_prose",
+    "smart_quotes",
+    "fullwidth_punctuation",
+    "unescaped_quotes",
+    "control_chars",
+    "trailing_commas",
+    "missing_commas",
+    "missing_values",
+    "unquoted_keys",
+    "unquoted_values",
+    "mismatched_brackets",
+    "unclosed_strings",
+    "unclosed_brackets",
+)
+
+_QUOTES = '"“”'
+_BARE_TOKEN = re.compile(r'[^\s,:\[\]{}"“”，：]+')
+# 缺少引号的文本值延续到行尾或下一个分隔符，可以包含空格
+_BARE_TEXT = re.compile(r'[^,\[\]{}"“”，\r\n]+')
+_LITERAL = re.compile(r'-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?|true|false|null')
+_CONTROL_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+
+
+def _looks_like_string_end(text: str, pos: int, is_key: bool) -> bool:
+    """
+    判断字符串中的引号是否为结束引号：
+    其后（同一行内）紧跟 , : } ] 或文本结束；键名后允许全角冒号，
+    行尾允许全角逗号；或换行后紧跟新的键/值/括号（常见于缺少逗号的多行输出）
+    """
+    n = len(text)
+    saw_newline = False
+    while pos < n and text[pos] in " \t\r\n":
+        if text[pos] == "\n":
+            saw_newline = True
+        pos += 1
+    if pos >= n:
+        return True
+    ch = text[pos]
+    if ch in ",:}]" or (is_key and ch == "："):
+        return True
+    if ch == "，" and not saw_newline:
+        rest = text[pos + 1:pos + 80].lstrip(" \t\r")
+        return not rest or rest[0] == "\n"
+    return saw_newline and ch in '"“”{['
+
+
+class _Repairer:
+    def __init__(self, text: str):
+        self.text = text
+        self.out = []
+        self.counts = {}
+        # 容器栈：每项为 [括号, 对象中下一个字符串是否为键]
+        self.stack = []
+        # 上一个有效记号：open / close / value / key / comma / colon
+        self.last = None
+
+    def count(self, kind: str, amount: int = 1):
+        self.counts[kind] = self.counts.get(kind, 0) + amount
+
+    def _drop_trailing_comma(self):
+        for idx in range(len(self.out) - 1, -1, -1):
+            if self.out[idx] == ",":
+                del self.out[idx]
+                return
+            if not self.out[idx].isspace():
+                return
+
+    def _before_value(self):
+        """在值/键开始前补齐缺失的逗号"""
+        if self.last in ("value", "close"):
+            self.out.append(",")
+            self.count("missing_commas")
+            if self.stack and self.stack[-1][0] == "{":
+                self.stack[-1][1] = True
+
+    def _finish_value(self):
+        self.last = "value"
+        if self.stack and self.stack[-1][0] == "{":
+            self.stack[-1][1] = False
+
+    def run(self) -> str:
+        text = self.text
+        n = len(text)
+        starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+        if not starts:
+            return text
+        i = min(starts)
+        if text[:i].strip():
+            self.count("stripped_prose")
+
+        in_string = False
+        opener = '"'
+        while i < n:
+            ch = text[i]
+            if in_string:
+                if ch == "\\":
+                    if i + 1 < n:
+                        self.out.append(text[i:i + 2])
+                    i += 2
+                    continue
+                is_closer = ch == '"' or (opener != '"' and ch in "“”")
+                if is_closer and _looks_like_string_end(text, i + 1, self.last == "key_open"):
+                    if ch != '"':
+                        self.count("smart_quotes")
+                    self.out.append('"')
+                    in_string = False
+                    if self.last == "key_open":
+                        self.last = "key"
+                    else:
+                        self._finish_value()
+                elif ch == '"':
+                    self.out.append('\\"')
+                    self.count("unescaped_quotes")
+                elif ch in _CONTROL_ESCAPES or ord(ch) < 0x20:
+                    self.out.append(_CONTROL_ESCAPES.get(ch, "\\u%04x" % ord(ch)))
+                    self.count("control_chars")
+                else:
+                    self.out.append(ch)
+                i += 1
+                continue
+
+            if ch in " \t\r\n":
+                self.out.append(ch)
+            elif ch in _QUOTES:
+                if ch != '"':
+                    self.count("smart_quotes")
+                self._before_value()
+                expecting_key = bool(self.stack) and self.stack[-1][0] == "{" and self.stack[-1][1]
+                self.last = "key_open" if expecting_key else "value_open"
+                self.out.append('"')
+                in_string = True
+                opener = ch
+            elif ch in "{[":
+                self._before_value()
+                self.stack.append([ch, ch == "{"])
+                self.out.append(ch)
+                self.last = "open"
+            elif ch in "}]":
+                if not self.stack:
+                    break
+                if self.last == "comma":
+                    self._drop_trailing_comma()
+                    self.count("trailing_commas")
+                elif self.last in ("colon", "key"):
+                    self.out.append(":null" if self.last == "key" else "null")
+                    self.count("missing_values")
+                expected = "}" if self.stack[-1][0] == "{" else "]"
+                if ch != expected:
+                    self.count("mismatched_brackets")
+                self.stack.pop()
+                self.out.append(expected)
+                self._finish_value()
+                self.last = "close"
+                if not self.stack:
+                    i += 1
+                    break
+            elif ch in ",，":
+                if ch != ",":
+                    self.count("fullwidth_punctuation")
+                if self.last in ("comma", "open"):
+                    self.count("trailing_commas")
+                else:
+                    self.out.append(",")
+                    self.last = "comma"
+                    if self.stack and self.stack[-1][0] == "{":
+                        self.stack[-1][1] = True
+            elif ch in ":：":
+                if ch != ":":
+                    self.count("fullwidth_punctuation")
+                self.out.append(":")
+                self.last = "colon"
+                if self.stack and self.stack[-1][0] == "{":
+                    self.stack[-1][1] = False
+            else:
+                token = _BARE_TOKEN.match(text, i).group()
+                self._before_value()
+                expecting_key = bool(self.stack) and self.stack[-1][0] == "{" and self.stack[-1][1]
+                if expecting_key:
+                    self.out.append(json.dumps(token, ensure_ascii=False))
+                    self.count("unquoted_keys")
+                    self.last = "key"
+                elif _LITERAL.fullmatch(token) or not self.stack:
+                    self.out.append(token)
+                    self._finish_value()
+                else:
+                    token = _BARE_TEXT.match(text, i).group().rstrip()
+                    self.out.append(json.dumps(token, ensure_ascii=False))
+                    self.count("unquoted_values")
+                    self._finish_value()
+                i += len(token)
+                continue
+            i += 1
+
+        if text[i:].strip() and not self.stack and not in_string:
+            self.count("stripped_prose")
+
+        # 处理被截断的输出
+        if in_string:
+            self.out.append('"')
+            self.count("unclosed_strings")
+            self.last = "key" if self.last == "key_open" else "value"
+        if self.stack:
+            if self.last == "comma":
+                self._drop_trailing_comma()
+            elif self.last == "key":
+                self.out.append(":null")
+            elif self.last == "colon":
+                self.out.append("null")
+            for bracket, _ in reversed(self.stack):
+                self.out.append("}" if bracket == "{" else "]")
+            self.count("unclosed_brackets", len(self.stack))
+        return "".join(self.out)
+
+
+def repair_json(text: str) -> tuple:
+    """
+    修复常见的JSON格式缺陷
+
+    Returns:
+        (修复后的文本, 各类修复次数的字典)
+        文本本身合法时也可调用，但通常只在 json.loads 失败后使用
+    """
+    repairer = _Repairer(text)
+    repaired = repairer.run()
+    return repaired, repairer.counts
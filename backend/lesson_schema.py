@@ -0,0 +1,109 @@
+"""
+教案数据结构定义与校验 - 在渲染文档之前检查大模型返回的JSON是否完整
+Schema采用JSON Schema的子集（type / required / properties / items / minItems / minLength）
+"""
+
+
+def _text(min_length: int = 1) -> dict:
+    return {"type": "string", "minLength": min_length}
+
+
+def _text_object(*keys) -> dict:
+    return {
+        "type": "object",
+        "required": list(keys),
+        "properties": {key: _text() for key in keys}
+    }
+
+
+def _text_list(min_items: int = 1) -> dict:
+    return {"type": "array", "minItems": min_items, "items": _text()}
+
+
+# 教学实施过程每个环节的字段，对应 docx_utils.insert_process_steps 使用的键
+PROCESS_STEP_SCHEMA = _text_object("环节", "时间", "内容", "教师活动", "学生活动")
+
+LESSON_PLAN_SCHEMA = {
+    "type": "object",
+    "required": [
+        "教学内容及学情分析",
+        "教学目标",
+        "教学重点",
+        "教学难点",
+        "教学方法与教学资源",
+        "思政元素",
+        "教学实施过程",
+        "课外作业"
+    ],
+    "properties": {
+        "教学内容及学情分析": _text_object("教学内容", "学情分析"),
+        "教学目标": _text_object("知识目标", "能力目标", "素质目标"),
+        "教学重点": _text_list(),
+        "教学难点": _text_list(),
+        "教学方法与教学资源": _text_object("教学方法", "教学资源"),
+        "思政元素": _text_list(),
+        "教学实施过程": {"type": "array", "minItems": 1, "items": PROCESS_STEP_SCHEMA},
+        "课外作业": _text_object("基础题", "提升题", "预习题")
+    }
+}
+
+_TYPE_NAMES = {"object": "对象", "array": "数组", "string": "字符串"}
+_PY_TYPES = {"object": dict, "array": list, "string": str}
+
+
+class LessonPlanValidationError(ValueError):
+    """教案数据不符合Schema，errors为带路径的错误列表"""
+
+    def __init__(self, errors: list):
+        self.errors = errors
+        super().__init__("；".join(errors[:10]) + (f"；等共{len(errors)}处错误" if len(errors) > 10 else ""))
+
+
+def _join(path: str, key) -> str:
+    if isinstance(key, int):
+        return f"{path}[{key}]"
+    return f"{path}.{key}" if path else key
+
+
+def _validate(value, schema: dict, path: str, errors: list):
+    expected = schema.get("type")
+    if expected and not isinstance(value, _PY_TYPES[expected]):
+        errors.append(f"{path or '根节点'}: 应为{_TYPE_NAMES[expected]}，实际为{type(value).__name__}")
+        return
+
+    if expected == "object":
+        for key in schema.get("required", []):
+            if key not in value:
+                errors.append(f"{_join(path, key)}: 缺少必填字段")
+        for key, sub_schema in schema.get("properties", {}).items():
+            if key in value:
+                _validate(value[key], sub_schema, _join(path, key), errors)
+    elif expected == "array":
+        min_items = schema.get("minItems", 0)
+        if len(value) < min_items:
+            errors.append(f"{path}: 至少需要{min_items}项，实际{len(value)}项")
+        item_schema = schema.get("items")
+        if item_schema:
+            for i, item in enumerate(value):
+                _validate(item, item_schema, _join(path, i), errors)
+    elif expected == "string":
+        min_length = schema.get("minLength", 0)
+        if len(value.strip()) < min_length:
+            errors.append(f"{path}: 内容为空")
+
+
+def validate_lesson_plan(data, schema: dict = None) -> list:
+    """
+    校验教案数据，返回带精确路径的错误列表（如 "教学实施过程[2].教师活动: 缺少必填字段"）
+    列表为空表示校验通过
+    """
+    errors = []
+    _validate(data, schema or LESSON_PLAN_SCHEMA, "", errors)
+    return errors
+
+
+def ensure_valid_lesson_plan(data, schema: dict = None):
+    """校验教案数据，不通过时抛出 LessonPlanValidationError"""
+    errors = validate_lesson_plan(data, schema)
+    if errors:
+        raise LessonPlanValidationError(errors)
@@ -0,0 +1,212 @@
+"""
+离线端到端压测工具 - 以可配置的并发驱动 /api/generate 与 /api/batch-generate，
+统计吞吐量与 p50/p95/p99 延迟
+
+用法：
+    # 压测已启动的服务（通常指向模拟DeepSeek服务，见 mock_deepseek_server.py）
+    python load_test.py --base-url http://127.0.0.1:5000 --mode generate --concurrency 8 --requests 40
+
+    # 一键离线压测：在本进程内启动模拟DeepSeek服务和API服务
+    python load_test.py --self-contained --mode batch --lessons 5 --concurrency 4 --requests 8 \\
+        --mock-latency lognormal:0.5,0.4 --mock-rate-429 0.05 --mock-rate-malformed 0.1
+"""
+import argparse
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+def percentile(values: list, pct: float) -> float:
+    """线性插值百分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    lower = int(k)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (k - lower)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _serve_in_thread(app, port: int):
+    from werkzeug.serving import make_server
+    server = make_server("127.0.0.1", port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_self_contained(args) -> str:
+    """在本进程内启动模拟DeepSeek服务和API服务，返回API服务地址"""
+    mock_port = _free_port()
+    # 必须在导入 mock_deepseek_server / api_server 之前设置，config 在导入时读取
+    os.environ["DEEPSEEK_API_URL"] = f"http://127.0.0.1:{mock_port}/v1/chat/completions"
+    os.environ.setdefault("RENDER_DATA_DIR", tempfile.mkdtemp(prefix="jiaoan_loadtest_"))
+
+    from mock_deepseek_server import create_app, LatencyModel
+    _serve_in_thread(create_app(
+        latency=LatencyModel(args.mock_latency),
+        rate_429=args.mock_rate_429,
+        rate_5xx=args.mock_rate_5xx,
+        rate_malformed=args.mock_rate_malformed,
+        retry_after=args.mock_retry_after
+    ), mock_port)
+
+    import api_server
+
+    api_port = _free_port()
+    _serve_in_thread(api_server.app, api_port)
+    print(f"模拟DeepSeek服务: {os.environ['DEEPSEEK_API_URL']}")
+    print(f"API服务: http://127.0.0.1:{api_port}  (数据目录: {os.environ['RENDER_DATA_DIR']})")
+    return f"http://127.0.0.1:{api_port}"
+
+
+def build_lesson(i: int) -> dict:
+    return {
+        "id": f"load-{i}",
+        "课题名称": f"压测课题{i}",
+        "授课地点": "实训室",
+        "授课时间": "2026年3月",
+        "授课学时": "2学时",
+        "授课类型": "理实一体化"
+    }
+
+
+def run_one(base_url: str, mode: str, index: int, lessons: int, api_key: str, timeout: float) -> dict:
+    session_id = str(uuid.uuid4())
+    if mode == "generate":
+        url = f"{base_url}/api/generate"
+        payload = {
+            "session_id": session_id,
+            "api_key": api_key,
+            "lesson_index": index % 99 + 1,
+            "variable_course_info": build_lesson(index)
+        }
+        lesson_count = 1
+    else:
+        url = f"{base_url}/api/batch-generate"
+        payload = {
+            "session_id": session_id,
+            "api_key": api_key,
+            "variable_course_infos": [build_lesson(index * lessons + j) for j in range(lessons)]
+        }
+        lesson_count = lessons
+
+    started = time.perf_counter()
+    try:
+        response = requests.post(url, json=payload, headers={"X-Session-ID": session_id}, timeout=timeout)
+        elapsed = time.perf_counter() - started
+        body = response.json() if response.headers.get("Content-Type", "").startswith("application/json") else {}
+        if mode == "generate":
+            succeeded = 1 if body.get("success") else 0
+        else:
+            succeeded = len([r for r in body.get("results", []) if r.get("status") == "成功"])
+        return {
+            "ok": response.status_code == 200 and bool(body.get("success")),
+            "status": response.status_code,
+            "latency": elapsed,
+            "lessons": lesson_count,
+            "lessons_ok": succeeded
+        }
+    except requests.exceptions.RequestException as e:
+        return {
+            "ok": False,
+            "status": type(e).__name__,
+            "latency": time.perf_counter() - started,
+            "lessons": lesson_count,
+            "lessons_ok": 0
+        }
+
+
+def run_load(base_url: str, mode: str, concurrency: int, total: int, lessons: int,
+             api_key: str, timeout: float) -> dict:
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(
+            lambda i: run_one(base_url, mode, i, lessons, api_key, timeout),
+            range(total)
+        ))
+    wall = time.perf_counter() - started
+
+    latencies = [r["latency"] for r in results]
+    statuses = {}
+    for r in results:
+        statuses[str(r["status"])] = statuses.get(str(r["status"]), 0) + 1
+    lessons_ok = sum(r["lessons_ok"] for r in results)
+    return {
+        "mode": mode,
+        "concurrency": concurrency,
+        "requests": total,
+        "lessons_per_request": lessons if mode == "batch" else 1,
+        "succeeded_requests": len([r for r in results if r["ok"]]),
+        "succeeded_lessons": lessons_ok,
+        "total_lessons": sum(r["lessons"] for r in results),
+        "wall_seconds": round(wall, 3),
+        "requests_per_second": round(total / wall, 3) if wall else 0.0,
+        "lessons_per_second": round(lessons_ok / wall, 3) if wall else 0.0,
+        "latency_seconds": {
+            "min": round(min(latencies), 3) if latencies else 0.0,
+            "p50": round(percentile(latencies, 50), 3),
+            "p95": round(percentile(latencies, 95), 3),
+            "p99": round(percentile(latencies, 99), 3),
+            "max": round(max(latencies), 3) if latencies else 0.0
+        },
+        "status_counts": statuses
+    }
+
+
+def print_report(report: dict):
+    lat = report["latency_seconds"]
+    print("=" * 60)
+    print(f"模式: {report['mode']}  并发: {report['concurrency']}  请求数: {report['requests']}")
+    print(f"成功请求: {report['succeeded_requests']}/{report['requests']}  "
+          f"成功课时: {report['succeeded_lessons']}/{report['total_lessons']}")
+    print(f"总耗时: {report['wall_seconds']}s  吞吐: {report['requests_per_second']} req/s, "
+          f"{report['lessons_per_second']} 课时/s")
+    print(f"延迟(s): min {lat['min']}  p50 {lat['p50']}  p95 {lat['p95']}  p99 {lat['p99']}  max {lat['max']}")
+    print(f"状态码: {report['status_counts']}")
+    print("=" * 60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="教案生成服务离线压测")
+    parser.add_argument("--base-url", default="http://127.0.0.1:5000")
+    parser.add_argument("--mode", choices=["generate", "batch"], default="generate")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=20, help="总请求数")
+    parser.add_argument("--lessons", type=int, default=3, help="batch模式下每个请求的课时数")
+    parser.add_argument("--api-key", default="sk-loadtest-0000000000")
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--json", dest="json_path", help="将报告写入JSON文件")
+    parser.add_argument("--self-contained", action="store_true", help="在本进程内启动模拟DeepSeek服务和API服务")
+    parser.add_argument("--mock-latency", default="lognormal:0.5,0.4")
+    parser.add_argument("--mock-rate-429", type=float, default=0.0)
+    parser.add_argument("--mock-rate-5xx", type=float, default=0.0)
+    parser.add_argument("--mock-rate-malformed", type=float, default=0.0)
+    parser.add_argument("--mock-retry-after", type=float, default=1.0)
+    args = parser.parse_args()
+
+    base_url = start_self_contained(args) if args.self_contained else args.base_url.rstrip("/")
+    report = run_load(base_url, args.mode, args.concurrency, args.requests, args.lessons,
+                      args.api_key, args.timeout)
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0 if report["succeeded_requests"] == report["requests"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,13 +4,18 @@
 """
 import os
 import sys
+import json
 import logging
 
 logger = logging.getLogger('jiaoan')
 
 from config import DEFAULT_COURSE_INFO, DEFAULT_FIXED_COURSE_INFO, DEFAULT_VARIABLE_COURSE_INFO
 from ai_generator import generate_lesson_plan, get_mock_lesson_data
-from docx_utils import LessonPlanDoc
+from deepseek_client import DeepSeekClient
+from time_budget import rebalance_process_times
+import metrics
+import tracing
+import startup
 from utils import (
     format_analysis_text,
     format_objectives_text,
@@ -19,6 +24,9 @@ from utils import (
     format_homework_text
 )
 
+# python-docx 较重，生成第一份教案时才导入
+docx_utils = startup.lazy_module("docx_utils")
+
 
 def print_header():
     logger.info("=" * 60)
@@ -35,70 +43,148 @@ def print_course_info(course_info: dict):
     logger.info(f"   授课教师: {course_info.get('授课教师', '')}")
 
 
+def save_lesson_data(data_path: str, course_info: dict, lesson_data: dict, template_id: str = None):
+    """
+    保存教案数据，供后续单独重新生成某个部分时使用
+    参考文档内容体积大且已体现在教案中，不随之保存；template_id 为生成时使用的模板
+    """
+    stored_course_info = {k: v for k, v in course_info.items() if k != '参考文档'}
+    os.makedirs(os.path.dirname(data_path), exist_ok=True)
+    with open(data_path, 'w', encoding='utf-8') as f:
+        json.dump({'course_info': stored_course_info, 'lesson_data': lesson_data, 'template_id': template_id},
+                  f, ensure_ascii=False)
+
+
+def load_lesson_data(data_path: str):
+    """读取已保存的教案数据，返回 (course_info, lesson_data)，不存在时返回 (None, None)"""
+    if not os.path.exists(data_path):
+        return None, None
+    with open(data_path, 'r', encoding='utf-8') as f:
+        stored = json.load(f)
+    return stored.get('course_info'), stored.get('lesson_data')
+
+
+def load_lesson_template_id(data_path: str):
+    """已保存的教案数据使用的模板ID，没有记录时返回None（即内置模板）"""
+    if not os.path.exists(data_path):
+        return None
+    with open(data_path, 'r', encoding='utf-8') as f:
+        return json.load(f).get('template_id')
+
+
 def generate_lesson_plan_doc(
     template_path: str,
     output_path: str,
     course_info: dict,
-    use_mock: bool = True
+    use_mock: bool = True,
+    stats: dict = None,
+    lesson_data: dict = None,
+    data_path: str = None,
+    client: DeepSeekClient = None,
+    template=None
 ) -> bool:
+    """
+    生成教案文档
+
+    lesson_data: 已有的教案数据，提供时不再调用大模型，直接渲染
+    data_path: 提供时将最终使用的教案数据保存到该路径（见 save_lesson_data）
+    client: 调用方的API凭据与连接，未提供时从环境变量读取
+    template: 模板注册表中的模板（template_registry.LessonTemplate），提供时使用其缓存的内容与槽位表，
+        不再读取 template_path
+    """
     print_header()
     print_course_info(course_info)
     
-    if use_mock:
+    if lesson_data is not None:
+        logger.info("⚙️  生成模式: 使用已有教案数据重新渲染")
+    elif use_mock:
         logger.info("⚙️  生成模式: 本地模拟数据")
         lesson_data = get_mock_lesson_data(course_info)
     else:
         logger.info("⚙️  生成模式: DeepSeek AI实时生成（单次请求）")
-        lesson_data = generate_lesson_plan(course_info)
+        lesson_data = generate_lesson_plan(course_info, stats=stats, client=client)
         if lesson_data and isinstance(lesson_data, dict) and lesson_data.get("error") == "invalid_api_key":
             logger.error("❌ API Key无效，停止生成")
             return "invalid_api_key"
+        if lesson_data and isinstance(lesson_data, dict) and lesson_data.get("error") == "cancelled":
+            logger.warning("⏹️  生成任务已取消")
+            return "cancelled"
+        if lesson_data and isinstance(lesson_data, dict) and lesson_data.get("error") in ("circuit_open", "rate_limited"):
+            # 服务不可用或被限流时不退回模拟数据，否则用户会拿到一份看似成功的虚构教案
+            logger.error(f"❌ {lesson_data['message']}")
+            if stats is not None:
+                stats["retry_in"] = lesson_data.get("retry_in")
+            return lesson_data["error"]
         if lesson_data is None:
-            logger.error("❌ 大模型调用失败，使用默认数据")
-            lesson_data = get_mock_lesson_data(course_info)
+            # 重试用尽、超过截止时间或不可重试的错误：同样不退回模拟数据，按失败处理
+            logger.error("❌ 大模型调用失败，未生成教案")
+            return False
     
-    logger.info(f"📄 正在打开模板: {template_path}")
+    logger.info(f"📄 正在打开模板: {template.name if template else template_path}")
     try:
-        doc = LessonPlanDoc(template_path)
+        with tracing.span("template_load"):
+            doc = template.open() if template else docx_utils.LessonPlanDoc(template_path)
         logger.info("   ✅ 模板打开成功")
     except Exception as e:
         logger.error(f"   ❌ 打开模板失败：{e}")
         return False
     
-    logger.info("📊 步骤1: 填充基础信息表格")
-    doc.fill_basic_info(course_info)
-    logger.info("   ✅ 基础信息填充完成")
-    
-    logger.info("📊 步骤2: 填充教案内容表格")
-    doc.fill_content_info(course_info)
-    
-    modules = [
-        (3, format_analysis_text(lesson_data.get("教学内容及学情分析", {})), "教学内容及学情分析"),
-        (4, format_objectives_text(lesson_data.get("教学目标", {})), "教学目标"),
-        (5, format_list_text(lesson_data.get("教学重点", [])), "教学重点"),
-        (6, format_list_text(lesson_data.get("教学难点", [])), "教学难点"),
-        (7, format_methods_text(lesson_data.get("教学方法与教学资源", {})), "教学方法与教学资源"),
-        (8, format_list_text(lesson_data.get("思政元素", [])), "思政元素"),
-    ]
-    
-    for row, text, name in modules:
-        doc.fill_content_module(row, text)
-        logger.info(f"   ✅ {name}")
-    
-    logger.info("📊 步骤3: 填充教学实施过程")
-    process_steps = lesson_data.get("教学实施过程", [])
-    logger.info(f"   📋 共 {len(process_steps)} 个教学环节")
-    for i, step in enumerate(process_steps, 1):
-        logger.info(f"      环节{i}: {step.get('环节', 'N/A')} ({step.get('时间', 'N/A')})")
-    
-    homework_text = format_homework_text(lesson_data.get("课外作业", {}))
-    doc.fill_process_table(process_steps, homework_text)
-    logger.info("   ✅ 教学环节填充完成")
-    logger.info("   ✅ 课外作业填充完成")
+    with tracing.span("fill_content"):
+        logger.info("📊 步骤1: 填充基础信息表格")
+        doc.fill_basic_info(course_info)
+        logger.info("   ✅ 基础信息填充完成")
+    
+        logger.info("📊 步骤2: 填充教案内容表格")
+        doc.fill_content_info(course_info)
+    
+        modules = [
+            ("教学内容及学情分析", format_analysis_text(lesson_data.get("教学内容及学情分析", {}))),
+            ("教学目标", format_objectives_text(lesson_data.get("教学目标", {}))),
+            ("教学重点", format_list_text(lesson_data.get("教学重点", []))),
+            ("教学难点", format_list_text(lesson_data.get("教学难点", []))),
+            ("教学方法与教学资源", format_methods_text(lesson_data.get("教学方法与教学资源", {}))),
+            ("思政元素", format_list_text(lesson_data.get("思政元素", []))),
+        ]
+    
+        for name, text in modules:
+            if doc.fill_module(name, text):
+                logger.info(f"   ✅ {name}")
+            else:
+                logger.warning(f"   ⚠️  模板中没有「{name}」，跳过")
+    
+    with tracing.span("fill_process") as process_span:
+        logger.info("📊 步骤3: 填充教学实施过程")
+        process_steps, time_report = rebalance_process_times(
+            lesson_data.get("教学实施过程", []), course_info.get("授课学时", "")
+        )
+        metrics.record_time_budget(stats, time_report)
+        if time_report["status"] == "rebalanced":
+            lesson_data = {**lesson_data, "教学实施过程": process_steps}
+            if time_report['original_total'] is None:
+                logger.info(f"   ⏱️  部分环节时长无法解析，已按比例分配为 {time_report['budget']} 分钟")
+            else:
+                logger.info(
+                    f"   ⏱️  环节总时长 {time_report['original_total']:g} 分钟与授课学时不符，"
+                    f"已按比例调整为 {time_report['budget']} 分钟"
+                )
+        elif time_report["status"] == "irreparable":
+            logger.warning(f"   ⚠️  教学时间无法自动调整：{time_report.get('reason', '')}")
+        process_span.set(steps=len(process_steps), time_budget=time_report["status"])
+        logger.info(f"   📋 共 {len(process_steps)} 个教学环节")
+        for i, step in enumerate(process_steps, 1):
+            logger.info(f"      环节{i}: {step.get('环节', 'N/A')} ({step.get('时间', 'N/A')})")
+    
+        homework_text = format_homework_text(lesson_data.get("课外作业", {}))
+        doc.fill_process_table(process_steps, homework_text)
+        logger.info("   ✅ 教学环节填充完成")
+        logger.info("   ✅ 课外作业填充完成")
     
     logger.info("💾 正在保存教案...")
     try:
-        doc.save(output_path)
+        with tracing.span("save"):
+            doc.save(output_path)
+            if data_path:
+                save_lesson_data(data_path, course_info, lesson_data, template.id if template else None)
         logger.info("   ✅ 教案保存成功！")
         logger.info("=" * 60)
         logger.info("🎉 教案生成完成!")
@@ -135,7 +221,7 @@ def main():
         use_mock=True  # 改为True可使用模拟数据测试
     )
     
-    return 0 if success else 1
+    return 0 if success is True else 1
 
 
 def batch_generate_lesson_plans(
@@ -143,7 +229,8 @@ def batch_generate_lesson_plans(
     output_dir: str,
     fixed_course_info: dict,
     variable_course_infos: list,
-    use_mock: bool = True
+    use_mock: bool = True,
+    client: DeepSeekClient = None
 ) -> bool:
     print_header()
     logger.info("📋 批量生成教案")
@@ -171,10 +258,11 @@ def batch_generate_lesson_plans(
             template_path=template_path,
             output_path=output_path,
             course_info=course_info,
-            use_mock=use_mock
+            use_mock=use_mock,
+            client=client
         )
         
-        if not success:
+        if success is not True:
             all_success = False
             logger.error(f"   ❌ 生成失败")
         else:
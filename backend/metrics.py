@@ -0,0 +1,382 @@
+"""
+指标模块 - 统计大模型调用的Token用量、耗时、重试与费用
+提供进程内的计数器/直方图，并按Prometheus文本格式导出
+"""
+import threading
+
+from config import PRICE_PER_MILLION_TOKENS, PRICE_CURRENCY
+
+
+# 直方图默认分桶
+DURATION_BUCKETS = (1, 2.5, 5, 10, 20, 30, 45, 60, 90, 120, 180, 300, 600)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+
+
+def _format_labels(label_names, label_values, extra=None) -> str:
+    pairs = list(zip(label_names, label_values))
+    if extra:
+        pairs.extend(extra)
+    if not pairs:
+        return ""
+    body = ",".join(
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in pairs
+    )
+    return "{" + body + "}"
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """单调递增计数器"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self) -> list:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Gauge(Counter):
+    """可增可减的瞬时值"""
+
+    type_name = "gauge"
+
+    def set(self, value, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.label_names)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram:
+    """累积分桶直方图"""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets=DURATION_BUCKETS, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self.label_names = tuple(label_names)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.label_names)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+                self._series[key] = series
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+
+    def collect(self) -> list:
+        with self._lock:
+            items = sorted((k, dict(v, counts=list(v["counts"]))) for k, v in self._series.items())
+        lines = []
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series["counts"]):
+                cumulative += count
+                labels = _format_labels(self.label_names, key, [("le", _format_value(float(bound)))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(round(series['sum'], 6))}")
+            lines.append(f"{self.name}_count{labels} {series['count']}")
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, label_names=()) -> Counter:
+        return self.register(Counter(name, documentation, label_names))
+
+    def gauge(self, name, documentation, label_names=()) -> Gauge:
+        return self.register(Gauge(name, documentation, label_names))
+
+    def histogram(self, name, documentation, buckets=DURATION_BUCKETS, label_names=()) -> Histogram:
+        return self.register(Histogram(name, documentation, buckets, label_names))
+
+    def render(self) -> str:
+        """按Prometheus文本格式(0.0.4)导出全部指标"""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+LLM_ATTEMPTS = REGISTRY.counter(
+    "jiaoan_llm_attempts_total", "大模型HTTP请求次数（按结果分类）", ["outcome"])
+LLM_ATTEMPT_SECONDS = REGISTRY.histogram(
+    "jiaoan_llm_attempt_duration_seconds", "单次大模型HTTP请求耗时（秒）")
+LLM_TOKENS = REGISTRY.counter(
+    "jiaoan_llm_tokens_total", "大模型Token用量", ["type"])
+LLM_PROMPT_TOKENS = REGISTRY.histogram(
+    "jiaoan_llm_prompt_tokens", "单次请求的输入Token数", TOKEN_BUCKETS)
+LLM_COMPLETION_TOKENS = REGISTRY.histogram(
+    "jiaoan_llm_completion_tokens", "单次请求的输出Token数", TOKEN_BUCKETS)
+LLM_RETRIES = REGISTRY.counter(
+    "jiaoan_llm_retries_total", "大模型请求重试次数")
+LLM_CIRCUIT_REJECTIONS = REGISTRY.counter(
+    "jiaoan_llm_circuit_rejections_total", "熔断器打开期间被快速拒绝的请求次数")
+LLM_PARSE_FAILURES = REGISTRY.counter(
+    "jiaoan_llm_parse_failures_total", "大模型返回内容解析失败次数（json: 语法错误, schema: 结构校验失败）", ["stage"])
+JSON_REPAIRS = REGISTRY.counter(
+    "jiaoan_json_repairs_total", "本地修复大模型JSON输出的次数（按缺陷类型）", ["kind"])
+TIME_BUDGET = REGISTRY.counter(
+    "jiaoan_time_budget_checks_total", "教学实施过程时间校验结果（ok / rebalanced / irreparable）", ["status"])
+LLM_COST = REGISTRY.counter(
+    "jiaoan_llm_cost_total", f"按配置单价估算的调用费用（{PRICE_CURRENCY}）")
+LESSONS = REGISTRY.counter(
+    "jiaoan_lessons_total", "教案内容生成次数（kind: lesson 完整教案, section 单个部分）", ["kind", "outcome"])
+LESSON_SECONDS = REGISTRY.histogram(
+    "jiaoan_lesson_generation_duration_seconds", "单次教案内容生成总耗时（含重试，秒）", label_names=["kind"])
+
+SCHEDULER_QUEUED = REGISTRY.gauge(
+    "jiaoan_scheduler_queued", "排队等待生成的任务数（interactive 单课时, bulk 批量）", ["priority"])
+SCHEDULER_RUNNING = REGISTRY.gauge(
+    "jiaoan_scheduler_running", "正在进行的生成任务数")
+SCHEDULER_WAIT_SECONDS = REGISTRY.histogram(
+    "jiaoan_scheduler_wait_seconds", "生成任务排队等待时间（秒）", label_names=["priority"])
+
+RATE_LIMIT_DELAYS = REGISTRY.counter(
+    "jiaoan_rate_limit_delays_total", "因客户端限流而延后发送的请求次数")
+RATE_LIMIT_DELAY_SECONDS = REGISTRY.histogram(
+    "jiaoan_rate_limit_delay_seconds", "客户端限流导致的发送延迟（秒）",
+    (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120))
+RATE_LIMIT_BACKOFFS = REGISTRY.counter(
+    "jiaoan_rate_limit_backoffs_total", "收到429后降低发送速率的次数")
+
+STORAGE_EVICTED_FILES = REGISTRY.counter(
+    "jiaoan_storage_evicted_files_total", "存储清理删除的文件数（reason: ttl 过期, size 超出目录上限）",
+    ["directory", "reason"])
+STORAGE_EVICTED_BYTES = REGISTRY.counter(
+    "jiaoan_storage_evicted_bytes_total", "存储清理释放的字节数", ["directory"])
+STORAGE_BYTES = REGISTRY.gauge(
+    "jiaoan_storage_bytes", "各数据目录的总大小（字节，上次清理时）", ["directory"])
+STORAGE_FILES = REGISTRY.gauge(
+    "jiaoan_storage_files", "各数据目录的文件数（上次清理时）", ["directory"])
+
+PROMPT_JOURNAL_WRITTEN = REGISTRY.counter(
+    "jiaoan_prompt_journal_written_total", "写入提示词日志的记录数")
+PROMPT_JOURNAL_DROPPED = REGISTRY.counter(
+    "jiaoan_prompt_journal_dropped_total", "因写入队列已满而丢弃的提示词日志记录数")
+
+STARTUP_SECONDS = REGISTRY.gauge(
+    "jiaoan_startup_seconds", "从进程启动到各启动阶段完成的耗时（秒）", ["phase"])
+STARTUP_IMPORT_SECONDS = REGISTRY.gauge(
+    "jiaoan_startup_import_seconds", "各重型依赖的导入耗时（秒，包含其尚未导入的依赖）", ["module"])
+
+
+def new_call_stats() -> dict:
+    """创建一次教案生成调用的统计记录"""
+    return {
+        "attempts": 0,
+        "retries": 0,
+        "parse_failures": 0,
+        "json_repairs": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "cache_hit_tokens": 0,
+        "cache_miss_tokens": 0,
+        "llm_seconds": 0.0,
+        "throttle_seconds": 0.0,
+        "wall_seconds": 0.0,
+        "cost": 0.0,
+        "shared": False,
+        "outcome": "pending",
+    }
+
+
+def estimate_cost(cache_hit_tokens: int, cache_miss_tokens: int, completion_tokens: int) -> float:
+    """按配置单价估算费用（单价为每百万Token）"""
+    return (
+        cache_hit_tokens * PRICE_PER_MILLION_TOKENS["prompt_cache_hit"]
+        + cache_miss_tokens * PRICE_PER_MILLION_TOKENS["prompt_cache_miss"]
+        + completion_tokens * PRICE_PER_MILLION_TOKENS["completion"]
+    ) / 1_000_000
+
+
+def record_attempt(stats: dict, outcome: str, seconds: float, usage: dict = None):
+    """记录一次HTTP请求（一次尝试）的耗时与Token用量"""
+    stats["attempts"] += 1
+    stats["llm_seconds"] += seconds
+    LLM_ATTEMPTS.inc(outcome=outcome)
+    LLM_ATTEMPT_SECONDS.observe(seconds)
+
+    if not usage:
+        return
+    prompt_tokens = int(usage.get("prompt_tokens") or 0)
+    completion_tokens = int(usage.get("completion_tokens") or 0)
+    # DeepSeek 返回 prompt_cache_hit_tokens / prompt_cache_miss_tokens，
+    # 其他兼容接口可能只有 prompt_tokens_details.cached_tokens
+    cache_hit = usage.get("prompt_cache_hit_tokens")
+    if cache_hit is None:
+        cache_hit = (usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0)
+    cache_hit = int(cache_hit or 0)
+    cache_miss = int(usage.get("prompt_cache_miss_tokens", prompt_tokens - cache_hit) or 0)
+    cost = estimate_cost(cache_hit, cache_miss, completion_tokens)
+
+    stats["prompt_tokens"] += prompt_tokens
+    stats["completion_tokens"] += completion_tokens
+    stats["cache_hit_tokens"] += cache_hit
+    stats["cache_miss_tokens"] += cache_miss
+    stats["cost"] += cost
+
+    LLM_TOKENS.inc(prompt_tokens, type="prompt")
+    LLM_TOKENS.inc(completion_tokens, type="completion")
+    LLM_TOKENS.inc(cache_hit, type="prompt_cache_hit")
+    LLM_TOKENS.inc(cache_miss, type="prompt_cache_miss")
+    LLM_PROMPT_TOKENS.observe(prompt_tokens)
+    LLM_COMPLETION_TOKENS.observe(completion_tokens)
+    LLM_COST.inc(cost)
+
+
+def record_retry(stats: dict):
+    stats["retries"] += 1
+    LLM_RETRIES.inc()
+
+
+def record_circuit_rejection():
+    LLM_CIRCUIT_REJECTIONS.inc()
+
+
+def record_parse_failure(stats: dict, stage: str = "json"):
+    stats["parse_failures"] += 1
+    LLM_PARSE_FAILURES.inc(stage=stage)
+
+
+def record_json_repairs(stats: dict, repairs: dict):
+    """记录一次本地JSON修复（repairs为各类缺陷的修复次数）"""
+    stats["json_repairs"] += sum(repairs.values())
+    for kind, amount in repairs.items():
+        JSON_REPAIRS.inc(amount, kind=kind)
+
+
+def record_rate_limit_delay(stats: dict, seconds: float):
+    """记录一次因客户端限流而延后发送"""
+    stats["throttle_seconds"] += seconds
+    RATE_LIMIT_DELAYS.inc()
+    RATE_LIMIT_DELAY_SECONDS.observe(seconds)
+
+
+def record_rate_limit_backoff():
+    RATE_LIMIT_BACKOFFS.inc()
+
+
+def record_time_budget(stats: dict, report: dict):
+    """记录教学实施过程的时间校验结果（stats可为None）"""
+    TIME_BUDGET.inc(status=report["status"])
+    if stats is not None:
+        stats["time_budget"] = report
+
+
+def record_lesson(stats: dict, outcome: str, wall_seconds: float, kind: str = "lesson"):
+    """记录一次完整的教案内容生成（含所有重试）"""
+    stats["outcome"] = outcome
+    stats["wall_seconds"] = wall_seconds
+    LESSONS.inc(kind=kind, outcome=outcome)
+    LESSON_SECONDS.observe(wall_seconds, kind=kind)
+
+
+def record_skipped_lesson(stats: dict, outcome: str = "cancelled", kind: str = "lesson"):
+    """记录一个未开始就被取消的课时（不计入耗时分布）"""
+    stats["outcome"] = outcome
+    LESSONS.inc(kind=kind, outcome=outcome)
+
+
+def usage_summary(stats: dict) -> dict:
+    """精简的单课时用量摘要，附加到会话结果中"""
+    return {
+        "prompt_tokens": stats["prompt_tokens"],
+        "completion_tokens": stats["completion_tokens"],
+        "cache_hit_tokens": stats["cache_hit_tokens"],
+        "attempts": stats["attempts"],
+        "retries": stats["retries"],
+        "parse_failures": stats["parse_failures"],
+        "json_repairs": stats["json_repairs"],
+        "llm_seconds": round(stats["llm_seconds"], 3),
+        "throttle_seconds": round(stats["throttle_seconds"], 3),
+        "wall_seconds": round(stats["wall_seconds"], 3),
+        "cost": round(stats["cost"], 6),
+        "shared": stats["shared"],
+    }
+
+
+def summarize_usage(summaries: list) -> dict:
+    """汇总多个课时的用量摘要，作为会话级统计"""
+    total = {
+        "lessons": len(summaries),
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "cache_hit_tokens": 0,
+        "attempts": 0,
+        "retries": 0,
+        "parse_failures": 0,
+        "json_repairs": 0,
+        "llm_seconds": 0.0,
+        "throttle_seconds": 0.0,
+        "wall_seconds": 0.0,
+        "cost": 0.0,
+        "currency": PRICE_CURRENCY,
+    }
+    for summary in summaries:
+        for key in ("prompt_tokens", "completion_tokens", "cache_hit_tokens", "attempts",
+                    "retries", "parse_failures", "json_repairs", "llm_seconds", "throttle_seconds",
+                    "wall_seconds", "cost"):
+            total[key] += summary.get(key, 0)
+    total["llm_seconds"] = round(total["llm_seconds"], 3)
+    total["throttle_seconds"] = round(total["throttle_seconds"], 3)
+    total["wall_seconds"] = round(total["wall_seconds"], 3)
+    total["cost"] = round(total["cost"], 6)
+    return total
+
+
+def render_prometheus() -> str:
+    return REGISTRY.render()
@@ -0,0 +1,216 @@
+"""
+本地模拟DeepSeek服务 - 兼容OpenAI/DeepSeek的 /v1/chat/completions 接口
+用于离线压测真实的请求、重试和解析流程，不消耗API额度
+
+支持：可配置的延迟分布、429/5xx/401错误注入、畸形JSON注入、流式(SSE)返回
+
+用法：
+    python mock_deepseek_server.py --port 8100 --latency lognormal:1.5,0.4 --rate-429 0.05 --rate-malformed 0.1
+    DEEPSEEK_API_URL=http://127.0.0.1:8100/v1/chat/completions python api_server.py
+"""
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+
+from flask import Flask, request, jsonify, Response, stream_with_context
+
+from ai_generator import get_mock_lesson_data
+
+
+class LatencyModel:
+    """
+    延迟分布，规格字符串格式：
+        fixed:2            固定2秒
+        uniform:1,5        1~5秒均匀分布
+        normal:3,1         均值3秒、标准差1秒的正态分布（截断为非负）
+        lognormal:1.0,0.5  对数正态分布（参数为ln秒的mu和sigma），最贴近真实大模型耗时长尾
+    """
+
+    def __init__(self, spec: str = "fixed:0"):
+        kind, _, params = spec.partition(":")
+        self.kind = kind
+        self.params = [float(p) for p in params.split(",") if p.strip()]
+        if kind not in ("fixed", "uniform", "normal", "lognormal"):
+            raise ValueError(f"未知的延迟分布: {spec}")
+
+    def sample(self) -> float:
+        if self.kind == "fixed":
+            return self.params[0] if self.params else 0.0
+        if self.kind == "uniform":
+            return random.uniform(self.params[0], self.params[1])
+        if self.kind == "normal":
+            return max(0.0, random.gauss(self.params[0], self.params[1]))
+        return math.exp(random.gauss(self.params[0], self.params[1]))
+
+
+MALFORMATIONS = ("missing_comma", "trailing_comma", "truncated", "prose", "missing_field", "smart_quotes")
+
+
+def malform(content: str, lesson: dict) -> tuple:
+    """对正常的JSON内容注入一种常见的大模型格式缺陷，返回 (内容, 缺陷类型)"""
+    kind = random.choice(MALFORMATIONS)
+    if kind == "missing_comma":
+        positions = [m.start() for m in re.finditer(r'",\n', content)]
+        if positions:
+            pos = random.choice(positions)
+            return content[:pos + 1] + content[pos + 2:], kind
+    if kind == "trailing_comma":
+        return re.sub(r'"\n(\s*)\}', r'",\n\1}', content, count=1), kind
+    if kind == "truncated":
+        return content[:int(len(content) * random.uniform(0.6, 0.95))], kind
+    if kind == "prose":
+        return f"好的，以下是为您生成的教案内容：\n```json\n{content}\n```\n如需调整请告诉我。", kind
+    if kind == "missing_field" and isinstance(lesson.get("教学实施过程"), list):
+        broken = json.loads(content)
+        for step in broken["教学实施过程"]:
+            step.pop("教师活动", None)
+        return json.dumps(broken, ensure_ascii=False, indent=4), kind
+    return content.replace('": "', '": “', 3), "smart_quotes"
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算Token数（中文约1.5字符/Token）"""
+    return max(1, int(len(text) / 1.5))
+
+
+def create_app(
+    latency: LatencyModel = None,
+    rate_429: float = 0.0,
+    rate_5xx: float = 0.0,
+    rate_401: float = 0.0,
+    rate_malformed: float = 0.0,
+    api_key: str = "",
+    retry_after: float = 1.0,
+    cache_hit_ratio: float = 0.5
+) -> Flask:
+    latency = latency or LatencyModel()
+    app = Flask("mock_deepseek")
+    counters = {}
+    counters_lock = threading.Lock()
+
+    def count(name):
+        with counters_lock:
+            counters[name] = counters.get(name, 0) + 1
+
+    def error(status, message, headers=None):
+        count(f"http_{status}")
+        return jsonify({"error": {"message": message, "type": "mock_error", "code": status}}), status, headers or {}
+
+    @app.route('/v1/chat/completions', methods=['POST'])
+    @app.route('/chat/completions', methods=['POST'])
+    def chat_completions():
+        count("requests")
+        auth = request.headers.get("Authorization", "")
+        if (api_key and auth != f"Bearer {api_key}") or random.random() < rate_401:
+            return error(401, "Authentication Fails (mock)")
+
+        time.sleep(latency.sample())
+
+        roll = random.random()
+        if roll < rate_429:
+            return error(429, "Rate limit reached (mock)", {"Retry-After": str(retry_after)})
+        if roll < rate_429 + rate_5xx:
+            return error(random.choice([500, 502, 503]), "Server overloaded (mock)")
+
+        body = request.get_json(silent=True) or {}
+        prompt = "".join(m.get("content", "") for m in body.get("messages", []))
+        lesson = get_mock_lesson_data({})
+        section = re.search(r"只重新生成其中的「(.+?)」", prompt)
+        if section and section.group(1) in lesson:
+            lesson = {section.group(1): lesson[section.group(1)]}
+        content = json.dumps(lesson, ensure_ascii=False, indent=4)
+        if random.random() < rate_malformed:
+            content, kind = malform(content, lesson)
+            count(f"malformed_{kind}")
+
+        prompt_tokens = estimate_tokens(prompt)
+        completion_tokens = estimate_tokens(content)
+        cache_hit = int(prompt_tokens * cache_hit_ratio)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_cache_hit_tokens": cache_hit,
+            "prompt_cache_miss_tokens": prompt_tokens - cache_hit
+        }
+        completion_id = f"chatcmpl-mock-{uuid.uuid4().hex[:12]}"
+        model = body.get("model", "deepseek-chat")
+        count("http_200")
+
+        if body.get("stream"):
+            include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+            def events():
+                chunk_size = 20
+                for i in range(0, len(content), chunk_size):
+                    chunk = {
+                        "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                        "model": model,
+                        "choices": [{"index": 0, "delta": {"content": content[i:i + chunk_size]}, "finish_reason": None}]
+                    }
+                    yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                final = {
+                    "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                    "model": model, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]
+                }
+                if include_usage:
+                    final["usage"] = usage
+                yield f"data: {json.dumps(final, ensure_ascii=False)}\n\n"
+                yield "data: [DONE]\n\n"
+
+            return Response(stream_with_context(events()), mimetype="text/event-stream")
+
+        return jsonify({
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": usage
+        })
+
+    @app.route('/stats', methods=['GET'])
+    def stats():
+        with counters_lock:
+            return jsonify(dict(counters))
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟DeepSeek服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", default="lognormal:1.0,0.5", help="延迟分布，见 LatencyModel")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="429限流注入概率")
+    parser.add_argument("--rate-5xx", type=float, default=0.0, help="5xx错误注入概率")
+    parser.add_argument("--rate-401", type=float, default=0.0, help="401鉴权失败注入概率")
+    parser.add_argument("--rate-malformed", type=float, default=0.0, help="畸形JSON注入概率")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="429响应的Retry-After秒数")
+    parser.add_argument("--api-key", default="", help="设置后只接受该API Key，其余返回401")
+    args = parser.parse_args()
+
+    app = create_app(
+        latency=LatencyModel(args.latency),
+        rate_429=args.rate_429,
+        rate_5xx=args.rate_5xx,
+        rate_401=args.rate_401,
+        rate_malformed=args.rate_malformed,
+        api_key=args.api_key,
+        retry_after=args.retry_after
+    )
+    print(f"模拟DeepSeek服务: http://{args.host}:{args.port}/v1/chat/completions")
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+按需采样分析 - 线上某次上传或生成很慢时，直接对这一次请求采样，不必在本地复现
+
+    - PROFILING=1 时才生效；未开启时 @profiled 直接返回原视图函数，没有任何额外开销
+    - 请求带 X-Profile: 1 才会被采样；设置了 PROFILING_TOKEN 时还必须带匹配的 X-Profile-Token
+    - 采样线程每隔 interval 秒记录一次处理该请求的线程（gevent下为greenlet）的调用栈，
+      包括等待网络的时间（墙钟时间），结果按折叠栈格式保存：
+          模块:函数;模块:函数;... 次数
+      可直接用 flamegraph.pl、speedscope 等工具生成火焰图
+    - 响应头 X-Profile-Id 返回采样结果的ID，通过 GET /api/profiles/<ID> 下载
+"""
+import _thread
+import functools
+import hmac
+import logging
+import os
+import sys
+import time
+import uuid
+from collections import Counter
+
+from config import PROFILING_CONFIG
+
+logger = logging.getLogger('jiaoan')
+
+# 单个调用栈最多记录的层数
+MAX_DEPTH = 128
+
+
+def _native_primitives():
+    """原生线程的启动、标识与睡眠函数（gevent打补丁后仍需真正的线程来采样）"""
+    try:
+        from gevent import monkey
+        if monkey.is_module_patched('threading'):
+            return (
+                monkey.get_original('_thread', 'start_new_thread'),
+                monkey.get_original('_thread', 'get_ident'),
+                monkey.get_original('time', 'sleep')
+            )
+    except ImportError:
+        pass
+    return _thread.start_new_thread, _thread.get_ident, time.sleep
+
+
+def _current_greenlet():
+    try:
+        from gevent import monkey
+        if monkey.is_module_patched('threading'):
+            import greenlet
+            return greenlet.getcurrent()
+    except ImportError:
+        pass
+    return None
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    module = frame.f_globals.get('__name__', os.path.basename(code.co_filename))
+    return f"{module}:{code.co_name}".replace(';', ':')
+
+
+class SamplingProfiler:
+    """对调用 start() 的线程（或greenlet）做统计采样"""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples = Counter()
+        self.sample_count = 0
+        self.started_at = None
+        self.duration = 0.0
+        self._running = False
+        self._finished = False
+
+    def start(self):
+        start_thread, get_ident, self._sleep = _native_primitives()
+        self._target_thread = get_ident()
+        self._target_greenlet = _current_greenlet()
+        self._running = True
+        self.started_at = time.perf_counter()
+        start_thread(self._run, ())
+
+    def stop(self):
+        self._running = False
+        while not self._finished:
+            self._sleep(self.interval)
+        self.duration = time.perf_counter() - self.started_at
+
+    def _target_frame(self):
+        if self._target_greenlet is not None:
+            # 挂起中的greenlet有自己的gr_frame；正在运行时为None，取所在线程的当前帧
+            frame = self._target_greenlet.gr_frame
+            if frame is not None:
+                return frame
+        return sys._current_frames().get(self._target_thread)
+
+    def _run(self):
+        try:
+            while self._running:
+                frame = self._target_frame()
+                if frame is not None:
+                    stack = []
+                    while frame is not None and len(stack) < MAX_DEPTH:
+                        stack.append(_frame_label(frame))
+                        frame = frame.f_back
+                    self.samples[';'.join(reversed(stack))] += 1
+                    self.sample_count += 1
+                self._sleep(self.interval)
+        finally:
+            self._finished = True
+
+    def collapsed(self) -> str:
+        """折叠栈格式（每行：调用栈 次数）"""
+        return ''.join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+def profile_directory() -> str:
+    if PROFILING_CONFIG["directory"]:
+        return PROFILING_CONFIG["directory"]
+    base_dir = os.environ.get('RENDER_DATA_DIR') or os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(base_dir, 'profiles')
+
+
+def profile_path(profile_id: str) -> str:
+    """采样结果文件路径；ID不合法时返回None"""
+    if not profile_id or not all(c.isalnum() or c in '-_' for c in profile_id):
+        return None
+    return os.path.join(profile_directory(), f"{profile_id}.collapsed")
+
+
+def authorized(headers) -> bool:
+    """请求是否有权使用采样功能（开启且令牌匹配）"""
+    if not PROFILING_CONFIG["enabled"]:
+        return False
+    token = PROFILING_CONFIG["token"]
+    return not token or hmac.compare_digest(headers.get('X-Profile-Token', ''), token)
+
+
+def _save(profile_id: str, endpoint: str, profiler: SamplingProfiler):
+    directory = profile_directory()
+    os.makedirs(directory, exist_ok=True)
+    with open(profile_path(profile_id), 'w', encoding='utf-8') as f:
+        f.write(f"# endpoint={endpoint} duration={profiler.duration:.3f}s "
+                f"samples={profiler.sample_count} interval={profiler.interval}s\n")
+        f.write(profiler.collapsed())
+    profiles = sorted(
+        (os.path.join(directory, name) for name in os.listdir(directory) if name.endswith('.collapsed')),
+        key=os.path.getmtime
+    )
+    for old in profiles[:-PROFILING_CONFIG["max_profiles"]]:
+        try:
+            os.remove(old)
+        except FileNotFoundError:
+            pass
+
+
+def list_profiles() -> list:
+    directory = profile_directory()
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in os.listdir(directory):
+        if not name.endswith('.collapsed'):
+            continue
+        path = os.path.join(directory, name)
+        with open(path, 'r', encoding='utf-8') as f:
+            header = f.readline().lstrip('# ').strip()
+        profiles.append({
+            'id': name[:-len('.collapsed')],
+            'info': header,
+            'created_at': os.path.getmtime(path)
+        })
+    return sorted(profiles, key=lambda item: item['created_at'], reverse=True)
+
+
+def profiled(endpoint: str):
+    """视图装饰器：按请求头对单次请求采样"""
+    def decorator(view):
+        if not PROFILING_CONFIG["enabled"]:
+            return view
+
+        from flask import request, make_response
+
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.headers.get('X-Profile') != '1' or not authorized(request.headers):
+                return view(*args, **kwargs)
+            profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+            profiler = SamplingProfiler(PROFILING_CONFIG["interval"])
+            profiler.start()
+            try:
+                response = make_response(view(*args, **kwargs))
+            finally:
+                profiler.stop()
+                try:
+                    _save(profile_id, endpoint, profiler)
+                    logger.info(f"🔬 已保存采样结果 {profile_id}（{endpoint}，{profiler.sample_count} 个样本）")
+                except OSError as e:
+                    logger.error(f"❌ 保存采样结果失败: {e}")
+            response.headers['X-Profile-Id'] = profile_id
+            return response
+        return wrapper
+    return decorator
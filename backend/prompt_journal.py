@@ -0,0 +1,292 @@
+"""
+提示词日志 - 记录每次生成的提示词与结果，便于排查生成质量问题（默认关闭，PROMPT_JOURNAL=1 开启）
+
+    - 请求线程只把记录放入队列，压缩和写盘都在后台线程完成，不增加生成耗时；队列满时丢弃记录
+    - 记录为JSON行，写入gzip压缩的分段文件 journal-<时间>-<pid>-<序号>.jsonl.gz，超过大小后轮转，
+      只保留最近的若干个分段
+    - 索引（SQLite）记录每条日志所在的分段和偏移，可按会话ID、课题名称查找
+
+会话ID、课题等上下文通过 bind() 绑定到当前请求，ai_generator 记录时自动带上：
+
+    with prompt_journal.bind(session_id=session_id, topic=topic):
+        generate_lesson_plan(...)
+
+命令行查看：python prompt_journal.py --session <会话ID> [--show]
+"""
+import argparse
+import atexit
+import contextvars
+import glob
+import gzip
+import json
+import logging
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+
+from config import PROMPT_JOURNAL_CONFIG
+from concurrency import run_blocking
+import metrics
+
+logger = logging.getLogger('jiaoan')
+
+_context = contextvars.ContextVar('prompt_journal_context', default={})
+
+
+@contextmanager
+def bind(**fields):
+    """为当前请求绑定记录上下文（如 session_id、topic），with块内的记录都会带上这些字段"""
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def _default_directory() -> str:
+    if hasattr(sys, '_MEIPASS'):
+        base_dir = os.path.dirname(sys.executable)
+    else:
+        base_dir = os.environ.get('RENDER_DATA_DIR') or os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(base_dir, 'prompt_journal')
+
+
+class PromptJournal:
+    """
+    异步、压缩、轮转的提示词日志
+
+    directory: 分段文件与索引所在目录
+    segment_bytes: 单个分段（压缩前）的大小上限
+    max_segments: 最多保留的分段数，超过时删除最旧的分段及其索引
+    queue_size: 待写入记录的队列长度
+    """
+
+    INDEX_NAME = 'index.db'
+
+    def __init__(self, directory: str, segment_bytes: int = 16 * 1024 * 1024, max_segments: int = 20,
+                 queue_size: int = 256):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_segments = max(1, max_segments)
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        # 以下只在写入线程中使用
+        self._segment = None
+        self._segment_path = None
+        self._segment_seq = 0
+        self._index = None
+
+    @classmethod
+    def from_config(cls) -> "PromptJournal":
+        return cls(
+            PROMPT_JOURNAL_CONFIG["directory"] or _default_directory(),
+            int(PROMPT_JOURNAL_CONFIG["segment_mb"] * 1024 * 1024),
+            PROMPT_JOURNAL_CONFIG["max_segments"],
+            PROMPT_JOURNAL_CONFIG["queue_size"]
+        )
+
+    def record(self, kind: str, prompt: str, result=None, **fields):
+        """提交一条记录（不阻塞）；队列满时丢弃并计数"""
+        entry = {
+            'time': datetime.now().isoformat(),
+            'kind': kind,
+            **_context.get(),
+            **fields,
+            'prompt': prompt,
+            'result': result
+        }
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            metrics.PROMPT_JOURNAL_DROPPED.inc()
+
+    def _ensure_started(self):
+        # fork出的worker中需要重新启动写入线程
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            self._pid = os.getpid()
+            self._segment = None
+            self._index = None
+            self._thread = threading.Thread(target=self._loop, name="prompt-journal", daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        while True:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                run_blocking(self._write_batch, batch)
+            except Exception as e:
+                logger.error(f"❌ 写入提示词日志失败: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def flush(self, timeout: float = 5.0):
+        """等待队列中的记录写入完成（进程退出时调用）"""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    # ---- 写入线程 ----
+
+    def _connect_index(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(os.path.join(self.directory, self.INDEX_NAME), timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                time TEXT NOT NULL,
+                session_id TEXT,
+                topic TEXT,
+                kind TEXT,
+                outcome TEXT,
+                segment TEXT NOT NULL,
+                offset INTEGER NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_session ON entries (session_id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_topic ON entries (topic)")
+        return conn
+
+    def _open_segment(self):
+        self._segment_seq += 1
+        name = f"journal-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self._segment_seq}.jsonl.gz"
+        self._segment_path = os.path.join(self.directory, name)
+        self._segment = gzip.open(self._segment_path, 'wb')
+
+    def _write_batch(self, batch):
+        if self._index is None:
+            self._index = self._connect_index()
+        rows = []
+        for entry in batch:
+            if self._segment is None or self._segment.tell() >= self.segment_bytes:
+                # 先登记已写入的记录，轮转时才能一并清理被删除分段的索引
+                self._insert_index(rows)
+                rows = []
+                self._rotate()
+            offset = self._segment.tell()
+            self._segment.write((json.dumps(entry, ensure_ascii=False) + '\n').encode('utf-8'))
+            rows.append((
+                entry['time'], entry.get('session_id'), entry.get('topic'), entry['kind'],
+                entry.get('outcome'), os.path.basename(self._segment_path), offset
+            ))
+        # 同步刷新：写入的记录立即可读，进程异常退出也只丢失未刷新的部分
+        self._segment.flush(zlib.Z_SYNC_FLUSH)
+        self._insert_index(rows)
+        metrics.PROMPT_JOURNAL_WRITTEN.inc(len(batch))
+
+    def _insert_index(self, rows):
+        if rows:
+            self._index.executemany(
+                "INSERT INTO entries (time, session_id, topic, kind, outcome, segment, offset) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+
+    def _rotate(self):
+        if self._segment is not None:
+            self._segment.close()
+        self._open_segment()
+        segments = sorted(glob.glob(os.path.join(self.directory, 'journal-*.jsonl.gz')), key=os.path.getmtime)
+        for path in segments[:-self.max_segments]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._index.execute("DELETE FROM entries WHERE segment = ?", (os.path.basename(path),))
+
+    # ---- 查询 ----
+
+    def lookup(self, session_id: str = None, topic: str = None, limit: int = 50) -> list:
+        """按会话ID和/或课题名称（模糊匹配）查找记录，返回索引行（不含提示词内容），最新的在前"""
+        path = os.path.join(self.directory, self.INDEX_NAME)
+        if not os.path.exists(path):
+            return []
+        clauses, params = [], []
+        if session_id:
+            clauses.append("session_id = ?")
+            params.append(session_id)
+        if topic:
+            clauses.append("topic LIKE ?")
+            params.append(f"%{topic}%")
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        conn = sqlite3.connect(path, timeout=30)
+        try:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute(
+                f"SELECT * FROM entries {where} ORDER BY id DESC LIMIT ?", (*params, limit)
+            ).fetchall()
+        finally:
+            conn.close()
+        return [dict(row) for row in rows]
+
+    def read(self, entry: dict) -> dict:
+        """读取索引行对应的完整记录；分段已被删除时返回None"""
+        path = os.path.join(self.directory, entry['segment'])
+        try:
+            with gzip.open(path, 'rb') as f:
+                f.seek(entry['offset'])
+                return json.loads(f.readline())
+        except (FileNotFoundError, EOFError, ValueError):
+            return None
+
+
+PROMPT_JOURNAL = PromptJournal.from_config() if PROMPT_JOURNAL_CONFIG["enabled"] else None
+
+if PROMPT_JOURNAL is not None:
+    atexit.register(PROMPT_JOURNAL.flush)
+
+
+def record(kind: str, prompt: str, result=None, **fields):
+    """提示词日志开启时提交一条记录"""
+    if PROMPT_JOURNAL is not None:
+        PROMPT_JOURNAL.record(kind, prompt, result, **fields)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查看提示词日志")
+    parser.add_argument("--dir", default=PROMPT_JOURNAL_CONFIG["directory"] or _default_directory())
+    parser.add_argument("--session", help="会话ID")
+    parser.add_argument("--topic", help="课题名称（模糊匹配）")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--show", action="store_true", help="输出完整的提示词与结果")
+    args = parser.parse_args()
+
+    journal = PromptJournal(args.dir)
+    for entry in journal.lookup(args.session, args.topic, args.limit):
+        print(f"{entry['time']}  {entry['kind']:<8} {entry['outcome'] or '':<16} "
+              f"{entry['session_id'] or '-':<36} {entry['topic'] or ''}")
+        if args.show:
+            full = journal.read(entry)
+            if full is None:
+                print("  （分段文件已删除）")
+                continue
+            print("-" * 80)
+            print(full['prompt'])
+            print("-" * 80)
+            print(json.dumps(full['result'], ensure_ascii=False, indent=2))
+            print("=" * 80)
+
+
+if __name__ == "__main__":
+    main()
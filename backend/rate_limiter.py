@@ -0,0 +1,193 @@
+"""
+客户端限流 - 按API Key控制发往DeepSeek的请求速率，尽量贴着上游的RPM/TPM配额持续发送
+
+    - 每个API Key两个令牌桶：请求数（RPM）和Token数（TPM，按提示词长度+输出上限预估）
+    - 发送前预约令牌，不足时返回需要等待的秒数；预约允许余额为负，后来者自动排在后面
+    - 收到429时速率乘以 decrease_factor，并在 Retry-After 期间暂停该Key；
+      之后每次成功把速率加回 increase_step（AIMD），直到配置的上限
+    - 请求成功后用响应中的实际Token用量修正预估
+
+限流器在进程内生效：多worker部署时请按worker数分摊配额（DEEPSEEK_RPM_LIMIT / DEEPSEEK_TPM_LIMIT）
+"""
+import threading
+import time
+
+from config import RATE_LIMIT_CONFIG
+import metrics
+
+# 空闲超过该时间（秒）的Key状态会被清理
+IDLE_SECONDS = 600
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算Token数：中文约每字0.6个Token（DeepSeek分词器），英文和数字更少，按0.6统一估计"""
+    return int(len(text or "") * 0.6) + 1
+
+
+class TokenBucket:
+    """
+    令牌桶：rate 每秒补充的令牌数，capacity 桶容量（允许的突发量）
+    rate 为0表示不限制
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        if self.rate > 0:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        """预约 amount 个令牌，返回需要等待的秒数（余额可以为负）"""
+        if self.rate <= 0:
+            return 0.0
+        self._refill(now)
+        # 单次请求超过桶容量时按容量计，否则永远等不到
+        self.tokens -= min(amount, self.capacity)
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+    def adjust(self, amount: float, now: float):
+        """归还（正数）或补扣（负数）令牌"""
+        if self.rate <= 0:
+            return
+        self._refill(now)
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def drain(self, now: float):
+        if self.rate <= 0:
+            return
+        self._refill(now)
+        self.tokens = min(self.tokens, 0.0)
+
+    def set_rate(self, rate: float, now: float):
+        self._refill(now)
+        self.rate = rate
+
+
+class _KeyState:
+    __slots__ = ("requests", "tokens", "scale", "blocked_until", "last_used")
+
+    def __init__(self, rpm: float, tpm: float, now: float):
+        # 桶容量为一分钟配额：允许在冷启动时突发，长期速率仍受配额约束
+        self.requests = TokenBucket(rpm / 60.0, rpm)
+        self.tokens = TokenBucket(tpm / 60.0, tpm)
+        self.scale = 1.0
+        self.blocked_until = 0.0
+        self.last_used = now
+
+
+class RateLimiter:
+    """
+    按Key的令牌桶限流器
+
+    requests_per_minute / tokens_per_minute: 上游配额，0表示不限制
+    decrease_factor: 收到429时速率乘以该系数
+    increase_step: 每次成功后速率比例增加的量
+    min_scale: 速率比例下限
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float,
+        tokens_per_minute: float,
+        decrease_factor: float = 0.5,
+        increase_step: float = 0.05,
+        min_scale: float = 0.1
+    ):
+        self.requests_per_minute = max(0.0, requests_per_minute)
+        self.tokens_per_minute = max(0.0, tokens_per_minute)
+        self.decrease_factor = decrease_factor
+        self.increase_step = increase_step
+        self.min_scale = min_scale
+        self._lock = threading.Lock()
+        self._keys = {}
+        self._last_cleanup = time.monotonic()
+
+    @classmethod
+    def from_config(cls) -> "RateLimiter":
+        return cls(**RATE_LIMIT_CONFIG)
+
+    @property
+    def enabled(self) -> bool:
+        return self.requests_per_minute > 0 or self.tokens_per_minute > 0
+
+    def _state(self, key: str, now: float) -> _KeyState:
+        state = self._keys.get(key)
+        if state is None:
+            state = self._keys[key] = _KeyState(self.requests_per_minute, self.tokens_per_minute, now)
+        state.last_used = now
+        if now - self._last_cleanup > IDLE_SECONDS:
+            self._last_cleanup = now
+            for idle in [k for k, s in self._keys.items() if now - s.last_used > IDLE_SECONDS]:
+                del self._keys[idle]
+        return state
+
+    def _apply_scale(self, state: _KeyState, now: float):
+        state.requests.set_rate(self.requests_per_minute / 60.0 * state.scale, now)
+        state.tokens.set_rate(self.tokens_per_minute / 60.0 * state.scale, now)
+
+    def reserve(self, key: str, estimated_tokens: int = 0) -> float:
+        """为一次请求预约配额，返回发送前需要等待的秒数"""
+        if not self.enabled:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            state = self._state(key, now)
+            delay = max(
+                state.requests.reserve(1, now),
+                state.tokens.reserve(estimated_tokens, now),
+                state.blocked_until - now
+            )
+            return max(0.0, delay)
+
+    def release(self, key: str, estimated_tokens: int = 0):
+        """预约后没有发送（截止时间不够、任务取消或熔断中）时归还配额"""
+        if not self.enabled:
+            return
+        with self._lock:
+            now = time.monotonic()
+            state = self._state(key, now)
+            state.requests.adjust(1, now)
+            state.tokens.adjust(estimated_tokens, now)
+
+    def observe(self, key: str, status_code: int, used_tokens: int = None, estimated_tokens: int = 0,
+                retry_after: float = None):
+        """根据响应调整速率：429时乘性减并暂停，成功时加性增并用实际用量修正预估"""
+        if not self.enabled:
+            return
+        with self._lock:
+            now = time.monotonic()
+            state = self._state(key, now)
+            if status_code == 429:
+                state.scale = max(self.min_scale, state.scale * self.decrease_factor)
+                self._apply_scale(state, now)
+                state.requests.drain(now)
+                state.tokens.drain(now)
+                if retry_after:
+                    state.blocked_until = max(state.blocked_until, now + retry_after)
+                metrics.record_rate_limit_backoff()
+                return
+            if 200 <= status_code < 300:
+                if state.scale < 1.0:
+                    state.scale = min(1.0, state.scale + self.increase_step)
+                    self._apply_scale(state, now)
+                if used_tokens is not None:
+                    state.tokens.adjust(estimated_tokens - used_tokens, now)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "requests_per_minute": self.requests_per_minute,
+                "tokens_per_minute": self.tokens_per_minute,
+                "keys": len(self._keys),
+                "throttled_keys": sum(1 for s in self._keys.values() if s.scale < 1.0)
+            }
+
+
+DEEPSEEK_RATE_LIMITER = RateLimiter.from_config()
@@ -0,0 +1,192 @@
+"""
+重试策略模块 - 指数退避+抖动、Retry-After、可重试/致命错误区分、整体截止时间与熔断器
+"""
+import random
+import threading
+import time
+import logging
+from email.utils import parsedate_to_datetime
+
+from config import RETRY_CONFIG, CIRCUIT_BREAKER_CONFIG
+
+logger = logging.getLogger('jiaoan')
+
+
+# 可重试的HTTP状态码：限流、超时与上游临时故障
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+# 表示上游服务不健康的状态码（计入熔断器）
+UPSTREAM_FAILURE_STATUS_CODES = {500, 502, 503, 504}
+
+
+def is_retryable_status(status_code: int) -> bool:
+    """判断HTTP状态码是否值得重试；400/401/402/403/404/422等属于致命错误，重试无意义"""
+    return status_code in RETRYABLE_STATUS_CODES
+
+
+def parse_retry_after(value) -> float:
+    """
+    解析Retry-After响应头，支持秒数和HTTP日期两种格式
+    无法解析时返回None
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at is None:
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class Deadline:
+    """整体截止时间（单个课时的全部尝试共享）"""
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+class RetryPolicy:
+    """指数退避重试策略（full jitter）"""
+
+    def __init__(
+        self,
+        max_attempts: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        multiplier: float = 2.0,
+        deadline: float = 300.0,
+        request_timeout: float = 120.0
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.deadline = deadline
+        self.request_timeout = request_timeout
+
+    @classmethod
+    def from_config(cls) -> "RetryPolicy":
+        return cls(**RETRY_CONFIG)
+
+    def new_deadline(self) -> Deadline:
+        return Deadline(self.deadline)
+
+    def backoff(self, attempt: int, retry_after: float = None) -> float:
+        """
+        计算第attempt次失败后的等待时间（attempt从1开始）
+        服务端给出Retry-After时以其为准（由整体截止时间兜底）
+        """
+        if retry_after is not None:
+            return retry_after
+        ceiling = min(self.max_delay, self.base_delay * (self.multiplier ** (attempt - 1)))
+        return random.uniform(0, ceiling)
+
+    def request_timeout_for(self, deadline: Deadline) -> float:
+        """单次请求的超时时间，不超过剩余的整体截止时间"""
+        return min(self.request_timeout, deadline.remaining())
+
+
+class CircuitBreaker:
+    """
+    熔断器：连续失败达到阈值后打开，冷却期内直接拒绝请求；
+    冷却结束后进入半开状态，仅放行一个探测请求，成功则关闭，失败则重新打开；
+    探测请求既没有成功也没有失败就结束时（如被取消），须调用 release_probe() 交还探测名额
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 60.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._probe_owner = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+            self._probe_owner = None
+        return self._state
+
+    def allow(self) -> bool:
+        """是否允许发出请求"""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                self._probe_owner = threading.get_ident()
+                return True
+            return False
+
+    def release_probe(self):
+        """
+        交还当前线程持有的探测名额（未记录结果时），熔断器保持半开，下一个请求可以继续探测
+        当前线程没有持有探测名额（或已记录成功/失败）时不做任何事，可在每次请求结束时无条件调用
+        """
+        with self._lock:
+            if self._probe_in_flight and self._probe_owner == threading.get_ident():
+                self._probe_in_flight = False
+                self._probe_owner = None
+
+    def retry_in(self) -> float:
+        """距离熔断器允许探测还需等待的秒数"""
+        with self._lock:
+            if self._current_state() != self.OPEN:
+                return 0.0
+            return max(0.0, self.recovery_timeout - (time.monotonic() - self._opened_at))
+
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info(f"     🟢 熔断器[{self.name}]恢复关闭")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+            self._probe_owner = None
+
+    def record_failure(self):
+        with self._lock:
+            state = self._current_state()
+            self._failures += 1
+            if state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if state != self.OPEN:
+                    logger.warning(
+                        f"     🔴 熔断器[{self.name}]打开：连续失败 {self._failures} 次，"
+                        f"{self.recovery_timeout:.0f}s 内快速失败"
+                    )
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+                self._probe_owner = None
+
+
+DEEPSEEK_BREAKER = CircuitBreaker("deepseek", **CIRCUIT_BREAKER_CONFIG)
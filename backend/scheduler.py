@@ -0,0 +1,213 @@
+"""
+生成任务调度器 - 在调用大模型之前排队，限制并发并保证多用户之间的公平
+
+    - 两个优先级：interactive（/api/generate、单个部分重新生成）优先于 bulk（批量生成的每个课时）
+    - 同一优先级内按租户（API Key）轮转，一个60课时的批量任务不会挡住其他老师
+    - 每个租户同时进行的生成数不超过 per_key_max_in_flight
+    - 排队时通过回调报告当前位置和预计等待时间
+
+调度器在进程内生效：多worker部署时每个worker各自限流
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+from config import SCHEDULER_CONFIG
+from cancellation import GenerationCancelled
+import metrics
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+PRIORITIES = (INTERACTIVE, BULK)
+
+
+def tenant_key(api_key: str) -> str:
+    """租户标识：API Key的摘要（不在内存和会话中保存明文Key）"""
+    return hashlib.sha256((api_key or "").strip().encode("utf-8")).hexdigest()[:16]
+
+
+class _Ticket:
+    __slots__ = ("tenant", "priority", "enqueued_at", "granted")
+
+    def __init__(self, tenant: str, priority: str):
+        self.tenant = tenant
+        self.priority = priority
+        self.enqueued_at = time.monotonic()
+        self.granted = False
+
+
+class FairScheduler:
+    """
+    公平调度器
+
+    max_concurrent: 同时进行的生成数
+    per_key_max_in_flight: 每个租户同时进行的生成数上限
+    initial_estimate: 没有历史数据时单个任务的耗时估计（秒）
+    """
+
+    # 排队等待时刷新位置与检查取消的间隔（秒）
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, max_concurrent: int, per_key_max_in_flight: int, initial_estimate: float = 60.0):
+        self.max_concurrent = max(1, max_concurrent)
+        self.per_key_max_in_flight = max(1, per_key_max_in_flight)
+        self._cond = threading.Condition()
+        # 每个优先级：租户 -> 该租户的排队任务；OrderedDict的顺序即轮转顺序
+        self._queues = {priority: OrderedDict() for priority in PRIORITIES}
+        self._in_flight = {}
+        self._running = 0
+        self._avg_seconds = initial_estimate
+
+    @classmethod
+    def from_config(cls) -> "FairScheduler":
+        return cls(
+            SCHEDULER_CONFIG["max_concurrent"],
+            SCHEDULER_CONFIG["per_key_max_in_flight"],
+            SCHEDULER_CONFIG["initial_estimate"]
+        )
+
+    @contextmanager
+    def slot(self, tenant: str, priority: str = INTERACTIVE, cancel_token=None, on_wait=None):
+        """
+        获取一个生成名额，with块结束时归还
+
+        cancel_token: 排队期间被取消时抛出 GenerationCancelled
+        on_wait: 排队位置变化时调用 on_wait({"position", "estimated_wait_seconds", "priority"})，
+                 获得名额时调用 on_wait(None)
+        """
+        ticket = self._acquire(tenant, priority, cancel_token, on_wait)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(ticket, time.monotonic() - started)
+
+    def _acquire(self, tenant, priority, cancel_token, on_wait) -> _Ticket:
+        if priority not in self._queues:
+            raise ValueError(f"未知的优先级: {priority}")
+        ticket = _Ticket(tenant, priority)
+        with self._cond:
+            self._queues[priority].setdefault(tenant, deque()).append(ticket)
+            self._dispatch()
+            self._update_gauges()
+
+        last_info = None
+        while True:
+            with self._cond:
+                if not ticket.granted:
+                    info = self._position(ticket)
+            if ticket.granted:
+                break
+            if on_wait and info != last_info:
+                on_wait(info)
+                last_info = info
+            if cancel_token is not None and cancel_token.cancelled:
+                with self._cond:
+                    if not ticket.granted:
+                        self._remove(ticket)
+                        self._update_gauges()
+                        raise GenerationCancelled()
+                # 取消与获得名额同时发生：归还名额
+                self._release(ticket, 0, observe=False)
+                raise GenerationCancelled()
+            with self._cond:
+                if not ticket.granted:
+                    self._cond.wait(self.POLL_INTERVAL)
+
+        metrics.SCHEDULER_WAIT_SECONDS.observe(time.monotonic() - ticket.enqueued_at, priority=priority)
+        if on_wait and last_info is not None:
+            on_wait(None)
+        return ticket
+
+    def _release(self, ticket: _Ticket, seconds: float, observe: bool = True):
+        with self._cond:
+            self._running -= 1
+            self._in_flight[ticket.tenant] -= 1
+            if not self._in_flight[ticket.tenant]:
+                del self._in_flight[ticket.tenant]
+            if observe and seconds > 0:
+                # 指数滑动平均，用于估算排队等待时间
+                self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * seconds
+            self._dispatch()
+            self._update_gauges()
+
+    def _dispatch(self):
+        """在持有锁时调用：把空闲名额按优先级、租户轮转分配给排队任务"""
+        granted = False
+        while self._running < self.max_concurrent:
+            ticket = self._next_ticket()
+            if ticket is None:
+                break
+            ticket.granted = True
+            self._running += 1
+            self._in_flight[ticket.tenant] = self._in_flight.get(ticket.tenant, 0) + 1
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def _next_ticket(self) -> _Ticket:
+        for priority in PRIORITIES:
+            queues = self._queues[priority]
+            for tenant in list(queues):
+                if self._in_flight.get(tenant, 0) >= self.per_key_max_in_flight:
+                    continue
+                ticket = queues[tenant].popleft()
+                # 被服务的租户移到轮转队尾
+                remaining = queues.pop(tenant)
+                if remaining:
+                    queues[tenant] = remaining
+                return ticket
+        return None
+
+    def _remove(self, ticket: _Ticket):
+        queue = self._queues[ticket.priority].get(ticket.tenant)
+        if queue is not None:
+            queue.remove(ticket)
+            if not queue:
+                del self._queues[ticket.priority][ticket.tenant]
+
+    def _position(self, ticket: _Ticket) -> dict:
+        """估算排在该任务之前的任务数：更高优先级的全部任务 + 同优先级各租户轮转到本任务之前的部分"""
+        ahead = 0
+        for priority in PRIORITIES:
+            queues = self._queues[priority]
+            if priority != ticket.priority:
+                ahead += sum(len(q) for q in queues.values())
+                continue
+            tenants = list(queues)
+            own_index = queues[ticket.tenant].index(ticket)
+            own_order = tenants.index(ticket.tenant)
+            for order, tenant in enumerate(tenants):
+                if tenant == ticket.tenant:
+                    ahead += own_index
+                else:
+                    # 轮转顺序在本租户之前的租户，本轮也会先被服务一次
+                    rounds = own_index + (1 if order < own_order else 0)
+                    ahead += min(len(queues[tenant]), rounds)
+            break
+        estimated = (ahead // self.max_concurrent + 1) * self._avg_seconds
+        return {
+            "position": ahead + 1,
+            "estimated_wait_seconds": round(estimated),
+            "priority": ticket.priority
+        }
+
+    def _update_gauges(self):
+        for priority in PRIORITIES:
+            metrics.SCHEDULER_QUEUED.set(sum(len(q) for q in self._queues[priority].values()), priority=priority)
+        metrics.SCHEDULER_RUNNING.set(self._running)
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            return {
+                "running": self._running,
+                "max_concurrent": self.max_concurrent,
+                "per_key_max_in_flight": self.per_key_max_in_flight,
+                "queued": {p: sum(len(q) for q in self._queues[p].values()) for p in PRIORITIES},
+                "avg_seconds": round(self._avg_seconds, 1)
+            }
+
+
+GENERATION_SCHEDULER = FairScheduler.from_config()
@@ -0,0 +1,101 @@
+"""
+请求合并（single-flight）- 相同提示词的生成请求正在进行时，后来的请求等待并共享其结果
+
+双击、前端超时后重试，都会产生提示词完全相同的并发请求；
+合并后只调用一次大模型，每个调用方拿到结果的独立副本，各自渲染自己的文档。
+
+    - 只合并同一API Key的请求（合并键包含 scheduler.tenant_key）：无效或其他老师的Key不会搭上别人的调用，
+      不会跳过Key校验，也不会用别人的配额
+    - 只共享成功的结果：首个请求失败、被取消或API Key无效时，等待的请求各自重新发起
+    - 等待期间仍响应各自的取消令牌
+
+合并在进程内生效：多worker部署时不同worker上的相同请求不会合并
+"""
+import copy
+import hashlib
+import re
+import threading
+
+from cancellation import GenerationCancelled
+
+# 等待期间检查取消的间隔（秒）
+POLL_INTERVAL = 0.5
+
+
+def prompt_key(prompt: str, *parts) -> str:
+    """合并键：空白规范化后的提示词 + 其他区分请求的参数（如租户、输出上限）"""
+    normalized = re.sub(r"\s+", " ", prompt or "").strip()
+    digest = hashlib.sha256()
+    for part in (*parts, normalized):
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class _Call:
+    __slots__ = ("done", "waiters", "value", "ok")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.waiters = 0
+        self.value = None
+        self.ok = False
+
+
+class SingleFlight:
+    """按键合并并发调用"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key: str, fn, shareable=None, cancelled=None):
+        """
+        执行 fn()，同一键已有调用进行中时等待其结果
+
+        shareable: 判断结果能否共享的函数，默认除None外都可共享
+        cancelled: 返回True表示当前调用方已取消，等待期间抛出 GenerationCancelled
+        返回 (result, shared)，shared 为True表示结果来自其他调用（已深拷贝）
+        """
+        if shareable is None:
+            shareable = lambda result: result is not None  # noqa: E731
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+                else:
+                    call.waiters += 1
+
+            if leader:
+                return self._run(key, call, fn, shareable), False
+
+            while not call.done.wait(POLL_INTERVAL):
+                if cancelled is not None and cancelled():
+                    raise GenerationCancelled()
+            if call.ok:
+                return copy.deepcopy(call.value), True
+            # 首个请求没有可共享的结果：重新竞争，由其中一个等待者发起新的调用
+
+    def _run(self, key: str, call: _Call, fn, shareable):
+        result = None
+        try:
+            result = fn()
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+                waiters = call.waiters
+            if waiters and shareable(result):
+                # 调用方可能在返回后修改结果，先为等待者保存一份快照
+                call.value = copy.deepcopy(result)
+                call.ok = True
+            call.done.set()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+LLM_SINGLE_FLIGHT = SingleFlight()
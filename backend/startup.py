@@ -0,0 +1,211 @@
+"""
+启动耗时 - 重型依赖延迟导入、端口监听后后台预热，并记录各阶段与各模块的导入耗时
+
+    docx = startup.lazy_module("docx")     # 首次访问属性时才真正导入
+    ...
+    doc = docx.Document(path)
+
+    - LAZY_IMPORTS=0 时 lazy_module 立即导入（与原来的模块级导入相同），便于对比
+    - start_prewarm() 在端口开始监听后调用（gunicorn 的 post_worker_init / 直接运行时的 serve 前），
+      后台线程依次导入 PREWARM_MODULES（默认为生成必需的 requests、python-docx），首个生成请求不再承担导入耗时；
+      文档解析库仍在首次解析时才导入
+    - 阶段耗时从进程启动算起：interpreter（解释器启动到本模块导入）、app_import、port_bound、
+      prewarm、first_request；通过 /api/startup、/metrics 查看
+
+命令行：python startup.py [--runs 5] [--eager]，在全新进程中导入应用并输出各阶段与各模块的耗时，
+用于跟踪不同版本的冷启动时间
+"""
+import argparse
+import importlib
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from config import STARTUP_CONFIG
+import metrics
+
+logger = logging.getLogger('jiaoan')
+
+# 预热顺序：先导入被依赖的第三方库，docx_utils 的耗时才只包含它自身（见 config.STARTUP_CONFIG）
+PREWARM_MODULES = STARTUP_CONFIG["prewarm_modules"]
+
+
+def _process_started_at() -> float:
+    """进程启动时刻（time.time()），无法从 /proc 读取时退化为本模块的导入时刻"""
+    try:
+        with open('/proc/self/stat', 'r') as f:
+            # 进程名可能含空格，从最后一个 ')' 之后开始按空格切分，starttime（开机后的时钟滴答数）为第22个字段
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        age = time.clock_gettime(time.CLOCK_BOOTTIME) - start_ticks / os.sysconf('SC_CLK_TCK')
+        return time.time() - max(0.0, age)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return time.time()
+
+
+PROCESS_STARTED_AT = _process_started_at()
+
+_lock = threading.Lock()
+_phases = {}
+_imports = {}
+_prewarm = {"state": "idle", "pid": None, "failed": {}}
+
+
+def mark(phase: str):
+    """记录某个启动阶段完成的时刻（每个阶段只记录第一次）"""
+    if phase in _phases:
+        return
+    seconds = round(max(0.0, time.time() - PROCESS_STARTED_AT), 3)
+    with _lock:
+        if phase in _phases:
+            return
+        _phases[phase] = seconds
+    metrics.STARTUP_SECONDS.set(seconds, phase=phase)
+
+
+mark("interpreter")
+
+
+def import_module(name: str):
+    """导入模块，首次导入时记录耗时（包含其尚未导入的依赖）"""
+    if name in sys.modules:
+        # 不能直接返回 sys.modules 中的模块：预热线程可能正在导入它（尚未初始化完），
+        # importlib 会等待导入完成
+        return importlib.import_module(name)
+    started = time.perf_counter()
+    module = importlib.import_module(name)
+    seconds = round(time.perf_counter() - started, 4)
+    with _lock:
+        _imports.setdefault(name, seconds)
+    metrics.STARTUP_IMPORT_SECONDS.set(seconds, module=name)
+    return module
+
+
+class LazyModule:
+    """模块代理：首次访问属性时导入真正的模块，之后直接转发"""
+
+    def __init__(self, name: str):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+
+    def _load(self):
+        module = self.__dict__['_module']
+        if module is None:
+            module = import_module(self.__dict__['_name'])
+            self.__dict__['_module'] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self.__dict__['_module'] is not None else "not loaded"
+        return f"<lazy module '{self.__dict__['_name']}' ({state})>"
+
+
+def lazy_module(name: str):
+    """延迟导入的模块；LAZY_IMPORTS=0 时立即导入并直接返回模块本身"""
+    if not STARTUP_CONFIG["lazy_imports"]:
+        return import_module(name)
+    return LazyModule(name)
+
+
+def prewarm(modules=PREWARM_MODULES):
+    """依次导入重型依赖；未安装的可选依赖记录后跳过"""
+    started = time.perf_counter()
+    for name in modules:
+        try:
+            import_module(name)
+        except ImportError as e:
+            _prewarm["failed"][name] = str(e)
+    _prewarm["state"] = "done"
+    mark("prewarm")
+    logger.info(f"🔥 依赖预热完成，耗时 {time.perf_counter() - started:.2f}s"
+                + (f"（未安装: {', '.join(_prewarm['failed'])}）" if _prewarm["failed"] else ""))
+
+
+def start_prewarm():
+    """端口开始监听后调用：在后台线程中预热（PREWARM_IMPORTS=0 或未延迟导入时不做任何事）"""
+    if not (STARTUP_CONFIG["lazy_imports"] and STARTUP_CONFIG["prewarm"]):
+        return
+    with _lock:
+        # fork出的worker需要自己预热
+        if _prewarm["pid"] == os.getpid():
+            return
+        _prewarm["pid"] = os.getpid()
+        _prewarm["state"] = "running"
+    threading.Thread(target=prewarm, name="import-prewarm", daemon=True).start()
+
+
+def report() -> dict:
+    """各阶段耗时（从进程启动算起，秒）与各模块导入耗时"""
+    with _lock:
+        phases = dict(_phases)
+        imports = dict(_imports)
+    return {
+        "lazy_imports": STARTUP_CONFIG["lazy_imports"],
+        "prewarm": _prewarm["state"] if STARTUP_CONFIG["prewarm"] else "disabled",
+        "prewarm_failed": dict(_prewarm["failed"]),
+        "phases": phases,
+        "imports": dict(sorted(imports.items(), key=lambda item: item[1], reverse=True))
+    }
+
+
+_MEASURE_SCRIPT = """
+import json, startup
+import api_server
+startup.mark("port_bound")
+startup.prewarm()
+print(json.dumps(startup.report()))
+"""
+
+
+def _measure_once(eager: bool) -> dict:
+    env = dict(os.environ, LAZY_IMPORTS="0" if eager else "1")
+    output = subprocess.run(
+        [sys.executable, "-c", _MEASURE_SCRIPT],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="测量冷启动耗时（每次在全新进程中导入应用）")
+    parser.add_argument("--runs", type=int, default=5, help="测量次数，输出中位数")
+    parser.add_argument("--eager", action="store_true", help="关闭延迟导入（LAZY_IMPORTS=0）作为对比")
+    parser.add_argument("--output", help="将结果写入JSON文件")
+    args = parser.parse_args()
+
+    runs = [_measure_once(args.eager) for _ in range(max(1, args.runs))]
+    result = {
+        "lazy_imports": not args.eager,
+        "runs": len(runs),
+        "phases": {
+            phase: round(statistics.median(run["phases"][phase] for run in runs if phase in run["phases"]), 3)
+            for phase in runs[0]["phases"]
+        },
+        "imports": {
+            name: round(statistics.median(run["imports"].get(name, 0.0) for run in runs), 4)
+            for name in runs[0]["imports"]
+        }
+    }
+
+    print(f"延迟导入: {'开启' if result['lazy_imports'] else '关闭'}（{result['runs']} 次中位数）")
+    print("阶段（从进程启动算起）:")
+    for phase, seconds in result["phases"].items():
+        print(f"  {phase:<16} {seconds:>8.3f}s")
+    print("模块导入:")
+    for name, seconds in result["imports"].items():
+        print(f"  {name:<16} {seconds * 1000:>8.1f}ms")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,590 @@
+"""
+共享状态存储 - 生成会话、上传文档（元数据与提取的文本）、任务队列和互斥锁
+
+多个gunicorn worker（或多台机器）之间必须共享这些状态，否则轮询请求落到另一个worker上时
+看不到任何数据。后端通过 config.STATE_BACKEND 选择：
+    local   进程内存 + 会话JSON文件（原有行为，只能单worker）
+    sqlite  SQLite WAL模式，单机多进程共享
+    redis   Redis，多机共享
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+
+from config import (
+    STATE_BACKEND, STATE_SQLITE_PATH, STATE_REDIS_URL, STATE_KEY_PREFIX,
+    SESSION_CACHE_SIZE, STORAGE_LIFECYCLE_CONFIG
+)
+from concurrency import run_blocking
+
+logger = logging.getLogger('jiaoan')
+
+
+class LockTimeout(TimeoutError):
+    """StateStore.lock 在等待时间内没有拿到锁"""
+
+
+def _new_session(data: dict) -> dict:
+    now = datetime.now().isoformat()
+    session = {'created_at': now, 'status': 'pending', 'progress': 0, 'results': []}
+    session.update(data)
+    session['updated_at'] = now
+    return session
+
+
+def _public_document(doc: dict) -> dict:
+    return {key: value for key, value in doc.items() if key != 'content'}
+
+
+def _upload_time_cutoff(max_age_seconds: float) -> str:
+    """max_age_seconds 之前的时刻，格式与文档记录的 upload_time 相同（可直接按字符串比较）"""
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time() - max_age_seconds))
+
+
+class StateStore(ABC):
+    """
+    状态存储接口，所有方法都必须是跨worker原子的
+
+    会话：     get_session / update_session（合并更新，不存在时创建）/ purge_sessions（清理过期会话）
+    上传文档： add_document / list_documents / remove_document / remove_document_file（按上传文件删除）/
+              purge_documents（清理过期文档记录）
+    任务队列： enqueue / dequeue / queue_length（先进先出，任务为可JSON序列化的字典）
+    互斥锁：   lock（上下文管理器，基于各后端的 _try_lock / _unlock）
+    purge_* 默认不做任何事，供由存储自身按过期时间清理的后端（Redis）沿用
+    """
+
+    name = "base"
+    LOCK_POLL_INTERVAL = 0.05
+
+    @abstractmethod
+    def get_session(self, session_id: str) -> dict:
+        """读取会话，不存在返回None"""
+
+    @abstractmethod
+    def update_session(self, session_id: str, data: dict) -> dict:
+        """合并更新会话（不存在时创建），返回更新后的会话"""
+
+    def purge_sessions(self, max_age_seconds: float) -> int:
+        """删除超过 max_age_seconds 未更新的会话，返回删除数量"""
+        return 0
+
+    @abstractmethod
+    def add_document(self, lesson_id: str, doc: dict):
+        """添加文档记录（含提取的文本 content）"""
+
+    @abstractmethod
+    def list_documents(self, lesson_id: str, include_content: bool = False) -> list:
+        """课时的文档记录，按添加顺序；include_content=False 时不含文本"""
+
+    @abstractmethod
+    def remove_document(self, lesson_id: str, filename: str) -> dict:
+        """删除并返回文档记录（不含文本），不存在返回None"""
+
+    @abstractmethod
+    def remove_document_file(self, lesson_id: str, filepath: str) -> dict:
+        """按上传文件路径删除并返回文档记录（不含文本），不存在返回None；用于上传文件被清理时"""
+
+    def purge_documents(self, max_age_seconds: float) -> int:
+        """删除上传超过 max_age_seconds 的文档记录（连同提取的文本），返回删除数量"""
+        return 0
+
+    @abstractmethod
+    def enqueue(self, queue_name: str, item: dict):
+        """任务加入队尾"""
+
+    @abstractmethod
+    def dequeue(self, queue_name: str, timeout: float = 0) -> dict:
+        """取出队首任务，timeout秒内没有任务返回None"""
+
+    @abstractmethod
+    def queue_length(self, queue_name: str) -> int:
+        """队列中等待的任务数"""
+
+    @contextmanager
+    def lock(self, name: str, timeout: float = 30, ttl: float = 120):
+        """
+        跨worker的互斥锁：timeout秒内拿不到时抛出 LockTimeout
+        锁在ttl秒后自动失效，持有者崩溃时不会永久占用；只释放自己持有的锁
+        """
+        owner = uuid.uuid4().hex
+        deadline = time.monotonic() + timeout
+        while not self._try_lock(name, owner, ttl):
+            if time.monotonic() >= deadline:
+                raise LockTimeout(f"等待锁 {name} 超时（{timeout:g}s）")
+            time.sleep(self.LOCK_POLL_INTERVAL)
+        try:
+            yield
+        finally:
+            self._unlock(name, owner)
+
+    @abstractmethod
+    def _try_lock(self, name: str, owner: str, ttl: float) -> bool:
+        """锁空闲或已过期时由owner持有ttl秒并返回True，否则返回False"""
+
+    @abstractmethod
+    def _unlock(self, name: str, owner: str):
+        """owner仍持有锁时释放"""
+
+
+class LocalStateStore(StateStore):
+    """
+    进程内存存储，会话同时写入JSON文件以便重启后恢复（只能单worker运行）
+    内存中只缓存最近使用的 cache_size 个会话，其余按需从会话文件读取；过期的会话文件由存储清理删除
+    """
+
+    name = "local"
+
+    def __init__(self, session_dir: str, cache_size: int = SESSION_CACHE_SIZE):
+        self.session_dir = session_dir
+        os.makedirs(session_dir, exist_ok=True)
+        self.cache_size = max(1, cache_size)
+        self._sessions = OrderedDict()
+        self._documents = {}
+        self._queues = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._queue_ready = threading.Condition(self._lock)
+
+    def _session_file(self, session_id: str) -> str:
+        return os.path.join(self.session_dir, f'{session_id}.json')
+
+    def _cached_session(self, session_id):
+        """在持有锁时调用：从缓存或会话文件读取会话，并标记为最近使用"""
+        session = self._sessions.get(session_id)
+        if session is not None:
+            self._sessions.move_to_end(session_id)
+            return session
+        session = self._load_session_file(session_id)
+        if session is not None:
+            self._cache(session_id, session)
+        return session
+
+    def _cache(self, session_id, session):
+        self._sessions[session_id] = session
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.cache_size:
+            self._sessions.popitem(last=False)
+
+    def get_session(self, session_id):
+        with self._lock:
+            return self._cached_session(session_id)
+
+    def update_session(self, session_id, data):
+        with self._lock:
+            session = self._cached_session(session_id)
+            if session is None:
+                session = _new_session(data)
+                self._cache(session_id, session)
+            else:
+                session.update(data)
+                session['updated_at'] = datetime.now().isoformat()
+            self._save_session_file(session_id, session)
+            return session
+
+    def purge_sessions(self, max_age_seconds):
+        """只清理缓存；会话文件由存储清理按 sessions 目录策略删除"""
+        cutoff = datetime.fromtimestamp(time.time() - max_age_seconds).isoformat()
+        with self._lock:
+            expired = [sid for sid, session in self._sessions.items() if session.get('updated_at', '') < cutoff]
+            for sid in expired:
+                del self._sessions[sid]
+        return len(expired)
+
+    def _load_session_file(self, session_id):
+        try:
+            session_file = self._session_file(session_id)
+            if os.path.exists(session_file):
+                with open(session_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+        except Exception as e:
+            logger.error(f"加载会话文件失败: {e}")
+        return None
+
+    def _save_session_file(self, session_id, session):
+        try:
+            with open(self._session_file(session_id), 'w', encoding='utf-8') as f:
+                json.dump(session, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            logger.error(f"保存会话文件失败: {e}")
+
+    def add_document(self, lesson_id, doc):
+        with self._lock:
+            self._documents.setdefault(lesson_id, []).append(dict(doc))
+
+    def list_documents(self, lesson_id, include_content=False):
+        with self._lock:
+            docs = list(self._documents.get(lesson_id, []))
+        return [dict(doc) if include_content else _public_document(doc) for doc in docs]
+
+    def remove_document(self, lesson_id, filename):
+        with self._lock:
+            docs = self._documents.get(lesson_id, [])
+            for i, doc in enumerate(docs):
+                if doc['filename'] == filename:
+                    return _public_document(docs.pop(i))
+        return None
+
+    def remove_document_file(self, lesson_id, filepath):
+        with self._lock:
+            docs = self._documents.get(lesson_id, [])
+            for i, doc in enumerate(docs):
+                if doc.get('filepath') == filepath:
+                    return _public_document(docs.pop(i))
+        return None
+
+    def purge_documents(self, max_age_seconds):
+        cutoff = _upload_time_cutoff(max_age_seconds)
+        removed = 0
+        with self._lock:
+            for lesson_id in list(self._documents):
+                docs = self._documents[lesson_id]
+                kept = [doc for doc in docs if doc.get('upload_time', '') >= cutoff]
+                removed += len(docs) - len(kept)
+                if kept:
+                    self._documents[lesson_id] = kept
+                else:
+                    del self._documents[lesson_id]
+        return removed
+
+    def enqueue(self, queue_name, item):
+        with self._queue_ready:
+            self._queues.setdefault(queue_name, []).append(item)
+            self._queue_ready.notify_all()
+
+    def dequeue(self, queue_name, timeout=0):
+        deadline = time.monotonic() + timeout
+        with self._queue_ready:
+            while not self._queues.get(queue_name):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._queue_ready.wait(remaining)
+            return self._queues[queue_name].pop(0)
+
+    def queue_length(self, queue_name):
+        with self._lock:
+            return len(self._queues.get(queue_name, []))
+
+    def _try_lock(self, name, owner, ttl):
+        now = time.monotonic()
+        with self._lock:
+            held = self._locks.get(name)
+            if held is not None and held[1] > now:
+                return False
+            self._locks[name] = (owner, now + ttl)
+            return True
+
+    def _unlock(self, name, owner):
+        with self._lock:
+            if self._locks.get(name, (None,))[0] == owner:
+                del self._locks[name]
+
+
+class SQLiteStateStore(StateStore):
+    """
+    SQLite存储（WAL模式），同一台机器上的多个worker进程共享一个数据库文件
+    每个线程使用独立连接；读写冲突由 busy_timeout 等待，写事务用 BEGIN IMMEDIATE 保证原子性
+    gevent下所有数据库调用都放到原生线程池执行，busy_timeout等待不会卡住事件循环
+    """
+
+    name = "sqlite"
+    POLL_INTERVAL = 0.2
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                id TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                lesson_id TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                meta TEXT NOT NULL,
+                content TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_documents_lesson ON documents (lesson_id);
+            CREATE TABLE IF NOT EXISTS queue (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                item TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_queue_name ON queue (name, id);
+            CREATE TABLE IF NOT EXISTS locks (
+                name TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            );
+        """)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        # gunicorn --preload 时连接可能在master进程中创建，fork后的worker必须重新连接
+        if conn is None or self._local.pid != os.getpid():
+            # isolation_level=None：由我们显式控制事务
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA busy_timeout=30000")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _run(self, fn):
+        """用当前线程的连接执行fn(conn)"""
+        return run_blocking(lambda: fn(self._conn()))
+
+    def _write(self, fn):
+        """在 BEGIN IMMEDIATE 写事务中执行fn(conn)"""
+        def transaction(conn):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(conn)
+                conn.execute("COMMIT")
+                return result
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return self._run(transaction)
+
+    def get_session(self, session_id):
+        row = self._run(lambda conn: conn.execute("SELECT data FROM sessions WHERE id = ?", (session_id,)).fetchone())
+        return json.loads(row[0]) if row else None
+
+    def update_session(self, session_id, data):
+        def merge(conn):
+            row = conn.execute("SELECT data FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            if row:
+                session = json.loads(row[0])
+                session.update(data)
+                session['updated_at'] = datetime.now().isoformat()
+            else:
+                session = _new_session(data)
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (id, data, updated_at) VALUES (?, ?, ?)",
+                (session_id, json.dumps(session, ensure_ascii=False), time.time())
+            )
+            return session
+        return self._write(merge)
+
+    def purge_sessions(self, max_age_seconds):
+        cutoff = time.time() - max_age_seconds
+        return self._write(lambda conn: conn.execute("DELETE FROM sessions WHERE updated_at < ?", (cutoff,)).rowcount)
+
+    def add_document(self, lesson_id, doc):
+        meta = json.dumps(_public_document(doc), ensure_ascii=False)
+        self._write(lambda conn: conn.execute(
+            "INSERT INTO documents (lesson_id, filename, meta, content) VALUES (?, ?, ?, ?)",
+            (lesson_id, doc['filename'], meta, doc.get('content'))
+        ))
+
+    def list_documents(self, lesson_id, include_content=False):
+        rows = self._run(lambda conn: conn.execute(
+            "SELECT meta, content FROM documents WHERE lesson_id = ? ORDER BY id", (lesson_id,)
+        ).fetchall())
+        docs = []
+        for meta, content in rows:
+            doc = json.loads(meta)
+            if include_content:
+                doc['content'] = content
+            docs.append(doc)
+        return docs
+
+    def remove_document(self, lesson_id, filename):
+        def remove(conn):
+            row = conn.execute(
+                "SELECT id, meta FROM documents WHERE lesson_id = ? AND filename = ? ORDER BY id LIMIT 1",
+                (lesson_id, filename)
+            ).fetchone()
+            if not row:
+                return None
+            conn.execute("DELETE FROM documents WHERE id = ?", (row[0],))
+            return json.loads(row[1])
+        return self._write(remove)
+
+    def remove_document_file(self, lesson_id, filepath):
+        def remove(conn):
+            row = conn.execute(
+                "SELECT id, meta FROM documents WHERE lesson_id = ? AND json_extract(meta, '$.filepath') = ? "
+                "ORDER BY id LIMIT 1",
+                (lesson_id, filepath)
+            ).fetchone()
+            if not row:
+                return None
+            conn.execute("DELETE FROM documents WHERE id = ?", (row[0],))
+            return json.loads(row[1])
+        return self._write(remove)
+
+    def purge_documents(self, max_age_seconds):
+        cutoff = _upload_time_cutoff(max_age_seconds)
+        return self._write(lambda conn: conn.execute(
+            "DELETE FROM documents WHERE COALESCE(json_extract(meta, '$.upload_time'), '') < ?", (cutoff,)
+        ).rowcount)
+
+    def enqueue(self, queue_name, item):
+        self._write(lambda conn: conn.execute(
+            "INSERT INTO queue (name, item) VALUES (?, ?)", (queue_name, json.dumps(item, ensure_ascii=False))
+        ))
+
+    def dequeue(self, queue_name, timeout=0):
+        def pop(conn):
+            row = conn.execute(
+                "SELECT id, item FROM queue WHERE name = ? ORDER BY id LIMIT 1", (queue_name,)
+            ).fetchone()
+            if not row:
+                return None
+            conn.execute("DELETE FROM queue WHERE id = ?", (row[0],))
+            return json.loads(row[1])
+
+        # SQLite没有阻塞读取，按 POLL_INTERVAL 轮询直到超时
+        deadline = time.monotonic() + timeout
+        while True:
+            item = self._write(pop)
+            if item is not None or time.monotonic() >= deadline:
+                return item
+            time.sleep(min(self.POLL_INTERVAL, max(0.0, deadline - time.monotonic())))
+
+    def queue_length(self, queue_name):
+        return self._run(
+            lambda conn: conn.execute("SELECT COUNT(*) FROM queue WHERE name = ?", (queue_name,)).fetchone()[0]
+        )
+
+    def _try_lock(self, name, owner, ttl):
+        def acquire(conn):
+            now = time.time()
+            conn.execute("DELETE FROM locks WHERE name = ? AND expires_at <= ?", (name, now))
+            return conn.execute(
+                "INSERT OR IGNORE INTO locks (name, owner, expires_at) VALUES (?, ?, ?)", (name, owner, now + ttl)
+            ).rowcount == 1
+        return self._write(acquire)
+
+    def _unlock(self, name, owner):
+        self._write(lambda conn: conn.execute("DELETE FROM locks WHERE name = ? AND owner = ?", (name, owner)))
+
+
+class RedisStateStore(StateStore):
+    """
+    Redis存储，多台机器共享
+    会话为JSON字符串，用 WATCH/MULTI 做乐观锁合并，每次更新刷新过期时间（session_ttl秒，0表示不过期）；
+    文档为每个课时一个列表，每次添加刷新过期时间（document_ttl秒，0表示不过期），由Redis自动清理；
+    队列为 RPUSH/BLPOP；锁为 SET NX PX，释放时用脚本比对持有者后删除
+    """
+
+    name = "redis"
+    _UNLOCK_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+    def __init__(self, url: str, prefix: str = STATE_KEY_PREFIX, session_ttl: float = 0, document_ttl: float = 0):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("STATE_BACKEND=redis 需要安装redis包：pip install redis")
+        self._redis_module = redis
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        self.session_ttl = int(session_ttl) or None
+        self.document_ttl = int(document_ttl) or None
+
+    def _key(self, *parts) -> str:
+        return ":".join((self.prefix,) + parts)
+
+    def get_session(self, session_id):
+        raw = self.client.get(self._key("session", session_id))
+        return json.loads(raw) if raw else None
+
+    def update_session(self, session_id, data):
+        key = self._key("session", session_id)
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    raw = pipe.get(key)
+                    if raw:
+                        session = json.loads(raw)
+                        session.update(data)
+                        session['updated_at'] = datetime.now().isoformat()
+                    else:
+                        session = _new_session(data)
+                    pipe.multi()
+                    pipe.set(key, json.dumps(session, ensure_ascii=False), ex=self.session_ttl)
+                    pipe.execute()
+                    return session
+                except self._redis_module.WatchError:
+                    continue
+
+    def add_document(self, lesson_id, doc):
+        key = self._key("documents", lesson_id)
+        with self.client.pipeline() as pipe:
+            pipe.rpush(key, json.dumps(doc, ensure_ascii=False))
+            if self.document_ttl:
+                pipe.expire(key, self.document_ttl)
+            pipe.execute()
+
+    def list_documents(self, lesson_id, include_content=False):
+        docs = [json.loads(raw) for raw in self.client.lrange(self._key("documents", lesson_id), 0, -1)]
+        return docs if include_content else [_public_document(doc) for doc in docs]
+
+    def remove_document(self, lesson_id, filename):
+        key = self._key("documents", lesson_id)
+        for raw in self.client.lrange(key, 0, -1):
+            doc = json.loads(raw)
+            if doc['filename'] == filename and self.client.lrem(key, 1, raw):
+                return _public_document(doc)
+        return None
+
+    def remove_document_file(self, lesson_id, filepath):
+        key = self._key("documents", lesson_id)
+        for raw in self.client.lrange(key, 0, -1):
+            doc = json.loads(raw)
+            if doc.get('filepath') == filepath and self.client.lrem(key, 1, raw):
+                return _public_document(doc)
+        return None
+
+    def enqueue(self, queue_name, item):
+        self.client.rpush(self._key("queue", queue_name), json.dumps(item, ensure_ascii=False))
+
+    def dequeue(self, queue_name, timeout=0):
+        key = self._key("queue", queue_name)
+        if timeout > 0:
+            popped = self.client.blpop([key], timeout=max(1, int(round(timeout))))
+            raw = popped[1] if popped else None
+        else:
+            raw = self.client.lpop(key)
+        return json.loads(raw) if raw else None
+
+    def queue_length(self, queue_name):
+        return self.client.llen(self._key("queue", queue_name))
+
+    def _try_lock(self, name, owner, ttl):
+        return bool(self.client.set(self._key("lock", name), owner, nx=True, px=max(1, int(ttl * 1000))))
+
+    def _unlock(self, name, owner):
+        self.client.eval(self._UNLOCK_SCRIPT, 1, self._key("lock", name), owner)
+
+
+def create_state_store(data_dir: str, backend: str = None) -> StateStore:
+    """按配置创建状态存储"""
+    backend = (backend or STATE_BACKEND).lower()
+    if backend == "local":
+        return LocalStateStore(os.path.join(data_dir, 'sessions'))
+    if backend == "sqlite":
+        return SQLiteStateStore(STATE_SQLITE_PATH or os.path.join(data_dir, 'state.db'))
+    if backend == "redis":
+        return RedisStateStore(
+            STATE_REDIS_URL,
+            session_ttl=STORAGE_LIFECYCLE_CONFIG["sessions"]["ttl_hours"] * 3600,
+            document_ttl=STORAGE_LIFECYCLE_CONFIG["uploads"]["ttl_hours"] * 3600
+        )
+    raise ValueError(f"未知的状态后端: {backend}（可选 local / sqlite / redis）")
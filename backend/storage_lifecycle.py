@@ -0,0 +1,283 @@
+"""
+存储生命周期 - 按目录清理过期文件，并把目录总大小控制在上限以内
+
+    - 每个目录一条策略：ttl（最后访问超过该时间即删除）、max_bytes（超过上限时按最近最少使用淘汰）
+    - "最后访问"即文件的mtime：下载、再次使用时调用 touch() 刷新，其他worker和重启后都能看到
+    - 后台线程定期清理，不阻塞请求；多worker时通过文件锁（默认在临时目录中）保证同一时刻只有一个进程在清理
+    - 成组的文件（如教案文件与其教案数据）通过策略的 on_evict 在淘汰主文件时一并删除
+    - 每个目录在内存中维护按访问时间排序的索引，清理时只检查最旧的一端；
+      本进程写入的文件通过 track() 加入索引，其他进程写入的文件由定期的全量扫描补上
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from concurrency import run_blocking
+import metrics
+
+logger = logging.getLogger('jiaoan')
+
+try:
+    import fcntl
+except ImportError:  # Windows：没有flock，单进程运行时无需加锁
+    fcntl = None
+
+
+class DirectoryPolicy:
+    """
+    单个目录的清理策略
+
+    ttl_seconds: 最后访问超过该时间的文件被删除，0表示不限
+    max_bytes: 目录总大小上限，超过时从最久未访问的文件开始删除，0表示不限
+    min_age: 因大小超限而淘汰时，跳过最近该时间内访问过的文件（避免删掉刚生成、尚未下载的文件）
+    on_evict: 文件被淘汰后调用 on_evict(path)，用于删除与之成组的文件
+    """
+
+    def __init__(self, name: str, path: str, ttl_seconds: float = 0, max_bytes: int = 0, min_age: float = 600,
+                 on_evict=None):
+        self.name = name
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.min_age = min_age
+        self.on_evict = on_evict
+
+
+class _DirectoryIndex:
+    """目录内文件的索引：路径 -> (大小, mtime)，按访问时间从旧到新排列"""
+
+    def __init__(self, policy: DirectoryPolicy):
+        self.policy = policy
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self._lock = threading.Lock()
+
+    def rescan(self):
+        entries = []
+        try:
+            with os.scandir(self.policy.path) as it:
+                for entry in it:
+                    # 跳过以点开头的文件（锁文件、临时文件）
+                    if entry.name.startswith('.') or not entry.is_file(follow_symlinks=False):
+                        continue
+                    try:
+                        st = entry.stat(follow_symlinks=False)
+                    except FileNotFoundError:
+                        continue
+                    entries.append((st.st_mtime, entry.path, st.st_size))
+        except FileNotFoundError:
+            pass
+        entries.sort()
+        with self._lock:
+            self.entries = OrderedDict((path, (size, mtime)) for mtime, path, size in entries)
+            self.total_bytes = sum(size for _, _, size in entries)
+
+    def track(self, path: str):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            self.forget(path)
+            return
+        with self._lock:
+            old = self.entries.pop(path, None)
+            if old:
+                self.total_bytes -= old[0]
+            self.entries[path] = (st.st_size, st.st_mtime)
+            self.total_bytes += st.st_size
+
+    def forget(self, path: str):
+        with self._lock:
+            old = self.entries.pop(path, None)
+            if old:
+                self.total_bytes -= old[0]
+
+    def oldest(self):
+        with self._lock:
+            if not self.entries:
+                return None
+            path = next(iter(self.entries))
+            return path, self.entries[path]
+
+
+class StorageSweeper:
+    """
+    后台清理线程
+
+    policies: DirectoryPolicy 列表
+    interval: 两次清理的间隔（秒）
+    rescan_every: 每隔多少次清理做一次全量扫描（补上其他进程写入的文件）
+    on_sweep: 每次清理时额外调用的函数（如清理状态存储中的过期会话和文档记录）
+    lock_path: 多进程互斥的锁文件，默认按各目录路径在系统临时目录中生成（不写入数据目录或源码目录）
+    """
+
+    def __init__(self, policies, interval: float = 300, rescan_every: int = 12, on_sweep=None, lock_path: str = None):
+        self.interval = interval
+        self.rescan_every = max(1, rescan_every)
+        self.on_sweep = on_sweep
+        self._indexes = {policy.name: _DirectoryIndex(policy) for policy in policies}
+        if lock_path is None:
+            digest = hashlib.sha1(
+                "\0".join(sorted(os.path.abspath(policy.path) for policy in policies)).encode("utf-8")
+            ).hexdigest()[:12]
+            lock_path = os.path.join(tempfile.gettempdir(), f"jiaoan-storage-sweeper-{digest}.lock")
+        self.lock_path = lock_path
+        self._sweeps = 0
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+        self._start_lock = threading.Lock()
+
+    def _index_for(self, path: str):
+        directory = os.path.dirname(os.path.abspath(path))
+        for index in self._indexes.values():
+            if os.path.abspath(index.policy.path) == directory:
+                return index
+        return None
+
+    def track(self, path: str):
+        """登记新写入的文件"""
+        index = self._index_for(path)
+        if index is not None:
+            index.track(path)
+
+    def touch(self, path: str):
+        """文件被再次使用：刷新mtime，使其在淘汰顺序中排到最后"""
+        try:
+            os.utime(path)
+        except OSError:
+            return
+        self.track(path)
+
+    def remove(self, path: str):
+        """删除文件并移出索引（用于删除与被淘汰文件成组的文件）"""
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        index = self._index_for(path)
+        if index is not None:
+            index.forget(path)
+
+    def start(self):
+        """启动后台线程（幂等；fork出的worker中会重新启动）"""
+        if self.interval <= 0:
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="storage-sweeper", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                run_blocking(self.sweep_once)
+            except Exception as e:
+                logger.error(f"❌ 存储清理失败: {e}")
+
+    def sweep_once(self) -> dict:
+        """执行一次清理，返回每个目录删除的文件数与字节数；其他进程正在清理时返回None"""
+        lock = self._acquire_lock()
+        if lock is False:
+            return None
+        try:
+            rescan = self._sweeps % self.rescan_every == 0
+            self._sweeps += 1
+            report = {}
+            for name, index in self._indexes.items():
+                if rescan:
+                    index.rescan()
+                report[name] = self._sweep_directory(index)
+            if self.on_sweep is not None:
+                self.on_sweep()
+            removed = sum(item["files"] for item in report.values())
+            if removed:
+                freed = sum(item["bytes"] for item in report.values())
+                logger.info(f"🧹 存储清理：删除 {removed} 个文件，释放 {freed / 1024 / 1024:.1f} MB")
+            return report
+        finally:
+            self._release_lock(lock)
+
+    def _sweep_directory(self, index: _DirectoryIndex) -> dict:
+        policy = index.policy
+        now = time.time()
+        removed = {"files": 0, "bytes": 0}
+        while True:
+            oldest = index.oldest()
+            if oldest is None:
+                break
+            path, (size, mtime) = oldest
+            age = now - mtime
+            if policy.ttl_seconds and age > policy.ttl_seconds:
+                reason = "ttl"
+            elif policy.max_bytes and index.total_bytes > policy.max_bytes and age > policy.min_age:
+                reason = "size"
+            else:
+                break
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                index.forget(path)
+                continue
+            if st.st_mtime != mtime:
+                # 其他进程在此期间使用过该文件：按新的访问时间重新排队
+                index.track(path)
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"⚠️ 无法删除 {path}: {e}")
+                index.forget(path)
+                continue
+            index.forget(path)
+            removed["files"] += 1
+            removed["bytes"] += st.st_size
+            metrics.STORAGE_EVICTED_FILES.inc(directory=policy.name, reason=reason)
+            metrics.STORAGE_EVICTED_BYTES.inc(st.st_size, directory=policy.name)
+            if policy.on_evict is not None:
+                try:
+                    policy.on_evict(path)
+                except OSError as e:
+                    logger.warning(f"⚠️ 删除 {path} 的关联文件失败: {e}")
+        metrics.STORAGE_BYTES.set(index.total_bytes, directory=policy.name)
+        metrics.STORAGE_FILES.set(len(index.entries), directory=policy.name)
+        return removed
+
+    def _acquire_lock(self):
+        """多进程互斥：返回锁文件句柄，无需加锁时返回None，其他进程持有锁时返回False"""
+        if fcntl is None or not self._indexes:
+            return None
+        handle = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        return handle
+
+    def _release_lock(self, handle):
+        if handle:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+            handle.close()
+
+    def snapshot(self) -> dict:
+        return {
+            name: {
+                "files": len(index.entries),
+                "bytes": index.total_bytes,
+                "ttl_seconds": index.policy.ttl_seconds,
+                "max_bytes": index.policy.max_bytes
+            }
+            for name, index in self._indexes.items()
+        }
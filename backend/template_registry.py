@@ -0,0 +1,186 @@
+"""
+教案模板注册表 - 各学校上传自己的教案模板，生成时按模板ID选择
+
+    registry = TemplateRegistry(directory, builtin_path)
+    template = registry.register("xx学院教案.docx", data)     # 上传时分析一次槽位
+    doc = registry.get(template.id).open()                      # 按槽位表填写的 LessonPlanDoc
+
+    - 模板ID为内容SHA-256的前16位，同一模板重复上传得到同一个ID
+    - 槽位表（见 docx_utils.discover_slots）按「课题名称」「教学重点」「课外作业」等标签文字定位各内容的
+      填写位置，与模板一起保存为 <ID>.json，各worker直接读取，不再分析；槽位规则版本变化时重新分析
+    - 最近使用的模板内容与槽位表缓存在内存中，生成时不读磁盘、不分析表格，每份教案只需解析一次模板
+    - 内置模板 moban.docx 的ID为 default，请求未指定模板时使用
+"""
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from config import TEMPLATE_CONFIG
+import startup
+
+logger = logging.getLogger('jiaoan')
+
+docx = startup.lazy_module("docx")
+docx_utils = startup.lazy_module("docx_utils")
+
+DEFAULT_TEMPLATE_ID = "default"
+
+
+def analyze_template(data: bytes) -> dict:
+    """分析模板内容，返回槽位表；不是有效的Word文档或缺少教学实施过程表格时抛出 ValueError"""
+    try:
+        document = docx.Document(io.BytesIO(data))
+    except Exception as e:
+        raise ValueError(f"无法打开模板，请上传 .docx 格式的Word文档（{e}）")
+    return docx_utils.discover_slots(document)
+
+
+class LessonTemplate:
+    """已分析的模板：原始内容与槽位表"""
+
+    def __init__(self, template_id: str, name: str, data: bytes, slots: dict, created_at: float = None):
+        self.id = template_id
+        self.name = name
+        self.data = data
+        self.slots = slots
+        self.created_at = created_at
+
+    def open(self):
+        """按槽位表打开一份新的教案文档（每次调用得到独立的文档）"""
+        return docx_utils.LessonPlanDoc(io.BytesIO(self.data), self.slots)
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'name': self.name,
+            'size': len(self.data),
+            'created_at': self.created_at,
+            'missing': list(self.slots.get('missing', []))
+        }
+
+
+class TemplateRegistry:
+    """
+    模板注册表：上传的模板保存在 directory（<ID>.docx + <ID>.json），内置模板为 builtin_path
+    内存中只缓存最近使用的 cache_size 个模板，其余按需从磁盘读取
+    """
+
+    def __init__(self, directory: str, builtin_path: str, cache_size: int = TEMPLATE_CONFIG["cache_size"]):
+        self.directory = directory
+        self.builtin_path = builtin_path
+        self.cache_size = max(1, cache_size)
+        self._templates = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _template_file(self, template_id: str, ext: str) -> str:
+        return os.path.join(self.directory, f'{template_id}{ext}')
+
+    def _cache(self, template: LessonTemplate):
+        with self._lock:
+            self._templates[template.id] = template
+            self._templates.move_to_end(template.id)
+            while len(self._templates) > self.cache_size:
+                self._templates.popitem(last=False)
+
+    def _write_file(self, path: str, content: bytes):
+        """先写入临时文件再替换，其他worker不会读到写了一半的模板"""
+        temp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(content)
+        os.replace(temp_path, path)
+
+    def _save_meta(self, template: LessonTemplate):
+        meta = {
+            'id': template.id,
+            'name': template.name,
+            'created_at': template.created_at,
+            'slots': template.slots
+        }
+        self._write_file(self._template_file(template.id, '.json'),
+                         json.dumps(meta, ensure_ascii=False, indent=2).encode('utf-8'))
+
+    def register(self, filename: str, data: bytes, name: str = None) -> LessonTemplate:
+        """分析并保存上传的模板，返回模板；模板无法使用时抛出 ValueError"""
+        slots = analyze_template(data)
+        template_id = hashlib.sha256(data).hexdigest()[:16]
+        name = (name or '').strip() or os.path.splitext(os.path.basename(filename))[0]
+        template = LessonTemplate(template_id, name, data, slots, time.time())
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._write_file(self._template_file(template_id, '.docx'), data)
+        self._save_meta(template)
+        self._cache(template)
+        logger.info(f"📑 已注册模板 {name}（{template_id}）"
+                    + (f"，未找到: {'、'.join(slots['missing'])}" if slots['missing'] else ""))
+        return template
+
+    def get(self, template_id: str = None):
+        """按ID获取模板，未指定时为内置模板；模板不存在时返回None"""
+        template_id = template_id or DEFAULT_TEMPLATE_ID
+        with self._lock:
+            template = self._templates.get(template_id)
+            if template is not None:
+                self._templates.move_to_end(template_id)
+                return template
+        template = self._load(template_id)
+        if template is not None:
+            self._cache(template)
+        return template
+
+    def _load(self, template_id: str):
+        if template_id == DEFAULT_TEMPLATE_ID:
+            with open(self.builtin_path, 'rb') as f:
+                data = f.read()
+            return LessonTemplate(DEFAULT_TEMPLATE_ID, '默认模板', data, analyze_template(data))
+
+        if not template_id.isalnum():
+            return None
+        path = self._template_file(template_id, '.docx')
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            data = f.read()
+        meta = {}
+        try:
+            with open(self._template_file(template_id, '.json'), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ 模板 {template_id} 的槽位表无法读取，重新分析: {e}")
+
+        template = LessonTemplate(template_id, meta.get('name', template_id), data,
+                                  meta.get('slots'), meta.get('created_at', os.path.getmtime(path)))
+        if not template.slots or template.slots.get('version') != docx_utils.SLOT_MAP_VERSION:
+            template.slots = analyze_template(data)
+            self._save_meta(template)
+        return template
+
+    def list(self) -> list:
+        """所有可用的模板（内置模板在前，上传的模板按上传时间倒序），只读取槽位表文件"""
+        templates = []
+        if os.path.isdir(self.directory):
+            for file_name in os.listdir(self.directory):
+                template_id = file_name[:-len('.docx')]
+                if not file_name.endswith('.docx') or not template_id.isalnum():
+                    continue
+                path = os.path.join(self.directory, file_name)
+                meta = {}
+                try:
+                    with open(self._template_file(template_id, '.json'), 'r', encoding='utf-8') as f:
+                        meta = json.load(f)
+                except (OSError, ValueError):
+                    pass
+                templates.append({
+                    'id': template_id,
+                    'name': meta.get('name', template_id),
+                    'size': os.path.getsize(path),
+                    'created_at': meta.get('created_at', os.path.getmtime(path)),
+                    'missing': (meta.get('slots') or {}).get('missing', [])
+                })
+        templates.sort(key=lambda item: item['created_at'], reverse=True)
+        return [self.get(DEFAULT_TEMPLATE_ID).to_dict(), *templates]
@@ -0,0 +1,85 @@
+"""
+文档解析进程池（concurrency）的测试：gevent monkey patch 下 spawn 进程池可用、解析超时时结束卡住的子进程
+
+gevent 的 monkey patch 不能撤销，相关用例在独立的子进程中运行
+运行：python -m pytest tests（或 python -m unittest discover tests）
+"""
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import textwrap
+import unittest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+GEVENT_SMOKE = textwrap.dedent("""
+    from gevent import monkey
+    monkey.patch_all()
+
+    import json, os, sys, tempfile, time
+    import gevent
+    sys.path.insert(0, os.getcwd())
+    import concurrency
+
+    report = {"gevent_active": concurrency.gevent_active()}
+    path = os.path.join(tempfile.mkdtemp(), "doc.txt")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("进程池解析测试")
+
+    ticks = []
+    ticker = gevent.spawn(lambda: [ticks.append(gevent.sleep(0.05)) for _ in range(1000)])
+    report["content"] = concurrency.extract_document_content_offloaded(path)
+
+    pool = concurrency.get_extraction_pool()
+    stuck = pool.submit(os.getpid).result(timeout=60)
+    started = time.monotonic()
+    try:
+        concurrency.run_in_pool(pool, time.sleep, 60, timeout=0.5)
+        report["timeout"] = None
+    except concurrency.ExtractionTimeout as e:
+        report["timeout"] = str(e)
+    report["timeout_seconds"] = time.monotonic() - started
+    time.sleep(0.5)
+    try:
+        os.kill(stuck, 0)
+        report["stuck_alive"] = True
+    except OSError:
+        report["stuck_alive"] = False
+    report["ticks"] = len(ticks)
+    ticker.kill()
+
+    report["new_pool"] = concurrency.get_extraction_pool() is not pool
+    report["content_after"] = concurrency.extract_document_content_offloaded(path)
+    concurrency.shutdown_extraction_pool()
+    print(json.dumps(report, ensure_ascii=False))
+""")
+
+
+@unittest.skipUnless(importlib.util.find_spec("gevent"), "需要安装gevent")
+class GeventExtractionPoolTest(unittest.TestCase):
+
+    def test_spawn_pool_under_monkey_patch(self):
+        env = {**os.environ, "EXTRACTION_WORKERS": "1"}
+        completed = subprocess.run(
+            [sys.executable, "-c", GEVENT_SMOKE], cwd=BACKEND_DIR, env=env,
+            capture_output=True, text=True, timeout=120
+        )
+        self.assertEqual(completed.returncode, 0, completed.stderr[-2000:])
+        report = json.loads(completed.stdout.strip().splitlines()[-1])
+
+        self.assertTrue(report["gevent_active"])
+        self.assertEqual(report["content"], "进程池解析测试")
+        # 等待解析结果时事件循环没有被阻塞
+        self.assertGreater(report["ticks"], 0)
+
+        self.assertIn("超时", report["timeout"])
+        self.assertLess(report["timeout_seconds"], 10)
+        self.assertFalse(report["stuck_alive"])
+        self.assertTrue(report["new_pool"])
+        self.assertEqual(report["content_after"], "进程池解析测试")
+
+
+if __name__ == "__main__":
+    unittest.main()
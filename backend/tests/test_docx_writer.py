@@ -0,0 +1,124 @@
+"""
+DOCX快速保存（docx_writer.save_docx）的测试：保存结果能被 python-docx 重新打开，未修改的部件按原压缩字节复制
+
+运行：python -m pytest tests（或 python -m unittest discover tests）
+"""
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import zipfile
+
+from docx import Document
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from ai_generator import get_mock_lesson_data
+from docx_utils import LessonPlanDoc
+from docx_writer import CONTENT_TYPES_NAME, loaded_part_names, save_docx
+from utils import format_homework_text
+
+TEMPLATE = os.path.join(BACKEND_DIR, 'moban.docx')
+
+
+def _infos(path_or_file):
+    with zipfile.ZipFile(path_or_file) as z:
+        return {info.filename: (info.CRC, info.compress_size, info.file_size) for info in z.infolist()}
+
+
+class SaveDocxTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        self.output = os.path.join(self.tmp, '教案.docx')
+        self.doc = Document(TEMPLATE)
+        self.loaded = loaded_part_names(self.doc)
+
+    def _assert_valid(self, path_or_file):
+        with zipfile.ZipFile(path_or_file) as z:
+            self.assertIsNone(z.testzip())
+        if hasattr(path_or_file, 'seek'):
+            path_or_file.seek(0)
+        return Document(path_or_file)
+
+    def test_output_reopens_with_changes(self):
+        self.doc.add_paragraph('快速保存测试段落')
+        self.doc.tables[0].cell(0, 0).text = '已修改的单元格'
+        save_docx(self.doc, TEMPLATE, self.output, self.loaded)
+
+        reopened = self._assert_valid(self.output)
+        self.assertEqual(reopened.paragraphs[-1].text, '快速保存测试段落')
+        self.assertEqual(reopened.tables[0].cell(0, 0).text, '已修改的单元格')
+        self.assertEqual(len(reopened.tables), len(Document(TEMPLATE).tables))
+        self.assertEqual(os.listdir(self.tmp), ['教案.docx'])
+
+    def test_unchanged_parts_are_copied(self):
+        self.doc.add_paragraph('x')
+        save_docx(self.doc, TEMPLATE, self.output, self.loaded)
+
+        template, output = _infos(TEMPLATE), _infos(self.output)
+        for name in ('word/styles.xml', 'word/theme/theme1.xml', 'word/fontTable.xml', CONTENT_TYPES_NAME):
+            self.assertEqual(output[name], template[name], name)
+        self.assertNotEqual(output['word/document.xml'][0], template['word/document.xml'][0])
+
+    def test_touched_part_is_reserialized(self):
+        styles = self.doc.styles
+        styles['Normal'].font.name = 'SimSun-Test'
+        save_docx(self.doc, TEMPLATE, self.output, self.loaded, touched=(self.doc.part._styles_part,))
+
+        self.assertNotEqual(_infos(self.output)['word/styles.xml'], _infos(TEMPLATE)['word/styles.xml'])
+        self.assertEqual(self._assert_valid(self.output).styles['Normal'].font.name, 'SimSun-Test')
+
+    def test_new_part_is_written(self):
+        header = self.doc.sections[0].header
+        header.is_linked_to_previous = False
+        header.paragraphs[0].text = '页眉测试'
+        save_docx(self.doc, TEMPLATE, self.output, self.loaded)
+
+        names = set(_infos(self.output))
+        self.assertTrue(names - set(_infos(TEMPLATE)))
+        reopened = self._assert_valid(self.output)
+        self.assertEqual(reopened.sections[0].header.paragraphs[0].text, '页眉测试')
+
+    def test_file_objects(self):
+        with open(TEMPLATE, 'rb') as f:
+            template = io.BytesIO(f.read())
+        doc = Document(template)
+        loaded = loaded_part_names(doc)
+        doc.add_paragraph('内存中保存')
+        output = io.BytesIO()
+        save_docx(doc, template, output, loaded)
+        output.seek(0)
+        self.assertEqual(self._assert_valid(output).paragraphs[-1].text, '内存中保存')
+
+    def test_overwrite_template_in_place(self):
+        template = os.path.join(self.tmp, 'template.docx')
+        shutil.copy(TEMPLATE, template)
+        doc = Document(template)
+        loaded = loaded_part_names(doc)
+        doc.add_paragraph('覆盖保存')
+        save_docx(doc, template, template, loaded)
+        self.assertEqual(self._assert_valid(template).paragraphs[-1].text, '覆盖保存')
+
+    def test_lesson_plan_doc_round_trip(self):
+        data = get_mock_lesson_data({'课题名称': '焊接5步法'})
+        lesson = LessonPlanDoc(TEMPLATE)
+        self.assertTrue(lesson.fill_module('教学重点', '\n'.join(data['教学重点'])))
+        homework = format_homework_text(data['课外作业'])
+        lesson.fill_process_table(data['教学实施过程'], homework)
+        lesson.save(self.output)
+
+        reopened = self._assert_valid(self.output)
+        text = '\n'.join(cell.text for table in reopened.tables for row in table.rows for cell in row.cells)
+        self.assertIn(data['教学重点'][0], text)
+        self.assertIn(data['教学实施过程'][0]['环节'], text)
+        self.assertIn(homework.splitlines()[0], text)
+
+
+if __name__ == "__main__":
+    unittest.main()
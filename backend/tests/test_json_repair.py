@@ -0,0 +1,111 @@
+"""
+JSON本地修复（json_repair.repair_json）的测试：截断、缺少引号、多余逗号等大模型常见输出缺陷
+
+运行：python -m pytest tests（或 python -m unittest discover tests）
+"""
+import json
+import os
+import sys
+import unittest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from json_repair import REPAIR_KINDS, repair_json
+
+
+def _repair(text: str):
+    repaired, counts = repair_json(text)
+    return json.loads(repaired), counts
+
+
+class TruncatedOutputTest(unittest.TestCase):
+
+    def test_unclosed_brackets(self):
+        data, counts = _repair('{"教学重点": ["焊接姿势", "送丝速度"')
+        self.assertEqual(data, {"教学重点": ["焊接姿势", "送丝速度"]})
+        self.assertEqual(counts, {"unclosed_brackets": 2})
+
+    def test_truncated_inside_string(self):
+        data, counts = _repair('{"a": {"b": "被截断的文')
+        self.assertEqual(data, {"a": {"b": "被截断的文"}})
+        self.assertEqual(counts, {"unclosed_strings": 1, "unclosed_brackets": 2})
+
+    def test_truncated_after_key_or_colon(self):
+        self.assertEqual(_repair('{"a": 1, "b"')[0], {"a": 1, "b": None})
+        self.assertEqual(_repair('{"a": 1, "b":')[0], {"a": 1, "b": None})
+
+    def test_truncated_after_comma(self):
+        self.assertEqual(_repair('{"a": [1, 2,')[0], {"a": [1, 2]})
+
+
+class UnquotedTest(unittest.TestCase):
+
+    def test_unquoted_keys(self):
+        data, counts = _repair('{教学重点: ["a"], count: 2}')
+        self.assertEqual(data, {"教学重点": ["a"], "count": 2})
+        self.assertEqual(counts, {"unquoted_keys": 2})
+
+    def test_unquoted_text_values_keep_spaces(self):
+        data, counts = _repair('{"a": hello world, "b": [x, y]}')
+        self.assertEqual(data, {"a": "hello world", "b": ["x", "y"]})
+        self.assertEqual(counts, {"unquoted_values": 3})
+
+    def test_literals_are_not_quoted(self):
+        data, counts = _repair('{"a": true, "b": null, "c": -1.5e3, "d": false}')
+        self.assertEqual(data, {"a": True, "b": None, "c": -1500.0, "d": False})
+        self.assertEqual(counts, {})
+
+    def test_unescaped_quotes_inside_string(self):
+        data, counts = _repair('{"a": "他说"你好"然后离开"}')
+        self.assertEqual(data, {"a": '他说"你好"然后离开'})
+        self.assertEqual(counts, {"unescaped_quotes": 2})
+
+
+class CommaTest(unittest.TestCase):
+
+    def test_trailing_commas(self):
+        data, counts = _repair('{"a": [1, 2,], "b": {"c": 1,},}')
+        self.assertEqual(data, {"a": [1, 2], "b": {"c": 1}})
+        self.assertEqual(counts, {"trailing_commas": 3})
+
+    def test_missing_commas_between_lines(self):
+        data, counts = _repair('{"a": "x"\n"b": "y"\n"c": [1 2]}')
+        self.assertEqual(data, {"a": "x", "b": "y", "c": [1, 2]})
+        self.assertEqual(counts, {"missing_commas": 3})
+
+    def test_fullwidth_punctuation(self):
+        data, counts = _repair('{"a"：1，"b"：2}')
+        self.assertEqual(data, {"a": 1, "b": 2})
+        self.assertEqual(counts, {"fullwidth_punctuation": 3})
+
+
+class OtherRepairsTest(unittest.TestCase):
+
+    def test_smart_quotes(self):
+        self.assertEqual(_repair('{“a”: “b”}'), ({"a": "b"}, {"smart_quotes": 4}))
+
+    def test_control_chars_in_string(self):
+        self.assertEqual(_repair('{"a": "第一行\n第二行\t"}')[0], {"a": "第一行\n第二行\t"})
+
+    def test_prose_around_object(self):
+        data, counts = _repair('以下是教案：{"a": 1} 希望对您有帮助')
+        self.assertEqual(data, {"a": 1})
+        self.assertEqual(counts, {"stripped_prose": 2})
+
+    def test_mismatched_brackets(self):
+        self.assertEqual(_repair('{"a": [1, 2}')[0], {"a": [1, 2]})
+
+    def test_valid_json_is_unchanged(self):
+        text = '{"a": [1, {"b": "c"}], "d": null}'
+        self.assertEqual(repair_json(text), (text, {}))
+
+    def test_counts_use_known_kinds(self):
+        _, counts = repair_json('前言 {a: “x” "b": [1, 2,], c: hello')
+        self.assertTrue(counts)
+        self.assertTrue(set(counts) <= set(REPAIR_KINDS))
+
+
+if __name__ == "__main__":
+    unittest.main()
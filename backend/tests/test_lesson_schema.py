@@ -0,0 +1,88 @@
+"""
+教案数据校验（lesson_schema）的测试：各类错误的路径与提示
+
+运行：python -m pytest tests（或 python -m unittest discover tests）
+"""
+import copy
+import os
+import sys
+import unittest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from ai_generator import get_mock_lesson_data
+from lesson_schema import LESSON_PLAN_SCHEMA, LessonPlanValidationError, ensure_valid_lesson_plan, validate_lesson_plan
+
+VALID = get_mock_lesson_data({"课题名称": "焊接5步法"})
+
+
+def _broken(**changes):
+    data = copy.deepcopy(VALID)
+    for key, value in changes.items():
+        if value is None:
+            del data[key]
+        else:
+            data[key] = value
+    return data
+
+
+class ValidateLessonPlanTest(unittest.TestCase):
+
+    def test_mock_data_is_valid(self):
+        self.assertEqual(validate_lesson_plan(VALID), [])
+        ensure_valid_lesson_plan(VALID)
+
+    def test_root_must_be_object(self):
+        self.assertEqual(validate_lesson_plan([]), ["根节点: 应为对象，实际为list"])
+
+    def test_missing_required_field(self):
+        self.assertEqual(validate_lesson_plan(_broken(课外作业=None)), ["课外作业: 缺少必填字段"])
+
+    def test_wrong_type(self):
+        self.assertEqual(validate_lesson_plan(_broken(教学重点="焊接姿势")), ["教学重点: 应为数组，实际为str"])
+
+    def test_empty_list_and_blank_string(self):
+        errors = validate_lesson_plan(_broken(思政元素=[], 教学难点=["  "]))
+        self.assertEqual(errors, ["教学难点[0]: 内容为空", "思政元素: 至少需要1项，实际0项"])
+
+    def test_nested_path_in_process_steps(self):
+        data = copy.deepcopy(VALID)
+        del data["教学实施过程"][1]["教师活动"]
+        data["教学实施过程"][2]["时间"] = 10
+        self.assertEqual(validate_lesson_plan(data), [
+            "教学实施过程[1].教师活动: 缺少必填字段",
+            "教学实施过程[2].时间: 应为字符串，实际为int",
+        ])
+
+    def test_custom_schema_for_one_section(self):
+        schema = {
+            "type": "object",
+            "required": ["教学目标"],
+            "properties": {"教学目标": LESSON_PLAN_SCHEMA["properties"]["教学目标"]}
+        }
+        self.assertEqual(validate_lesson_plan({"教学目标": VALID["教学目标"]}, schema), [])
+        self.assertEqual(validate_lesson_plan({"教学目标": {"知识目标": "x"}}, schema), [
+            "教学目标.能力目标: 缺少必填字段",
+            "教学目标.素质目标: 缺少必填字段",
+        ])
+
+
+class EnsureValidLessonPlanTest(unittest.TestCase):
+
+    def test_raises_with_errors(self):
+        with self.assertRaises(LessonPlanValidationError) as ctx:
+            ensure_valid_lesson_plan(_broken(教学目标=None, 教学重点=[]))
+        self.assertEqual(ctx.exception.errors, ["教学目标: 缺少必填字段", "教学重点: 至少需要1项，实际0项"])
+        self.assertIsInstance(ctx.exception, ValueError)
+
+    def test_message_truncates_long_error_lists(self):
+        with self.assertRaises(LessonPlanValidationError) as ctx:
+            ensure_valid_lesson_plan({"教学实施过程": [{}] * 3})
+        self.assertGreater(len(ctx.exception.errors), 10)
+        self.assertIn(f"等共{len(ctx.exception.errors)}处错误", str(ctx.exception))
+
+
+if __name__ == "__main__":
+    unittest.main()
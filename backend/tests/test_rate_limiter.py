@@ -0,0 +1,152 @@
+"""
+客户端限流（rate_limiter）的测试：令牌桶补充、429时乘性减速与暂停、成功后加性恢复
+
+运行：python -m pytest tests（或 python -m unittest discover tests）
+"""
+import os
+import sys
+import unittest
+from unittest import mock
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+import rate_limiter
+from rate_limiter import RateLimiter, TokenBucket
+
+
+class TokenBucketTest(unittest.TestCase):
+
+    def setUp(self):
+        self.bucket = TokenBucket(rate=1.0, capacity=2)
+        self.t0 = self.bucket.updated_at
+
+    def test_burst_then_wait(self):
+        self.assertEqual(self.bucket.reserve(1, self.t0), 0.0)
+        self.assertEqual(self.bucket.reserve(1, self.t0), 0.0)
+        self.assertEqual(self.bucket.reserve(1, self.t0), 1.0)
+        # 余额为负时后来者排在后面
+        self.assertEqual(self.bucket.reserve(1, self.t0), 2.0)
+
+    def test_refill_is_capped_at_capacity(self):
+        self.bucket.reserve(2, self.t0)
+        self.assertEqual(self.bucket.reserve(1, self.t0 + 0.5), 0.5)
+        self.bucket.reserve(0, self.t0 + 100)
+        self.assertEqual(self.bucket.tokens, 2)
+
+    def test_amount_larger_than_capacity_counts_as_capacity(self):
+        self.assertEqual(self.bucket.reserve(10, self.t0), 0.0)
+        self.assertEqual(self.bucket.tokens, 0)
+
+    def test_adjust_and_drain(self):
+        self.bucket.reserve(2, self.t0)
+        self.bucket.adjust(5, self.t0)
+        self.assertEqual(self.bucket.tokens, 2)
+        self.bucket.adjust(-3, self.t0)
+        self.assertEqual(self.bucket.tokens, -1)
+        self.bucket.drain(self.t0 + 0.5)
+        self.assertEqual(self.bucket.tokens, -0.5)
+
+    def test_zero_rate_is_unlimited(self):
+        bucket = TokenBucket(rate=0, capacity=0)
+        for _ in range(100):
+            self.assertEqual(bucket.reserve(1000, bucket.updated_at), 0.0)
+
+
+class RateLimiterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch.object(rate_limiter, "time")
+        fake_time = patcher.start()
+        fake_time.monotonic.side_effect = lambda: self.now
+        self.addCleanup(patcher.stop)
+
+    def _limiter(self, rpm=60, tpm=0, **kwargs) -> RateLimiter:
+        return RateLimiter(rpm, tpm, **kwargs)
+
+    def _exhaust(self, limiter, key="k", count=60):
+        for _ in range(count):
+            limiter.reserve(key)
+
+    def test_disabled_limiter_never_waits(self):
+        limiter = self._limiter(rpm=0, tpm=0)
+        self.assertFalse(limiter.enabled)
+        self.assertEqual(limiter.reserve("k", 10 ** 6), 0.0)
+
+    def test_requests_refill_over_time(self):
+        limiter = self._limiter(rpm=60)
+        self._exhaust(limiter)
+        self.assertEqual(limiter.reserve("k"), 1.0)
+        self.now += 2
+        self.assertEqual(limiter.reserve("k"), 0.0)
+
+    def test_keys_are_independent(self):
+        limiter = self._limiter(rpm=60)
+        self._exhaust(limiter, "a")
+        self.assertGreater(limiter.reserve("a"), 0)
+        self.assertEqual(limiter.reserve("b"), 0.0)
+
+    def test_release_returns_quota(self):
+        limiter = self._limiter(rpm=60)
+        self._exhaust(limiter)
+        limiter.release("k")
+        self.assertEqual(limiter.reserve("k"), 0.0)
+
+    def test_token_budget_is_corrected_by_actual_usage(self):
+        limiter = self._limiter(rpm=0, tpm=600)
+        self.assertEqual(limiter.reserve("k", 600), 0.0)
+        self.assertEqual(limiter.reserve("k", 100), 10.0)
+        limiter.release("k", 100)
+        # 预估600，实际只用了100：归还500
+        limiter.observe("k", 200, used_tokens=100, estimated_tokens=600)
+        self.assertEqual(limiter.reserve("k", 500), 0.0)
+
+    def test_429_decreases_rate_multiplicatively(self):
+        limiter = self._limiter(rpm=60, decrease_factor=0.5)
+        limiter.observe("k", 429)
+        self.assertEqual(limiter._keys["k"].scale, 0.5)
+        # 桶被清空，速率减半：下一个请求需等待 1 / 0.5 秒
+        self.assertEqual(limiter.reserve("k"), 2.0)
+        limiter.observe("k", 429)
+        self.assertEqual(limiter._keys["k"].scale, 0.25)
+        self.assertEqual(limiter.snapshot()["throttled_keys"], 1)
+
+    def test_scale_has_a_floor(self):
+        limiter = self._limiter(rpm=60, decrease_factor=0.5, min_scale=0.1)
+        for _ in range(10):
+            limiter.observe("k", 429)
+        self.assertEqual(limiter._keys["k"].scale, 0.1)
+
+    def test_retry_after_blocks_the_key(self):
+        limiter = self._limiter(rpm=60)
+        limiter.observe("k", 429, retry_after=30)
+        self.assertEqual(limiter.reserve("k"), 30.0)
+        self.now += 30
+        self.assertEqual(limiter.reserve("k"), 0.0)
+
+    def test_success_increases_rate_additively_up_to_limit(self):
+        limiter = self._limiter(rpm=60, decrease_factor=0.5, increase_step=0.1)
+        limiter.observe("k", 429)
+        for expected in (0.6, 0.7, 0.8, 0.9, 1.0, 1.0):
+            limiter.observe("k", 200)
+            self.assertAlmostEqual(limiter._keys["k"].scale, expected)
+        self.assertAlmostEqual(limiter._keys["k"].requests.rate, 1.0)
+        self.assertEqual(limiter.snapshot()["throttled_keys"], 0)
+
+    def test_other_errors_do_not_change_rate(self):
+        limiter = self._limiter(rpm=60)
+        limiter.observe("k", 500)
+        self.assertEqual(limiter._keys["k"].scale, 1.0)
+
+    def test_idle_keys_are_cleaned_up(self):
+        limiter = self._limiter(rpm=60)
+        limiter.reserve("old")
+        self.now += rate_limiter.IDLE_SECONDS + 1
+        limiter.reserve("new")
+        self.assertEqual(set(limiter._keys), {"new"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+"""
+熔断器（CircuitBreaker）的测试，重点是半开状态下探测请求被取消时的探测名额交还
+
+运行：python -m pytest tests（或 python -m unittest discover tests）
+"""
+import os
+import sys
+import threading
+import time
+import unittest
+from unittest import mock
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+import ai_generator
+import metrics
+from cancellation import GenerationCancelled
+from retry_policy import CircuitBreaker
+
+COOLDOWN = 0.05
+
+
+def _half_open_breaker() -> CircuitBreaker:
+    breaker = CircuitBreaker("test", failure_threshold=1, recovery_timeout=COOLDOWN)
+    breaker.record_failure()
+    time.sleep(COOLDOWN * 1.5)
+    return breaker
+
+
+class CircuitBreakerTest(unittest.TestCase):
+
+    def test_opens_after_threshold_and_half_opens_after_cooldown(self):
+        breaker = CircuitBreaker("test", failure_threshold=2, recovery_timeout=COOLDOWN)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow())
+        time.sleep(COOLDOWN * 1.5)
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+
+    def test_half_open_allows_a_single_probe(self):
+        breaker = _half_open_breaker()
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+
+    def test_release_probe_lets_the_next_request_probe(self):
+        breaker = _half_open_breaker()
+        self.assertTrue(breaker.allow())
+        breaker.release_probe()
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(breaker.allow())
+
+    def test_release_probe_only_releases_own_probe(self):
+        breaker = _half_open_breaker()
+        self.assertTrue(breaker.allow())
+        other = threading.Thread(target=breaker.release_probe)
+        other.start()
+        other.join()
+        self.assertFalse(breaker.allow())
+
+    def test_release_probe_after_outcome_is_noop(self):
+        breaker = _half_open_breaker()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        breaker.release_probe()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow())
+
+
+class _CancelledClient:
+    """请求发出后被取消的客户端"""
+    api_key = "sk-test"
+    masked_key = "sk-t...test"
+    api_url = "http://deepseek.invalid/chat/completions"
+    cancelled = False
+
+    def wait(self, seconds):
+        return False
+
+    def post(self, data, timeout=None):
+        raise GenerationCancelled()
+
+
+class CancelDuringProbeTest(unittest.TestCase):
+
+    def test_cancelled_probe_does_not_wedge_breaker(self):
+        breaker = _half_open_breaker()
+        with mock.patch.object(ai_generator, "DEEPSEEK_BREAKER", breaker):
+            result = ai_generator._request_json(
+                "prompt", metrics.new_call_stats(), _CancelledClient(), validate=lambda data: None
+            )
+        self.assertEqual(result["error"], "cancelled")
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(breaker.allow())
+
+    def test_cancelled_rate_limit_wait_does_not_take_probe(self):
+        breaker = _half_open_breaker()
+        client = _CancelledClient()
+        client.wait = lambda seconds: True
+        with mock.patch.object(ai_generator, "DEEPSEEK_BREAKER", breaker), \
+                mock.patch.object(ai_generator.DEEPSEEK_RATE_LIMITER, "reserve", return_value=1.0), \
+                mock.patch.object(ai_generator.DEEPSEEK_RATE_LIMITER, "release") as release:
+            result = ai_generator._request_json(
+                "prompt", metrics.new_call_stats(), client, validate=lambda data: None
+            )
+        self.assertEqual(result["error"], "cancelled")
+        release.assert_called_once()
+        self.assertTrue(breaker.allow())
+
+    def test_rate_limit_wait_past_deadline_returns_rate_limited(self):
+        breaker = _half_open_breaker()
+        with mock.patch.object(ai_generator, "DEEPSEEK_BREAKER", breaker), \
+                mock.patch.object(ai_generator.DEEPSEEK_RATE_LIMITER, "reserve", return_value=1e6), \
+                mock.patch.object(ai_generator.DEEPSEEK_RATE_LIMITER, "release") as release:
+            result = ai_generator._request_json(
+                "prompt", metrics.new_call_stats(), _CancelledClient(), validate=lambda data: None
+            )
+        self.assertEqual(result["error"], "rate_limited")
+        self.assertEqual(result["retry_in"], 1e6)
+        release.assert_called_once()
+        self.assertTrue(breaker.allow())
+
+    def test_open_breaker_returns_circuit_open_and_releases_quota(self):
+        breaker = CircuitBreaker("test", failure_threshold=1, recovery_timeout=60)
+        breaker.record_failure()
+        with mock.patch.object(ai_generator, "DEEPSEEK_BREAKER", breaker), \
+                mock.patch.object(ai_generator.DEEPSEEK_RATE_LIMITER, "release") as release:
+            result = ai_generator._request_json(
+                "prompt", metrics.new_call_stats(), _CancelledClient(), validate=lambda data: None
+            )
+        self.assertEqual(result["error"], "circuit_open")
+        self.assertGreater(result["retry_in"], 0)
+        release.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+"""
+生成任务调度器（scheduler.FairScheduler）的测试：优先级、租户轮转、每个租户的并发上限与排队取消
+
+运行：python -m pytest tests（或 python -m unittest discover tests）
+"""
+import os
+import sys
+import threading
+import time
+import unittest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from cancellation import CancelToken, GenerationCancelled
+from scheduler import BULK, INTERACTIVE, FairScheduler
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("等待超时")
+        time.sleep(0.01)
+
+
+class FairSchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.order = []
+        self.threads = []
+
+    def tearDown(self):
+        for thread in self.threads:
+            thread.join(5)
+
+    def _queued(self, scheduler, priority):
+        return scheduler.snapshot()["queued"][priority]
+
+    def _submit(self, scheduler, name, tenant, priority=INTERACTIVE, hold=None):
+        """在后台线程中排队，获得名额后记录名字；hold 不为空时持有名额直到该事件被设置"""
+        def run():
+            with scheduler.slot(tenant, priority):
+                self.order.append(name)
+                if hold is not None:
+                    hold.wait(5)
+
+        queued = self._queued(scheduler, priority)
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        self.threads.append(thread)
+        _wait_for(lambda: self._queued(scheduler, priority) > queued or name in self.order)
+        return thread
+
+    def _block(self, scheduler, tenant="blocker"):
+        """占住名额，返回用于释放的事件"""
+        release = threading.Event()
+        self._submit(scheduler, "blocker", tenant, hold=release)
+        _wait_for(lambda: "blocker" in self.order)
+        self.order.remove("blocker")
+        return release
+
+    def test_round_robin_between_tenants(self):
+        scheduler = FairScheduler(max_concurrent=1, per_key_max_in_flight=1)
+        release = self._block(scheduler)
+        for name, tenant in (("A1", "a"), ("A2", "a"), ("A3", "a"), ("B1", "b")):
+            self._submit(scheduler, name, tenant, BULK)
+        release.set()
+        _wait_for(lambda: len(self.order) == 4)
+        self.assertEqual(self.order, ["A1", "B1", "A2", "A3"])
+
+    def test_interactive_before_bulk(self):
+        scheduler = FairScheduler(max_concurrent=1, per_key_max_in_flight=1)
+        release = self._block(scheduler)
+        self._submit(scheduler, "bulk", "a", BULK)
+        self._submit(scheduler, "interactive", "b", INTERACTIVE)
+        release.set()
+        _wait_for(lambda: len(self.order) == 2)
+        self.assertEqual(self.order, ["interactive", "bulk"])
+
+    def test_per_key_quota(self):
+        scheduler = FairScheduler(max_concurrent=3, per_key_max_in_flight=1)
+        release = self._block(scheduler, tenant="a")
+        self._submit(scheduler, "A2", "a")
+        self._submit(scheduler, "B1", "b")
+        _wait_for(lambda: "B1" in self.order)
+        # 总名额还有空闲，但租户a已达到上限
+        self.assertNotIn("A2", self.order)
+        self.assertEqual(self._queued(scheduler, INTERACTIVE), 1)
+        release.set()
+        _wait_for(lambda: "A2" in self.order)
+
+    def test_position_reported_while_waiting(self):
+        scheduler = FairScheduler(max_concurrent=1, per_key_max_in_flight=1, initial_estimate=10)
+        release = self._block(scheduler)
+        self._submit(scheduler, "A1", "a")
+        updates = []
+
+        def run():
+            with scheduler.slot("b", INTERACTIVE, on_wait=updates.append):
+                self.order.append("B1")
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        _wait_for(lambda: updates)
+        self.assertEqual(updates[0], {"position": 2, "estimated_wait_seconds": 20, "priority": INTERACTIVE})
+        release.set()
+        thread.join(5)
+        self.assertIsNone(updates[-1])
+        self.assertEqual(self.order, ["A1", "B1"])
+
+    def test_cancel_while_queued(self):
+        scheduler = FairScheduler(max_concurrent=1, per_key_max_in_flight=1)
+        scheduler.POLL_INTERVAL = 0.02
+        release = self._block(scheduler)
+        token = CancelToken()
+        errors = []
+
+        def run():
+            try:
+                with scheduler.slot("a", INTERACTIVE, cancel_token=token):
+                    self.order.append("cancelled")
+            except GenerationCancelled as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        _wait_for(lambda: self._queued(scheduler, INTERACTIVE) == 1)
+        token.cancel()
+        thread.join(5)
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(self._queued(scheduler, INTERACTIVE), 0)
+        release.set()
+        self.threads[-1].join(5)
+        self.assertEqual(scheduler.snapshot()["running"], 0)
+        self.assertNotIn("cancelled", self.order)
+
+    def test_unknown_priority(self):
+        scheduler = FairScheduler(max_concurrent=1, per_key_max_in_flight=1)
+        with self.assertRaises(ValueError):
+            with scheduler.slot("a", "urgent"):
+                pass
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+"""
+请求合并（singleflight）的测试：并发的相同请求共享结果、失败时等待者各自重试、等待期间响应取消
+
+运行：python -m pytest tests（或 python -m unittest discover tests）
+"""
+import os
+import sys
+import threading
+import time
+import unittest
+from unittest import mock
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+import singleflight
+from cancellation import GenerationCancelled
+from scheduler import tenant_key
+from singleflight import SingleFlight, prompt_key
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("等待超时")
+        time.sleep(0.01)
+
+
+class PromptKeyTest(unittest.TestCase):
+
+    def test_whitespace_is_normalized(self):
+        self.assertEqual(prompt_key("生成 教案\n\n", "t"), prompt_key("  生成\t教案", "t"))
+
+    def test_parts_distinguish_keys(self):
+        self.assertNotEqual(prompt_key("p", tenant_key("sk-a")), prompt_key("p", tenant_key("sk-b")))
+        self.assertNotEqual(prompt_key("p", "t", 4000), prompt_key("p", "t", 8000))
+
+
+class SingleFlightTest(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(singleflight, "POLL_INTERVAL", 0.02)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.flight = SingleFlight()
+        self.calls = 0
+        self.started = threading.Event()
+        self.finish = threading.Event()
+
+    def _blocking(self, result):
+        def fn():
+            self.calls += 1
+            self.started.set()
+            self.finish.wait(5)
+            if isinstance(result, Exception):
+                raise result
+            return result
+        return fn
+
+    def _in_background(self, target):
+        outcome = {}
+
+        def run():
+            try:
+                outcome["value"] = target()
+            except Exception as e:
+                outcome["error"] = e
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread, outcome
+
+    def _join_waiter(self, key, fn, **kwargs):
+        """在首个调用进行中时发起第二个调用，等它进入等待"""
+        thread, outcome = self._in_background(lambda: self.flight.do(key, fn, **kwargs))
+        _wait_for(lambda: self.flight._calls[key].waiters == 1)
+        return thread, outcome
+
+    def test_concurrent_calls_share_a_copy(self):
+        result = {"教学重点": ["焊接姿势"]}
+        leader, leader_outcome = self._in_background(lambda: self.flight.do("k", self._blocking(result)))
+        self.assertTrue(self.started.wait(5))
+        waiter, waiter_outcome = self._join_waiter("k", self._blocking({"other": True}))
+        self.finish.set()
+        leader.join(5)
+        waiter.join(5)
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(leader_outcome["value"], (result, False))
+        shared, was_shared = waiter_outcome["value"]
+        self.assertTrue(was_shared)
+        self.assertEqual(shared, result)
+        self.assertIsNot(shared, result)
+        self.assertEqual(self.flight.in_flight(), 0)
+
+    def test_different_keys_do_not_merge(self):
+        self.assertEqual(self.flight.do("a", lambda: 1), (1, False))
+        self.assertEqual(self.flight.do("b", lambda: 2), (2, False))
+
+    def test_leader_exception_makes_waiter_retry(self):
+        leader, leader_outcome = self._in_background(lambda: self.flight.do("k", self._blocking(RuntimeError("失败"))))
+        self.assertTrue(self.started.wait(5))
+        waiter, waiter_outcome = self._join_waiter("k", lambda: "retried")
+        self.finish.set()
+        leader.join(5)
+        waiter.join(5)
+
+        self.assertIsInstance(leader_outcome["error"], RuntimeError)
+        self.assertEqual(waiter_outcome["value"], ("retried", False))
+        self.assertEqual(self.flight.in_flight(), 0)
+
+    def test_unshareable_result_makes_waiter_retry(self):
+        failed = {"error": "invalid_key"}
+        leader, leader_outcome = self._in_background(
+            lambda: self.flight.do("k", self._blocking(failed), shareable=lambda r: "error" not in r)
+        )
+        self.assertTrue(self.started.wait(5))
+        waiter, waiter_outcome = self._join_waiter("k", lambda: {"ok": 1}, shareable=lambda r: "error" not in r)
+        self.finish.set()
+        leader.join(5)
+        waiter.join(5)
+
+        self.assertEqual(leader_outcome["value"], (failed, False))
+        self.assertEqual(waiter_outcome["value"], ({"ok": 1}, False))
+
+    def test_waiter_cancel(self):
+        leader, _ = self._in_background(lambda: self.flight.do("k", self._blocking("done")))
+        self.assertTrue(self.started.wait(5))
+        cancelled = threading.Event()
+        waiter, waiter_outcome = self._join_waiter("k", lambda: "unused", cancelled=cancelled.is_set)
+        cancelled.set()
+        waiter.join(5)
+        self.assertIsInstance(waiter_outcome["error"], GenerationCancelled)
+        self.finish.set()
+        leader.join(5)
+        self.assertEqual(self.calls, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
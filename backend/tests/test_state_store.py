@@ -0,0 +1,218 @@
+"""
+共享状态存储（state_store）的测试：会话、文档记录、任务队列和互斥锁的读写往返
+
+SQLite 用例另外用两个存储实例打开同一个数据库文件，模拟多个worker共享状态
+运行：python -m pytest tests（或 python -m unittest discover tests）
+"""
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from state_store import LocalStateStore, LockTimeout, SQLiteStateStore, StateStore, create_state_store
+
+OLD_UPLOAD_TIME = '2000-01-01 00:00:00'
+
+
+def _doc(filename, filepath=None, upload_time=None, content="正文"):
+    return {
+        'filename': filename,
+        'filepath': filepath or f'/uploads/{filename}',
+        'upload_time': upload_time or time.strftime('%Y-%m-%d %H:%M:%S'),
+        'content': content
+    }
+
+
+class StateStoreContract:
+    """各后端共同的行为，子类提供 make_store()"""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        self.store = self.make_store()
+
+    def test_session_round_trip(self):
+        self.assertIsNone(self.store.get_session('s1'))
+        created = self.store.update_session('s1', {'status': 'generating', 'total': 3})
+        self.assertEqual(created['status'], 'generating')
+        self.assertEqual(created['progress'], 0)
+        self.assertEqual(created['results'], [])
+
+        self.store.update_session('s1', {'progress': 2, 'results': [{'课题名称': '焊接'}]})
+        session = self.store.get_session('s1')
+        self.assertEqual(session['status'], 'generating')
+        self.assertEqual(session['total'], 3)
+        self.assertEqual(session['progress'], 2)
+        self.assertEqual(session['results'], [{'课题名称': '焊接'}])
+        self.assertEqual(session['created_at'], created['created_at'])
+
+    def test_document_round_trip(self):
+        self.store.add_document('L1', _doc('a.pdf', content='第一份'))
+        self.store.add_document('L1', _doc('b.docx', content='第二份'))
+        self.store.add_document('L2', _doc('c.txt'))
+
+        public = self.store.list_documents('L1')
+        self.assertEqual([doc['filename'] for doc in public], ['a.pdf', 'b.docx'])
+        self.assertTrue(all('content' not in doc for doc in public))
+        full = self.store.list_documents('L1', include_content=True)
+        self.assertEqual([doc['content'] for doc in full], ['第一份', '第二份'])
+        self.assertEqual(self.store.list_documents('missing'), [])
+
+    def test_remove_document(self):
+        self.store.add_document('L1', _doc('a.pdf'))
+        removed = self.store.remove_document('L1', 'a.pdf')
+        self.assertEqual(removed['filename'], 'a.pdf')
+        self.assertNotIn('content', removed)
+        self.assertEqual(self.store.list_documents('L1'), [])
+        self.assertIsNone(self.store.remove_document('L1', 'a.pdf'))
+
+    def test_remove_document_file(self):
+        self.store.add_document('L1', _doc('a.pdf', filepath='/uploads/L1_1_a.pdf'))
+        self.store.add_document('L1', _doc('a.pdf', filepath='/uploads/L1_2_a.pdf'))
+        removed = self.store.remove_document_file('L1', '/uploads/L1_2_a.pdf')
+        self.assertEqual(removed['filepath'], '/uploads/L1_2_a.pdf')
+        self.assertEqual([doc['filepath'] for doc in self.store.list_documents('L1')], ['/uploads/L1_1_a.pdf'])
+        self.assertIsNone(self.store.remove_document_file('L1', '/uploads/L1_2_a.pdf'))
+
+    def test_purge_documents(self):
+        self.store.add_document('L1', _doc('old.pdf', upload_time=OLD_UPLOAD_TIME))
+        self.store.add_document('L1', _doc('new.pdf'))
+        self.store.add_document('L2', _doc('old2.pdf', upload_time=OLD_UPLOAD_TIME))
+        self.assertEqual(self.store.purge_documents(3600), 2)
+        self.assertEqual([doc['filename'] for doc in self.store.list_documents('L1')], ['new.pdf'])
+        self.assertEqual(self.store.list_documents('L2'), [])
+
+    def test_queue_is_fifo(self):
+        self.assertIsNone(self.store.dequeue('jobs'))
+        for i in range(3):
+            self.store.enqueue('jobs', {'id': i, '课题': f'课时{i}'})
+        self.store.enqueue('other', {'id': 'x'})
+        self.assertEqual(self.store.queue_length('jobs'), 3)
+        self.assertEqual([self.store.dequeue('jobs')['id'] for _ in range(3)], [0, 1, 2])
+        self.assertEqual(self.store.queue_length('jobs'), 0)
+        self.assertEqual(self.store.queue_length('other'), 1)
+
+    def test_dequeue_waits_for_item(self):
+        timer = threading.Timer(0.1, self.store.enqueue, ('jobs', {'id': 1}))
+        timer.start()
+        self.addCleanup(timer.cancel)
+        self.assertEqual(self.store.dequeue('jobs', timeout=5), {'id': 1})
+
+    def test_dequeue_timeout(self):
+        started = time.monotonic()
+        self.assertIsNone(self.store.dequeue('jobs', timeout=0.2))
+        self.assertGreaterEqual(time.monotonic() - started, 0.15)
+
+    def test_lock_is_exclusive(self):
+        with self.store.lock('lesson:a', timeout=1):
+            with self.assertRaises(LockTimeout):
+                with self.store.lock('lesson:a', timeout=0.1):
+                    pass
+            # 不同名字的锁互不影响
+            with self.store.lock('lesson:b', timeout=0.1):
+                pass
+        with self.store.lock('lesson:a', timeout=0.1):
+            pass
+
+    def test_expired_lock_can_be_taken(self):
+        with self.store.lock('lesson:a', timeout=1, ttl=0.1):
+            time.sleep(0.2)
+            with self.store.lock('lesson:a', timeout=0.5):
+                pass
+
+
+class LocalStateStoreTest(StateStoreContract, unittest.TestCase):
+
+    def make_store(self):
+        return LocalStateStore(os.path.join(self.tmp, 'sessions'), cache_size=2)
+
+    def test_sessions_survive_cache_eviction_and_restart(self):
+        for sid in ('s1', 's2', 's3'):
+            self.store.update_session(sid, {'status': 'completed', 'id': sid})
+        self.assertNotIn('s1', self.store._sessions)
+        self.assertEqual(self.store.get_session('s1')['id'], 's1')
+        restarted = self.make_store()
+        self.assertEqual(restarted.get_session('s3')['status'], 'completed')
+
+
+class SQLiteStateStoreTest(StateStoreContract, unittest.TestCase):
+
+    def make_store(self):
+        return SQLiteStateStore(os.path.join(self.tmp, 'state.db'))
+
+    def test_instances_share_state(self):
+        other = self.make_store()
+        self.store.update_session('s1', {'status': 'generating'})
+        other.update_session('s1', {'progress': 1})
+        self.assertEqual(self.store.get_session('s1')['status'], 'generating')
+        self.assertEqual(self.store.get_session('s1')['progress'], 1)
+
+        self.store.add_document('L1', _doc('a.pdf', content='共享文本'))
+        self.assertEqual(other.list_documents('L1', include_content=True)[0]['content'], '共享文本')
+
+        self.store.enqueue('jobs', {'id': 1})
+        self.assertEqual(other.dequeue('jobs'), {'id': 1})
+        self.assertIsNone(self.store.dequeue('jobs'))
+
+    def test_lock_across_instances(self):
+        other = self.make_store()
+        with self.store.lock('lesson:a', timeout=1):
+            with self.assertRaises(LockTimeout):
+                with other.lock('lesson:a', timeout=0.1):
+                    pass
+        with other.lock('lesson:a', timeout=0.1):
+            pass
+
+    def test_unlock_only_releases_own_lock(self):
+        self.assertTrue(self.store._try_lock('lesson:a', 'owner-1', 60))
+        self.store._unlock('lesson:a', 'owner-2')
+        self.assertFalse(self.store._try_lock('lesson:a', 'owner-2', 60))
+        self.store._unlock('lesson:a', 'owner-1')
+        self.assertTrue(self.store._try_lock('lesson:a', 'owner-2', 60))
+
+    def test_purge_sessions(self):
+        self.store.update_session('old', {'status': 'completed'})
+        self.store.update_session('new', {'status': 'completed'})
+        conn = sqlite3.connect(self.store.path)
+        with conn:
+            conn.execute("UPDATE sessions SET updated_at = ? WHERE id = 'old'", (time.time() - 7200,))
+        conn.close()
+        self.assertEqual(self.store.purge_sessions(3600), 1)
+        self.assertIsNone(self.store.get_session('old'))
+        self.assertIsNotNone(self.store.get_session('new'))
+
+    def test_data_survives_reopen(self):
+        self.store.update_session('s1', {'results': [{'课题名称': '焊接5步法'}]})
+        self.store.add_document('L1', _doc('a.pdf'))
+        reopened = self.make_store()
+        self.assertEqual(reopened.get_session('s1')['results'], [{'课题名称': '焊接5步法'}])
+        self.assertEqual(len(reopened.list_documents('L1')), 1)
+
+
+class CreateStateStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+
+    def test_backends(self):
+        self.assertIsInstance(create_state_store(self.tmp, 'local'), LocalStateStore)
+        self.assertIsInstance(create_state_store(self.tmp, 'SQLite'), SQLiteStateStore)
+        with self.assertRaises(ValueError):
+            create_state_store(self.tmp, 'memcached')
+
+    def test_interface_is_abstract(self):
+        with self.assertRaises(TypeError):
+            StateStore()
+
+
+if __name__ == "__main__":
+    unittest.main()
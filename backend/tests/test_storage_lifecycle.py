@@ -0,0 +1,144 @@
+"""
+存储生命周期（storage_lifecycle）的测试：按TTL删除过期文件、超过大小上限时按最近最少使用淘汰
+
+运行：python -m pytest tests（或 python -m unittest discover tests）
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+import storage_lifecycle
+from storage_lifecycle import DirectoryPolicy, StorageSweeper
+
+
+class StorageSweeperTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        self.dir = os.path.join(self.tmp, 'outputs')
+        os.makedirs(self.dir)
+        self.evicted = []
+
+    def _file(self, name, age=0, size=100):
+        """写入文件，并把mtime设为 age 秒之前"""
+        path = os.path.join(self.dir, name)
+        with open(path, 'wb') as f:
+            f.write(b'x' * size)
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def _sweeper(self, **policy):
+        policy.setdefault('min_age', 0)
+        self.policy = DirectoryPolicy('outputs', self.dir, on_evict=self.evicted.append, **policy)
+        return StorageSweeper([self.policy], interval=0, rescan_every=100,
+                              lock_path=os.path.join(self.tmp, '.sweeper.lock'))
+
+    def _remaining(self):
+        return sorted(os.listdir(self.dir))
+
+    def test_ttl_removes_expired_files(self):
+        old = self._file('old.docx', age=7200)
+        self._file('new.docx', age=10)
+        report = self._sweeper(ttl_seconds=3600).sweep_once()
+        self.assertEqual(report, {'outputs': {'files': 1, 'bytes': 100}})
+        self.assertEqual(self._remaining(), ['new.docx'])
+        self.assertEqual(self.evicted, [old])
+
+    def test_size_limit_evicts_least_recently_used(self):
+        self._file('a.docx', age=300)
+        self._file('b.docx', age=200)
+        self._file('c.docx', age=100)
+        report = self._sweeper(max_bytes=250).sweep_once()
+        self.assertEqual(report['outputs'], {'files': 1, 'bytes': 100})
+        self.assertEqual(self._remaining(), ['b.docx', 'c.docx'])
+
+    def test_touch_moves_file_to_the_back(self):
+        a = self._file('a.docx', age=300)
+        b = self._file('b.docx', age=200)
+        self._file('c.docx', age=100)
+        sweeper = self._sweeper(max_bytes=250)
+        sweeper.sweep_once()
+        self.assertEqual(self._remaining(), ['b.docx', 'c.docx'])
+
+        a = self._file('a.docx', age=300)
+        sweeper.track(a)
+        sweeper.touch(a)
+        sweeper.sweep_once()
+        self.assertEqual(self._remaining(), ['a.docx', 'c.docx'])
+        self.assertEqual(self.evicted[-1], b)
+
+    def test_min_age_protects_recent_files(self):
+        self._file('a.docx', age=30)
+        self._file('b.docx', age=20)
+        report = self._sweeper(max_bytes=100, min_age=600).sweep_once()
+        self.assertEqual(report['outputs']['files'], 0)
+        self.assertEqual(self._remaining(), ['a.docx', 'b.docx'])
+
+    def test_untracked_files_wait_for_rescan(self):
+        sweeper = self._sweeper(ttl_seconds=3600)
+        sweeper.sweep_once()
+        self._file('other_worker.docx', age=7200)
+        tracked = self._file('this_worker.docx', age=7200)
+        sweeper.track(tracked)
+        sweeper.sweep_once()
+        self.assertEqual(self._remaining(), ['other_worker.docx'])
+        sweeper.rescan_every = 1
+        sweeper.sweep_once()
+        self.assertEqual(self._remaining(), [])
+
+    def test_file_used_by_another_process_is_kept(self):
+        path = self._file('a.docx', age=1000)
+        sweeper = self._sweeper(ttl_seconds=3600)
+        sweeper.sweep_once()
+        # 其他进程在两次清理之间使用了该文件，索引中的mtime已过时
+        os.utime(path)
+        self.policy.ttl_seconds = 500
+        self.assertEqual(sweeper.sweep_once()['outputs']['files'], 0)
+        self.assertEqual(self._remaining(), ['a.docx'])
+
+    def test_dotfiles_are_ignored(self):
+        self._file('.a.docx.tmp', age=7200)
+        self._sweeper(ttl_seconds=3600).sweep_once()
+        self.assertEqual(self._remaining(), ['.a.docx.tmp'])
+
+    def test_remove_and_snapshot(self):
+        a = self._file('a.docx', size=100)
+        self._file('b.docx', size=50)
+        sweeper = self._sweeper(max_bytes=1000)
+        sweeper.sweep_once()
+        self.assertEqual(sweeper.snapshot()['outputs']['bytes'], 150)
+        sweeper.remove(a)
+        sweeper.remove(a)
+        self.assertEqual(self._remaining(), ['b.docx'])
+        self.assertEqual(sweeper.snapshot()['outputs']['files'], 1)
+        self.assertEqual(sweeper.snapshot()['outputs']['bytes'], 50)
+
+    def test_on_sweep_called(self):
+        calls = []
+        sweeper = self._sweeper(ttl_seconds=3600)
+        sweeper.on_sweep = lambda: calls.append(1)
+        sweeper.sweep_once()
+        self.assertEqual(calls, [1])
+
+    @unittest.skipIf(storage_lifecycle.fcntl is None, "需要fcntl")
+    def test_skips_while_another_process_sweeps(self):
+        self._file('old.docx', age=7200)
+        sweeper = self._sweeper(ttl_seconds=3600)
+        with open(sweeper.lock_path, 'a') as handle:
+            storage_lifecycle.fcntl.flock(handle, storage_lifecycle.fcntl.LOCK_EX)
+            self.assertIsNone(sweeper.sweep_once())
+        self.assertEqual(self._remaining(), ['old.docx'])
+        self.assertEqual(sweeper.sweep_once()['outputs']['files'], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
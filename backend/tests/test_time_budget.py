@@ -0,0 +1,113 @@
+"""
+教学时间校验（time_budget.rebalance_process_times）的测试：最大余数法取整后总和等于预算、每个环节不少于最小时长
+
+运行：python -m pytest tests（或 python -m unittest discover tests）
+"""
+import os
+import sys
+import unittest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from time_budget import parse_class_hours, parse_minutes, rebalance_process_times
+
+
+def _steps(*times):
+    return [{"环节": f"环节{i}", "时间": time} for i, time in enumerate(times, 1)]
+
+
+def _minutes(steps):
+    return [parse_minutes(step["时间"]) for step in steps]
+
+
+class ParseTest(unittest.TestCase):
+
+    def test_parse_minutes(self):
+        self.assertEqual(parse_minutes("10min"), 10)
+        self.assertEqual(parse_minutes("约15分钟"), 15)
+        self.assertEqual(parse_minutes("1小时"), 60)
+        self.assertEqual(parse_minutes("5-10min"), 7.5)
+        self.assertEqual(parse_minutes("5 至 10 分钟"), 7.5)
+        self.assertEqual(parse_minutes(20), 20)
+        self.assertIsNone(parse_minutes("若干"))
+        self.assertIsNone(parse_minutes(None))
+
+    def test_parse_class_hours(self):
+        self.assertEqual(parse_class_hours("3学时"), 3)
+        self.assertEqual(parse_class_hours(2), 2)
+        self.assertIsNone(parse_class_hours(""))
+
+
+class RebalanceTest(unittest.TestCase):
+
+    def test_matching_total_is_unchanged(self):
+        steps = _steps("10min", "50min", "30min")
+        new_steps, report = rebalance_process_times(steps, "2", minutes_per_hour=45, min_minutes=5)
+        self.assertIs(new_steps, steps)
+        self.assertEqual(report["status"], "ok")
+        self.assertEqual(report["budget"], 90)
+
+    def test_largest_remainder_sum_equals_budget(self):
+        for times, hours in [
+            (("10min", "10min", "10min"), "2"),
+            (("7min", "13min", "29min", "11min"), "3"),
+            (("1min", "1min", "1min", "1min", "1min", "1min", "1min"), "1"),
+            (("33min", "33min", "33min"), "1"),
+        ]:
+            with self.subTest(times=times, hours=hours):
+                new_steps, report = rebalance_process_times(_steps(*times), hours, minutes_per_hour=45, min_minutes=5)
+                self.assertEqual(report["status"], "rebalanced")
+                minutes = _minutes(new_steps)
+                self.assertTrue(all(float(m).is_integer() for m in minutes))
+                self.assertEqual(sum(minutes), report["budget"])
+
+    def test_proportional_with_largest_remainder(self):
+        # 预算45分钟按 1:1:1 分配为 15/15/15；预算46分钟时余数最大的第一个环节多得1分钟
+        new_steps, _ = rebalance_process_times(_steps("10min", "10min", "10min"), 1, minutes_per_hour=46, min_minutes=5)
+        self.assertEqual(sorted(_minutes(new_steps)), [15, 15, 16])
+
+    def test_minimum_respected(self):
+        new_steps, report = rebalance_process_times(
+            _steps("1min", "100min", "100min"), "1", minutes_per_hour=45, min_minutes=5
+        )
+        minutes = _minutes(new_steps)
+        self.assertEqual(report["status"], "rebalanced")
+        self.assertEqual(sum(minutes), 45)
+        self.assertTrue(all(m >= 5 for m in minutes))
+        self.assertEqual(minutes[0], 5)
+
+    def test_unparseable_steps_use_average_weight(self):
+        new_steps, report = rebalance_process_times(_steps("20min", "若干", "20min"), "1", minutes_per_hour=45, min_minutes=5)
+        self.assertIsNone(report["original_total"])
+        self.assertEqual(_minutes(new_steps), [15, 15, 15])
+
+    def test_keeps_original_wording(self):
+        new_steps, report = rebalance_process_times(_steps("约10分钟", "10min"), "1", minutes_per_hour=40, min_minutes=5)
+        self.assertEqual([step["时间"] for step in new_steps], ["约20分钟", "20min"])
+        self.assertEqual(len(report["changes"]), 2)
+
+    def test_ranges_are_replaced_whole(self):
+        steps = _steps("10-20min", "30min", "45min")
+        new_steps, report = rebalance_process_times(steps, "2", minutes_per_hour=45, min_minutes=5)
+        self.assertEqual(report["status"], "rebalanced")
+        self.assertEqual([step["时间"] for step in new_steps], ["15min", "30min", "45min"])
+        self.assertEqual(report["changes"], [{"环节": "环节1", "from": "10-20min", "to": "15min"}])
+
+    def test_does_not_modify_input(self):
+        steps = _steps("10min", "10min")
+        rebalance_process_times(steps, "1", minutes_per_hour=45, min_minutes=5)
+        self.assertEqual(steps, _steps("10min", "10min"))
+
+    def test_irreparable(self):
+        self.assertEqual(rebalance_process_times([], "2")[1]["status"], "irreparable")
+        self.assertEqual(rebalance_process_times(_steps("10min"), "若干")[1]["status"], "irreparable")
+        steps = _steps(*["10min"] * 10)
+        new_steps, report = rebalance_process_times(steps, "1", minutes_per_hour=45, min_minutes=5)
+        self.assertEqual(report["status"], "irreparable")
+        self.assertIs(new_steps, steps)
+
+
+if __name__ == "__main__":
+    unittest.main()
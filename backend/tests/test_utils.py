@@ -0,0 +1,49 @@
+"""
+大模型返回内容解析（parse_lesson_plan_json）的测试
+
+运行：python -m pytest tests（或 python -m unittest discover tests）
+"""
+import json
+import os
+import sys
+import unittest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from utils import parse_lesson_plan_json
+
+
+class ParseLessonPlanJsonTest(unittest.TestCase):
+
+    def test_plain_object(self):
+        self.assertEqual(parse_lesson_plan_json('{"a": 1}'), {"a": 1})
+
+    def test_markdown_code_block(self):
+        self.assertEqual(parse_lesson_plan_json('```json\n{"a": 1}\n```'), {"a": 1})
+
+    def test_prose_with_brackets_before_object(self):
+        # 说明文字中的 [ ] 不应被当作JSON数组的开头
+        repairs = {}
+        self.assertEqual(parse_lesson_plan_json('说明 [注意] {"a": 1}', repairs), {"a": 1})
+        self.assertEqual(repairs, {})
+
+    def test_prose_with_brackets_before_malformed_object(self):
+        repairs = {}
+        data = parse_lesson_plan_json('以下是教案[JSON]：\n{"a": 1, "b": [1 2]', repairs)
+        self.assertEqual(data, {"a": 1, "b": [1, 2]})
+        self.assertEqual(repairs.get("stripped_prose"), 1)
+
+    def test_trailing_comma_is_repaired(self):
+        repairs = {}
+        self.assertEqual(parse_lesson_plan_json('{"a": [1, 2,],}', repairs), {"a": [1, 2]})
+        self.assertEqual(repairs.get("trailing_commas"), 2)
+
+    def test_unrepairable_raises_original_error(self):
+        with self.assertRaises(json.JSONDecodeError):
+            parse_lesson_plan_json('没有JSON内容')
+
+
+if __name__ == "__main__":
+    unittest.main()
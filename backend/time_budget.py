@@ -0,0 +1,130 @@
+"""
+教学时间校验模块 - 检查教学实施过程各环节时长之和是否等于 授课学时 × 每学时分钟数，
+不等时按比例重新分配（整数分钟、保留最小时长），无法修复时给出标记
+"""
+import re
+
+from config import MINUTES_PER_CLASS_HOUR, MIN_STEP_MINUTES
+
+_NUMBER = re.compile(r'\d+(?:\.\d+)?')
+# 时长：单个数字或范围（如 "5-10"、"5~10"、"5至10"），范围按中值计
+_DURATION = re.compile(r'(\d+(?:\.\d+)?)(?:\s*(?:-|~|～|—|–|至|到)\s*(\d+(?:\.\d+)?))?')
+_HOUR_UNIT = re.compile(r'^\s*(?:h|hr|hour|小时)', re.IGNORECASE)
+
+
+def parse_minutes(text) -> float:
+    """解析环节时间（如 "10min"、"约15分钟"、"1小时"、"5-10min"），无法解析返回None"""
+    if isinstance(text, (int, float)):
+        return float(text)
+    match = _DURATION.search(str(text or ''))
+    if not match:
+        return None
+    low, high = match.groups()
+    value = (float(low) + float(high)) / 2 if high else float(low)
+    if _HOUR_UNIT.match(str(text)[match.end():]):
+        value *= 60
+    return value
+
+
+def parse_class_hours(text) -> float:
+    """解析授课学时（如 "3学时"、"2"），无法解析返回None"""
+    if isinstance(text, (int, float)):
+        return float(text)
+    match = _NUMBER.search(str(text or ''))
+    return float(match.group()) if match else None
+
+
+def _is_range(text) -> bool:
+    match = _DURATION.search(str(text or '')) if not isinstance(text, (int, float)) else None
+    return bool(match and match.group(2))
+
+
+def _format_minutes(original, minutes: int) -> str:
+    """保留原有写法，仅替换其中的时长（范围整体替换为一个数）；原值无数字时使用 "XXmin" 格式"""
+    original = str(original or '')
+    match = _DURATION.search(original)
+    if match and not _HOUR_UNIT.match(original[match.end():]):
+        return original[:match.start()] + str(minutes) + original[match.end():]
+    return f"{minutes}min"
+
+
+def _allocate(weights: list, budget: int, minimum: int) -> list:
+    """
+    按权重把budget分钟分配给各环节：每个环节至少minimum分钟，
+    低于最小值的先固定为最小值，其余按比例分配，最后用最大余数法取整
+    """
+    n = len(weights)
+    fixed = [False] * n
+    while True:
+        free_budget = budget - minimum * sum(fixed)
+        free_weight = sum(w for w, f in zip(weights, fixed) if not f)
+        shares = [
+            minimum if f else (w * free_budget / free_weight if free_weight > 0 else free_budget / (n - sum(fixed)))
+            for w, f in zip(weights, fixed)
+        ]
+        newly_fixed = [i for i, share in enumerate(shares) if not fixed[i] and share < minimum]
+        if not newly_fixed:
+            break
+        for i in newly_fixed:
+            fixed[i] = True
+
+    floors = [int(share) for share in shares]
+    remainder = budget - sum(floors)
+    order = sorted(range(n), key=lambda i: shares[i] - floors[i], reverse=True)
+    for i in order[:remainder]:
+        floors[i] += 1
+    return floors
+
+
+def rebalance_process_times(process_steps: list, class_hours,
+                            minutes_per_hour: int = MINUTES_PER_CLASS_HOUR,
+                            min_minutes: int = MIN_STEP_MINUTES) -> tuple:
+    """
+    校验并修正教学实施过程的时间分配
+
+    Returns:
+        (修正后的环节列表（新列表，不修改原数据）, 报告字典)
+        报告 status: ok 无需修改 / rebalanced 已按比例修正 / irreparable 无法修正（保持原样）
+    """
+    report = {'status': 'ok', 'budget': None, 'original_total': None, 'changes': []}
+    hours = parse_class_hours(class_hours)
+    if not process_steps:
+        report.update(status='irreparable', reason='没有教学环节')
+        return process_steps, report
+    if not hours or hours <= 0:
+        report.update(status='irreparable', reason=f'无法解析授课学时: {class_hours!r}')
+        return process_steps, report
+
+    budget = int(round(hours * minutes_per_hour))
+    report['budget'] = budget
+    if len(process_steps) * min_minutes > budget:
+        report.update(
+            status='irreparable',
+            reason=f'{len(process_steps)}个环节每个至少{min_minutes}分钟，超出总时长{budget}分钟'
+        )
+        return process_steps, report
+
+    durations = [parse_minutes(step.get('时间')) for step in process_steps]
+    parsed = [d for d in durations if d is not None and d > 0]
+    report['original_total'] = sum(parsed) if len(parsed) == len(durations) else None
+
+    ranges = [_is_range(step.get('时间')) for step in process_steps]
+    if (len(parsed) == len(durations) and not any(ranges)
+            and all(float(d).is_integer() and d >= min_minutes for d in durations)
+            and int(sum(durations)) == budget):
+        return process_steps, report
+
+    # 无法解析的环节按已解析环节的平均时长计权，全部无法解析时平均分配
+    default_weight = sum(parsed) / len(parsed) if parsed else 1.0
+    weights = [d if d is not None and d > 0 else default_weight for d in durations]
+    allocation = _allocate(weights, budget, min_minutes)
+
+    new_steps = []
+    for step, old, minutes, is_range in zip(process_steps, durations, allocation, ranges):
+        new_step = dict(step)
+        if old != minutes or is_range:
+            new_step['时间'] = _format_minutes(step.get('时间'), minutes)
+            report['changes'].append({'环节': step.get('环节', ''), 'from': step.get('时间'), 'to': new_step['时间']})
+        new_steps.append(new_step)
+    report['status'] = 'rebalanced'
+    return new_steps, report
@@ -0,0 +1,149 @@
+"""
+轻量追踪 - 记录每个课时生成各阶段的耗时与属性，定位慢课时的时间花在了哪里
+
+    with tracing.trace("lesson", session_id=session_id, topic=topic) as lesson_trace:
+        ...
+        with tracing.span("llm_request", attempt=1) as s:
+            ...
+            s.set(status_code=200)
+    result["trace"] = lesson_trace.to_dict()
+
+span() 自动挂在当前（contextvars）正在进行的span下；没有进行中的trace时不做任何记录，
+因此被追踪的函数在命令行、基准测试等场景中照常工作。TRACING=0 关闭追踪。
+"""
+import contextvars
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from config import TRACING_ENABLED
+
+_current = contextvars.ContextVar('tracing_current_span', default=None)
+
+
+class Span:
+    """一个阶段：名称、起止时间、属性与状态（ok / error）"""
+
+    __slots__ = ("trace", "name", "span_id", "parent_id", "start", "end", "attributes", "status")
+
+    def __init__(self, trace: "Trace", name: str, parent_id: str = None, attributes: dict = None):
+        self.trace = trace
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.start = time.perf_counter()
+        self.end = None
+        self.attributes = dict(attributes or {})
+        self.status = "ok"
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ms": round((self.start - self.trace.root.start) * 1000, 1),
+            "duration_ms": round(self.duration * 1000, 1),
+            "status": self.status,
+            "attributes": self.attributes
+        }
+
+
+class _NoopSpan:
+    """没有进行中的trace时返回的占位span"""
+
+    def set(self, **attributes):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    """一次课时生成的全部span；trace_id 标识课时，session_id 标识所属的生成会话"""
+
+    def __init__(self, name: str, session_id: str = None, attributes: dict = None):
+        self.trace_id = uuid.uuid4().hex
+        self.session_id = session_id
+        self._lock = threading.Lock()
+        self.spans = []
+        self.root = self._add(name, None, attributes)
+
+    def _add(self, name, parent_id, attributes) -> Span:
+        span = Span(self, name, parent_id, attributes)
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            spans = list(self.spans)
+        return {
+            "trace_id": self.trace_id,
+            "session_id": self.session_id,
+            "name": self.root.name,
+            "duration_ms": round(self.root.duration * 1000, 1),
+            "spans": [span.to_dict() for span in spans]
+        }
+
+    def summary(self) -> dict:
+        """各阶段名称 -> 累计耗时（毫秒），用于快速比较"""
+        totals = {}
+        with self._lock:
+            spans = [span for span in self.spans if span is not self.root]
+        for span in spans:
+            totals[span.name] = round(totals.get(span.name, 0) + span.duration * 1000, 1)
+        return totals
+
+
+@contextmanager
+def _activate(span: Span):
+    token = _current.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.status = "error"
+        span.attributes.setdefault("error", type(e).__name__)
+        raise
+    finally:
+        span.end = time.perf_counter()
+        _current.reset(token)
+
+
+@contextmanager
+def trace(name: str, session_id: str = None, **attributes):
+    """开始一个新的trace（根span），with块内的span都记录在其中；追踪关闭时返回None"""
+    if not TRACING_ENABLED:
+        yield None
+        return
+    new_trace = Trace(name, session_id, attributes)
+    with _activate(new_trace.root):
+        yield new_trace
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """在当前span下开始一个子span"""
+    parent = _current.get()
+    if parent is None:
+        yield _NOOP_SPAN
+        return
+    with _activate(parent.trace._add(name, parent.span_id, attributes)) as child:
+        yield child
+
+
+def current_span():
+    """当前进行中的span，没有时返回占位span（可直接调用 set）"""
+    return _current.get() or _NOOP_SPAN
+
+
+def export(lesson_trace) -> dict:
+    """导出为可JSON序列化的字典；追踪关闭时返回None"""
+    return lesson_trace.to_dict() if lesson_trace is not None else None
@@ -4,6 +4,8 @@
 import re
 import json
 
+from json_repair import repair_json
+
 
 def markdown_to_plain_text(markdown_text: str) -> str:
     """
@@ -56,10 +58,13 @@ def markdown_to_plain_text(markdown_text: str) -> str:
     return text
 
 
-def parse_lesson_plan_json(content: str) -> dict:
+def parse_lesson_plan_json(content: str, repairs: dict = None) -> dict:
     """
     解析大模型返回的JSON内容
     处理可能的格式问题（如markdown代码块、多余字符等）
+    直接解析失败时先在本地修复常见缺陷（见 json_repair），仍失败才抛出原始异常
+
+    repairs: 可选字典，本地修复成功时累加各类修复次数
     """
     # 移除markdown代码块标记
     content = re.sub(r'^```json\s*', '', content, flags=re.MULTILINE)
@@ -74,15 +79,28 @@ def parse_lesson_plan_json(content: str) -> dict:
         data = json.loads(content)
         return data
     except json.JSONDecodeError as e:
-        # 尝试找到JSON的起始和结束位置
-        json_match = re.search(r'\{[\s\S]*\}', content)
-        if json_match:
-            try:
-                data = json.loads(json_match.group())
-                return data
-            except:
-                pass
-        raise e
+        error = e
+    
+    # 教案总是JSON对象：提取第一个 { 到最后一个 } 之间的内容，前面说明文字中的 [ ] 不会被当作数组
+    match = re.search(r'\{[\s\S]*\}', content)
+    if match:
+        try:
+            return json.loads(match.group())
+        except json.JSONDecodeError:
+            pass
+    
+    start = content.find('{')
+    repaired, counts = repair_json(content[start:] if start > 0 else content)
+    try:
+        data = json.loads(repaired)
+    except json.JSONDecodeError:
+        raise error
+    if start > 0 and content[:start].strip():
+        counts["stripped_prose"] = counts.get("stripped_prose", 0) + 1
+    if repairs is not None:
+        for kind, amount in counts.items():
+            repairs[kind] = repairs.get(kind, 0) + amount
+    return data
 
 
 def format_analysis_text(content_analysis: dict) -> str: